@@ -3,10 +3,9 @@ import pandas as pd
 import time
 import re
 import os
-from src import database, utils
-from src.config import ADMIN_PASSWORD_HASH, FAILED_SEARCH_LOG, BASE_DIR
+from src import database, utils, image_pipeline, backup, analytics
+from src.config import ADMIN_PASSWORD_HASH, BACKUP_DOWNLOAD_MAX_MB
 import bcrypt
-import shutil
 
 
 
@@ -184,8 +183,10 @@ with tab2:
             if st.button("💾 PUBLISH KE DATABASE", type="primary", use_container_width=True):
                 try:
                     with st.spinner("Menyimpan ke ChromaDB..."):
-                        # 1. Simpan Gambar ke Disk
-                        paths = utils.save_uploaded_images(draft['imgs'], draft['judul'], draft['tag'])
+                        # 1. Simpan Gambar ke Disk (paralel: master + thumbnail + WebP)
+                        paths, variants = image_pipeline.save_uploads(
+                            draft['imgs'], utils.sanitize_filename(draft['judul']), draft['tag']
+                        )
                         
                         # 2. Upsert ke DB
                         new_id = database.upsert_faq(
@@ -195,7 +196,8 @@ with tab2:
                             jawaban=draft['jawab'], 
                             keyword=draft['key'], 
                             img_paths=paths, 
-                            src_url=draft['src']
+                            src_url=draft['src'],
+                            img_variants=variants
                         )
                         
                         st.balloons()
@@ -264,10 +266,11 @@ with tab3:
                 
                 if is_update:
                     p = row['Gambar']
+                    v = None # None = varian lama dipertahankan
                     if e_new: 
-                        p = utils.save_uploaded_images(e_new, e_jud, e_tag)
+                        p, v = image_pipeline.save_uploads(e_new, utils.sanitize_filename(e_jud), e_tag)
                     
-                    database.upsert_faq(sel_id, e_tag, e_jud, e_jaw, e_key, p, e_src)
+                    database.upsert_faq(sel_id, e_tag, e_jud, e_jaw, e_key, p, e_src, img_variants=v)
                     st.toast("Data Berhasil Diupdate!", icon="✅")
                     
                     # Clear Cache & Rerun
@@ -353,64 +356,63 @@ with tab4:
     st.divider()
     st.subheader("💾 Backup & Restore")
     st.caption("Download seluruh data ChromaDB dan gambar agar aman saat server bermasalah.")
+    st.caption("Incremental hanya berisi file yang berubah sejak backup terakhir. Restore: ekstrak backup penuh, lalu incremental berurutan.")
+    st.caption("Jalankan saat tidak ada yang menyimpan/import FAQ: index vektor Chroma disalin apa adanya. Backup lama dihapus otomatis (simpan beberapa backup penuh terakhir).")
+    backup_mode = st.radio("Jenis Backup", ["Full", "Incremental (hanya file berubah)"], horizontal=True, key="backup_mode")
 
-    if st.button("📦 Download Full Backup", key="backup_btn"):
+    if st.button("📦 Buat Backup", key="backup_btn"):
+        backup_result = None
         with st.spinner("Mempersiapkan arsip backup..."):
-            temp_dir = os.path.join(BASE_DIR, "tmp_backup_bundle")
-            archive_base = os.path.join(BASE_DIR, f"backup_faq_{int(time.time())}")
-            archive_file = ""
-            backup_bytes = None
             try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                os.makedirs(temp_dir, exist_ok=True)
-
-                copied_any = False
-                for folder_name in ["data", "images"]:
-                    src_path = os.path.join(BASE_DIR, folder_name)
-                    dst_path = os.path.join(temp_dir, folder_name)
-                    if os.path.exists(src_path):
-                        shutil.copytree(src_path, dst_path)
-                        copied_any = True
-
-                if not copied_any:
-                    st.warning("Folder data/images tidak ditemukan. Pastikan konfigurasi path sudah benar.")
-                else:
-                    archive_file = shutil.make_archive(archive_base, 'zip', temp_dir)
-                    with open(archive_file, "rb") as f:
-                        backup_bytes = f.read()
+                backup_result = backup.create_backup(incremental=backup_mode.startswith("Incremental"))
             except Exception as e:
                 st.error(f"Gagal membuat backup: {e}")
-            finally:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                if archive_file and os.path.exists(archive_file):
-                    os.remove(archive_file)
 
-        if backup_bytes:
-            st.download_button(
-                label="⬇️ Klik untuk Simpan ZIP",
-                data=backup_bytes,
-                file_name=f"backup_faq_{int(time.time())}.zip",
-                mime="application/zip"
+        if backup_result:
+            if backup_result["files"] == 0:
+                st.warning("Folder data/images tidak ditemukan. Pastikan konfigurasi path sudah benar.")
+            st.success(
+                f"✅ Backup {backup_result['type']}: {backup_result['archived']}/{backup_result['files']} file diarsip, "
+                f"{backup_result['deleted']} file terhapus ({backup_result['size'] / 1048576:.1f} MB) → `{backup_result['path']}`"
             )
+            if backup_result["size"] <= BACKUP_DOWNLOAD_MAX_MB * 1024 * 1024:
+                with open(backup_result["path"], "rb") as f:
+                    st.download_button(
+                        label="⬇️ Klik untuk Simpan ZIP",
+                        data=f,
+                        file_name=os.path.basename(backup_result["path"]),
+                        mime="application/zip"
+                    )
+            else:
+                st.info(f"Arsip lebih besar dari {BACKUP_DOWNLOAD_MAX_MB:.0f} MB, ambil langsung dari folder backup di server.")
 
 # === TAB 5: ANALYTICS (FEEDBACK LOOP) ===
 with tab5:
     st.subheader("📈 Pencarian Gagal (User Feedback)")
     st.caption("Daftar kata kunci yang dicari User tapi hasilnya < 32% (Tidak Relevan).")
     
-    if utils.os.path.exists(FAILED_SEARCH_LOG):
-        df_log = pd.read_csv(FAILED_SEARCH_LOG)
-        
-        col1, col2 = st.columns([4, 1])
+    # Hanya baca tabel agregat (per query ternormalisasi), bukan seluruh log mentah
+    totals = analytics.get_failed_totals()
+    if totals["total_misses"]:
+        col1, col2, col3 = st.columns([2, 2, 1])
         with col1:
-            st.metric("Total Miss", len(df_log))
+            st.metric("Total Miss", totals["total_misses"])
         with col2:
+            st.metric("Query Unik", totals["unique_queries"])
+        with col3:
             if st.button("🗑️ Clear Log"):
-                utils.os.remove(FAILED_SEARCH_LOG)
+                analytics.clear_failed_searches()
                 st.rerun()
-                
-        if not df_log.empty:
-            df_log = df_log.sort_values(by="Timestamp", ascending=False)
-            st.dataframe(df_log, use_container_width=True)
+
+        sort_by = st.radio("Urutkan", ["Paling Sering", "Terbaru"], horizontal=True, key="analytics_sort")
+        rows = analytics.get_failed_summary(limit=500, order="last_seen" if sort_by == "Terbaru" else "count")
+        df_log = pd.DataFrame(rows)
+        df_log["first_seen"] = pd.to_datetime(df_log["first_seen"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        df_log["last_seen"] = pd.to_datetime(df_log["last_seen"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        df_log = df_log.rename(columns={
+            "sample": "Query User", "tag": "Tag", "count": "Jumlah",
+            "first_seen": "Pertama", "last_seen": "Terakhir", "last_source": "Sumber"
+        })[["Query User", "Jumlah", "Tag", "Pertama", "Terakhir", "Sumber"]]
+        st.dataframe(df_log, use_container_width=True, hide_index=True)
     else:
-        st.info("Belum ada data pencarian gagal. Sistem bekerja dengan baik!")
\ No newline at end of file
+        st.info("Belum ada data pencarian gagal. Sistem bekerja dengan baik!")
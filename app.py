@@ -127,6 +127,7 @@ if query != st.session_state.last_query or filter_tag != st.session_state.last_f
     st.session_state.last_query = query
     st.session_state.last_filter = filter_tag
 
+ITEMS_PER_PAGE = 10
 results = []
 is_search_mode = False
 
@@ -144,37 +145,44 @@ if query:
             # 1. TETAPKAN SYARAT MINIMUM 32%
             if score > 32:
                 meta['score'] = score
+                # Hasil kata kunci (fast path / mode darurat) bukan skor semantik
+                meta['keyword_match'] = bool(raw.get('lexical') or raw.get('degraded'))
                 results.append(meta)
         
         # 2. 👇 TAMBAHKAN BARIS INI (PEMOTONG) 👇
         # Ini artinya: "Ambil list results dari urutan ke-0 sampai ke-3 aja"
         results = results[:3]
-else:
-    raw_all = database.get_all_faqs_sorted()
-    if filter_tag == "Semua Modul":
-        results = raw_all
-    else:
-        results = [x for x in raw_all if x.get('tag') == filter_tag]
 
 # --- 6. PAGINATION & DISPLAY ---
-ITEMS_PER_PAGE = 10
-total_docs = len(results)
-total_pages = math.ceil(total_docs / ITEMS_PER_PAGE)
+if is_search_mode:
+    total_docs = len(results)
+    total_pages = math.ceil(total_docs / ITEMS_PER_PAGE)
 
-if st.session_state.page >= total_pages and total_pages > 0:
-    st.session_state.page = 0
+    if st.session_state.page >= total_pages and total_pages > 0:
+        st.session_state.page = 0
 
-start_idx = st.session_state.page * ITEMS_PER_PAGE
-end_idx = start_idx + ITEMS_PER_PAGE
-page_data = results[start_idx:end_idx]
+    start_idx = st.session_state.page * ITEMS_PER_PAGE
+    end_idx = start_idx + ITEMS_PER_PAGE
+    page_data = results[start_idx:end_idx]
+else:
+    # Paginasi server-side: hanya metadata item di halaman ini yang di-fetch
+    page_info = database.list_faqs(filter_tag, st.session_state.page, ITEMS_PER_PAGE)
+    st.session_state.page = page_info['page']
+    total_docs = page_info['total']
+    total_pages = page_info['total_pages']
+    start_idx = st.session_state.page * ITEMS_PER_PAGE
+    end_idx = start_idx + ITEMS_PER_PAGE
+    page_data = page_info['items']
 
 st.divider()
 
 if not page_data:
     if is_search_mode:
-        # Catat query gagal ke CSV
-        try: utils.log_failed_search(query)
-        except: pass
+        # Catat query gagal (sekali per query + filter per sesi, bukan tiap rerun Streamlit)
+        miss_key = (query, filter_tag)
+        if st.session_state.get('logged_miss') != miss_key:
+            utils.log_failed_search(query, filter_tag, source="app")
+            st.session_state.logged_miss = miss_key
         
         # === CALL TO ACTION (WA BOT) ===
         st.warning(f"❌ Tidak ditemukan hasil yang relevan (Relevansi < 32%).")
@@ -228,7 +236,10 @@ else:
             sc = item['score']
             
             # --- ATURAN WARNA BARU ---
-            if sc > 80:
+            if item.get('keyword_match'):
+                score_md = ":blue[(Cocok Kata Kunci)]"
+
+            elif sc > 80:
                 # > 80%: "Ijo Tua" (Kita pake Green + BOLD + Bintang biar beda)
                 # Streamlit cuma punya 1 green, jadi kita tebalkan biar tegas.
                 score_md = f":green[**({sc:.0f}% Relevansi) 🌟**]"
@@ -0,0 +1,258 @@
+"""
+Benchmark skala korpus: latency & throughput read/write path pada 1k / 10k / 100k FAQ.
+
+Cara pakai (dari root project):
+    python benchmarks/bench_scaling.py                      # 1000, 10000, 100000 dokumen
+    python benchmarks/bench_scaling.py --sizes 1000 10000 --queries 100
+    python benchmarks/bench_scaling.py --dim 3072           # dimensi default gemini-embedding-001
+    python benchmarks/bench_scaling.py --provider fake      # provider embedding lain (src/embeddings.py)
+
+- Tiap ukuran jalan di subprocess sendiri (peak RSS tidak tercampur), dengan
+  PersistentClient lokal di benchmarks/.data/{provider}_n{size}_d{dim} (di-seed sekali, dipakai ulang).
+- Embedding default lewat provider `hashing` deterministik (tanpa Gemini, tanpa jaringan):
+  hasil bisa dibandingkan antar run & antar mesin.
+- Hasil: p50/p95/p99 (ms), throughput (ops/detik), peak RSS per operasi,
+  disimpan ke benchmarks/results/bench_{timestamp}.json.
+Flag fitur (LOCAL_VECTOR_INDEX, LEXICAL_INDEX, ANSWER_CACHE, ...) dibaca dari env seperti biasa.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+TAGS = ["ED", "IPD", "OPD", "Farmasi", "Kasir", "Laboratorium", "Radiologi", "Rekam Medis"]
+VERBS = ["cara", "gagal", "tidak bisa", "error saat", "bagaimana", "kenapa", "langkah", "setting"]
+
+# --- 1. DATA SINTETIS ---
+def _vocabulary(rng, size=3000):
+    syllables = ["ba", "di", "ku", "ra", "sa", "to", "me", "ni", "pe", "la", "ga", "so", "ti", "an", "ur", "ek"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_corpus(size, seed=42):
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    items = []
+    for i in range(size):
+        topic = rng.sample(vocab, 3)
+        tag = TAGS[i % len(TAGS)]
+        judul = f"{rng.choice(VERBS).capitalize()} {' '.join(topic)} di modul {tag}"
+        keyword = ", ".join(rng.sample(vocab, 4))
+        jawaban = "\n".join(
+            f"{n}. " + " ".join(rng.choices(vocab, k=rng.randint(6, 14))) for n in range(1, rng.randint(3, 7))
+        )
+        items.append({"tag": tag, "judul": judul, "jawaban": jawaban, "keyword": keyword,
+                      "img_paths": "none", "src_url": ""})
+    return items, vocab
+
+def make_queries(corpus, vocab, count, seed, miss_ratio=0.2):
+    """Query unik (tidak kena answer cache exact): potongan judul/keyword + noise, sebagian pasti miss."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if rng.random() < miss_ratio:
+            queries.append(f"zz{i} " + " ".join(f"qx{rng.randint(0, 10**6)}" for _ in range(3)))
+            continue
+        doc = rng.choice(corpus)
+        terms = doc["judul"].lower().split()[1:4] + rng.sample(doc["keyword"].split(", "), 1)
+        rng.shuffle(terms)
+        queries.append(f"{rng.choice(VERBS)} {' '.join(terms)} {rng.choice(vocab)} {i}")
+    return queries
+
+# --- 2. PENGUKURAN ---
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _percentile(sorted_values, p):
+    if not sorted_values: return None
+    k = (len(sorted_values) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def measure(name, fn, args_list):
+    """Jalankan fn(*args) berurutan untuk tiap args, catat latency & memori."""
+    latencies, errors = [], 0
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception as e:
+            errors += 1
+            if errors == 1: print(f"⚠️ {name} error: {e}")
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    ms = sorted(x * 1000 for x in latencies)
+    result = {
+        "ops": len(latencies),
+        "errors": errors,
+        "p50_ms": round(_percentile(ms, 0.50), 3) if ms else None,
+        "p95_ms": round(_percentile(ms, 0.95), 3) if ms else None,
+        "p99_ms": round(_percentile(ms, 0.99), 3) if ms else None,
+        "max_ms": round(ms[-1], 3) if ms else None,
+        "throughput_ops_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "rss_before_mb": round(rss_before, 1) if rss_before else None,
+        "rss_after_mb": round(_rss_mb() or 0, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+    print(f"  {name:<28} p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+          f"{result['throughput_ops_s']} ops/s peak={result['peak_rss_mb']}MB")
+    return result
+
+# --- 3. WORKER (1 UKURAN KORPUS, DALAM SUBPROCESS) ---
+def run_worker(size, args):
+    import chromadb
+    from src import database
+
+    data_dir = _data_dir(size, args)
+    database._get_db_client_raw = lambda: chromadb.PersistentClient(path=os.path.join(data_dir, "chroma"))
+
+    corpus, vocab = make_corpus(size)
+    count = database.get_collection().count()
+    seed_result = None
+    if count != size:
+        if count:
+            raise SystemExit(f"❌ {data_dir} berisi {count} dokumen (bukan {size}), jalankan dengan --reseed")
+        print(f"🌱 Seeding {size} dokumen ke {data_dir} ...")
+        t0 = time.perf_counter()
+        for start in range(0, size, 5000):
+            report = database.upsert_faq_many(corpus[start:start + 5000])
+            failed = [r for r in report if not r["ok"]]
+            if failed: raise SystemExit(f"❌ Seeding gagal: {failed[0]}")
+        seed_seconds = time.perf_counter() - t0
+        seed_result = {"docs": size, "seconds": round(seed_seconds, 2),
+                       "docs_per_s": round(size / seed_seconds, 1), "peak_rss_mb": round(_peak_rss_mb(), 1)}
+        print(f"  seed: {seed_result}")
+
+    n = args.queries
+    web_queries = make_queries(corpus, vocab, n, seed=1)
+    bot_queries = make_queries(corpus, vocab, n, seed=2)
+    page_queries = make_queries(corpus, vocab, n, seed=3)
+    ids = [str(x) for x in random.Random(4).sample(range(1, size + 1), min(args.writes, size))]
+
+    print(f"📏 Korpus {size} dokumen ({args.provider}, dim={args.dim}, {n} query/operasi)")
+    ops = {}
+    ops["search_faq"] = measure("search_faq", database.search_faq, [(q, None, 50) for q in web_queries])
+    ops["search_faq_for_bot"] = measure("search_faq_for_bot", database.search_faq_for_bot, [(q,) for q in bot_queries])
+    ops["get_all_faqs_sorted"] = measure("get_all_faqs_sorted", database.get_all_faqs_sorted, [()] * max(5, n // 10))
+
+    from fastapi.testclient import TestClient
+    from web_v2 import main as web
+    client = TestClient(web.app)
+    def get_ok(url, params):
+        r = client.get(url, params=params)
+        if r.status_code != 200: raise RuntimeError(f"HTTP {r.status_code}")
+    ops["read_root_search"] = measure("read_root (search)", get_ok, [("/", {"q": q}) for q in page_queries])
+    ops["read_root_browse"] = measure("read_root (browse)", get_ok,
+                                      [("/", {"page": p % 50, "tag": TAGS[p % len(TAGS)]}) for p in range(n)])
+
+    # Write path terakhir: tiap upsert menaikkan data version (cache/index read path di-reload)
+    by_id = {}
+    for doc_id in ids:
+        item = dict(corpus[int(doc_id) - 1])
+        item["jawaban"] += f"\n(revisi {doc_id})"
+        by_id[doc_id] = item
+    ops["upsert_faq"] = measure("upsert_faq", lambda d: database.upsert_faq(
+        d, by_id[d]["tag"], by_id[d]["judul"], by_id[d]["jawaban"], by_id[d]["keyword"], "none", ""
+    ), [(d,) for d in ids])
+
+    return {"size": size, "provider": args.provider, "dim": args.dim, "seed": seed_result, "operations": ops}
+
+# --- 4. ORCHESTRATOR ---
+def _data_dir(size, args):
+    return os.path.join(DATA_DIR, f"{args.provider}_n{size}_d{args.dim}")
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark skala korpus FAQ (embedding deterministik offline)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200, help="Jumlah request per operasi read")
+    parser.add_argument("--writes", type=int, default=50, help="Jumlah upsert_faq")
+    parser.add_argument("--provider", default="hashing", help="EMBEDDING_PROVIDER untuk benchmark (hashing|fake|local|gemini)")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensi embedding (Gemini default: 3072)")
+    parser.add_argument("--reseed", action="store_true", help="Hapus data benchmark lama & seed ulang")
+    parser.add_argument("--out", default=None, help="Path file JSON hasil")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        result = run_worker(args.worker, args)
+        with open(args.worker_out, "w") as f:
+            json.dump(result, f)
+        return
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    runs = []
+    for size in args.sizes:
+        data_dir = _data_dir(size, args)
+        if args.reseed: shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(data_dir, exist_ok=True)
+
+        # State, cache embedding & analytics terisolasi per ukuran; Chroma selalu lokal
+        env = dict(os.environ)
+        env.pop("CHROMA_HOST", None)
+        env["EMBEDDING_PROVIDER"] = args.provider
+        env["EMBEDDING_DIM"] = str(args.dim)
+        env["STATE_DB_PATH"] = os.path.join(data_dir, "state.sqlite")
+        env["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache.sqlite")
+        env["ANALYTICS_DB_PATH"] = os.path.join(data_dir, "analytics.sqlite")
+        env["PYTHONPATH"] = ROOT_DIR + os.pathsep + env.get("PYTHONPATH", "")
+
+        worker_out = os.path.join(data_dir, "result.json")
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--worker-out", worker_out,
+               "--queries", str(args.queries), "--writes", str(args.writes),
+               "--provider", args.provider, "--dim", str(args.dim)]
+        subprocess.run(cmd, cwd=ROOT_DIR, env=env, check=True)
+        with open(worker_out) as f:
+            runs.append(json.load(f))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: os.getenv(k) for k in ("LOCAL_VECTOR_INDEX", "LEXICAL_INDEX", "LEXICAL_FASTPATH", "ANSWER_CACHE")
+                   if os.getenv(k) is not None},
+        "queries": args.queries,
+        "runs": runs,
+    }
+    out_path = args.out or os.path.join(RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Hasil benchmark disimpan: {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 import os
-import requests
 import uvicorn
 import re
-import base64
-import mimetypes
-import json
-import sys
-import time
-from fastapi import FastAPI, Request, BackgroundTasks
+import asyncio
+from fastapi import FastAPI, Request, Response
 from dotenv import load_dotenv
-from src import database
+from src import database, utils, analytics, metrics
+from src.wpp_client import WppClient, ChatSendQueue, EncodedImageCache, image_url
+from src.config import (
+    WPP_IMAGE_MODE, WPP_IMAGE_BASE_URL,
+    BOT_CHAT_RATE_PER_MIN, BOT_CHAT_BURST, BOT_GROUP_RATE_PER_MIN, BOT_GROUP_BURST,
+)
+from src.work_queue import WorkQueue
+from src.rate_limit import Debouncer, KeyedRateLimiter, allow_all
 
 # Load Environment Variables
 load_dotenv()
@@ -30,8 +32,14 @@ raw_ids = os.getenv("BOT_IDENTITIES", "")
 # Ubah string jadi list, hilangkan spasi jika ada
 MY_IDENTITIES = [x.strip() for x in raw_ids.split(",") if x.strip()]
 
-# Variable Global Auth
-CURRENT_TOKEN = None
+# Client WPPConnect (Session keep-alive, timeout, auto refresh token saat 401)
+WPP = WppClient(WA_BASE_URL, WA_SESSION_NAME, WA_SECRET_KEY)
+# Antrian kirim per chat: urutan bubble terjaga, jeda non-blocking
+OUTBOX = ChatSendQueue()
+# Payload base64 gambar di-cache (kunci path + mtime), tidak di-encode ulang tiap kirim
+IMAGE_CACHE = EncodedImageCache()
+# Mode URL: WPPConnect mengunduh gambar langsung dari /images Web V2
+IMAGE_BASE_URL = WPP_IMAGE_BASE_URL or WEB_V2_URL
 
 # --- FUNGSI LOGGING ---
 def log(message):
@@ -39,134 +47,165 @@ def log(message):
 
 # --- FUNGSI AUTH ---
 def get_headers():
-    global CURRENT_TOKEN
-    if not CURRENT_TOKEN:
-        log("🔄 Token kosong. Mencoba generate token baru...")
-        generate_token()
-    return {
-        "Authorization": f"Bearer {CURRENT_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    return WPP.headers()
 
 def generate_token():
-    global CURRENT_TOKEN
-    try:
-        url = f"{WA_BASE_URL}/api/{WA_SESSION_NAME}/{WA_SECRET_KEY}/generate-token"
-        r = requests.post(url)
-        if r.status_code in [200, 201]:
-            resp = r.json()
-            token = resp.get("token") or resp.get("session") 
-            if not token and "full" in resp: token = resp["full"].split(":")[-1]
-            if token:
-                CURRENT_TOKEN = token
-                log(f"✅ Berhasil Generate Token.")
-            else: log(f"❌ Gagal Parse Token.")
-        else: log(f"❌ Gagal Generate Token: {r.status_code}")
-    except Exception as e: log(f"❌ Error Auth: {e}")
+    return WPP.generate_token()
 
 # --- FUNGSI UTILITY ---
 def get_base64_image(file_path):
-    try:
-        clean_path = file_path.replace("\\", "/")
-        if not os.path.exists(clean_path): return None, None
-        mime_type, _ = mimetypes.guess_type(clean_path)
-        if not mime_type: mime_type = "image/jpeg"
-        with open(clean_path, "rb") as image_file:
-            raw_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-        return f"data:{mime_type};base64,{raw_base64}", os.path.basename(clean_path)
-    except: return None, None
+    return IMAGE_CACHE.get(file_path)
 
 def send_wpp_text(phone, message):
-    if not phone or str(phone) == "None": return
-    url = f"{WA_BASE_URL}/api/{WA_SESSION_NAME}/send-message"
-    is_group_msg = "@g.us" in str(phone)
-    
-    # UPGRADE: "Jurus Mabuk" (Double Parameter)
-    # Kita taruh linkPreview di luar DAN di dalam 'options'
-    # Biar versi WPPConnect manapun tetap nurut.
-    payload = {
-        "phone": phone, 
-        "message": message, 
-        "isGroup": is_group_msg,
-        "linkPreview": False,   # Cara Lama (Legacy)
-        "options": {
-            "linkPreview": False, # Cara Baru (Standard)
-            "createChat": True
-        }
-    }
-    
-    try:
-        r = requests.post(url, json=payload, headers=get_headers())
-        log(f"📤 Balas ke {phone}: {r.status_code}")
-        if r.status_code == 401: generate_token()
-    except Exception as e: log(f"❌ Error Kirim Text: {e}")
+    """Return True kalau terkirim (dipakai ChatSendQueue untuk hitung sent/failed)."""
+    if not phone or str(phone) == "None": return False
+    with metrics.WPP_SEND_SECONDS.time(kind="text") as timing:
+        try:
+            r = WPP.send_text(phone, message)
+            log(f"📤 Balas ke {phone}: {r.status_code}")
+            if r.status_code >= 400:
+                timing["status"] = "error"
+                return False
+            return True
+        except Exception as e:
+            timing["status"] = "error"
+            log(f"❌ Error Kirim Text: {e}")
+            return False
 
 def send_wpp_image(phone, file_path, caption=""):
-    if not phone: return
-    url = f"{WA_BASE_URL}/api/{WA_SESSION_NAME}/send-image"
+    if not phone: return False
+    with metrics.WPP_SEND_SECONDS.time(kind="image") as timing:
+        sent = _send_image(phone, file_path, caption)
+        if not sent: timing["status"] = "error"
+        return sent
+
+def _send_image(phone, file_path, caption):
+    """URL dulu (kalau aktif), fallback base64. Return True kalau terkirim."""
+    if WPP_IMAGE_MODE == "url" and IMAGE_BASE_URL:
+        try:
+            r = WPP.send_image_url(phone, image_url(file_path, IMAGE_BASE_URL), caption,
+                                   filename=os.path.basename(file_path.replace("\\", "/")))
+            if r.status_code < 400: return True
+            log(f"⚠️ Kirim gambar via URL gagal ({r.status_code}), fallback ke base64")
+        except Exception as e: log(f"⚠️ Kirim gambar via URL error, fallback ke base64: {e}")
+
     base64_str, _ = get_base64_image(file_path)
-    if not base64_str: return
-    is_group_msg = "@g.us" in str(phone)
-    payload = {"phone": phone, "base64": base64_str, "caption": caption, "isGroup": is_group_msg}
-    try: requests.post(url, json=payload, headers=get_headers())
-    except: pass
+    if not base64_str: return False
+    try:
+        r = WPP.send_image(phone, base64_str, caption)
+        if r.status_code >= 400:
+            log(f"⚠️ Gagal kirim gambar ke {phone}: {r.status_code}")
+            return False
+        return True
+    except Exception as e:
+        log(f"❌ Error Kirim Gambar: {e}")
+        return False
 
-def process_logic(remote_jid, sender_name, message_body, is_group, mentioned_list):
-    log(f"⚙️ Memproses Pesan: '{message_body}' dari {sender_name} (Group: {is_group})")
-    
-    should_reply = False
+def queue_text(phone, message):
+    """Masukkan bubble teks ke antrian chat (return langsung, dikirim berurutan)."""
+    return OUTBOX.submit(phone, send_wpp_text, phone, message)
+
+def queue_image(phone, file_path, caption=""):
+    return OUTBOX.submit(phone, send_wpp_image, phone, file_path, caption=caption)
+
+# Burst pesan beruntun digabung jadi 1 pertanyaan (per chat, atau per pengirim di grup)
+DEBOUNCER = Debouncer()
+# Token bucket: per chat/pengirim, dan total per grup
+CHAT_LIMITER = KeyedRateLimiter(BOT_CHAT_RATE_PER_MIN, BOT_CHAT_BURST)
+GROUP_LIMITER = KeyedRateLimiter(BOT_GROUP_RATE_PER_MIN, BOT_GROUP_BURST)
+# Notifikasi "terlalu banyak pertanyaan" maksimal 1x per menit per chat
+NOTICE_LIMITER = KeyedRateLimiter(1, 1)
+
+def clean_message(message_body):
+    # Hapus tag @faq dan mention bot biar pencarian bersih
+    clean_query = message_body.replace("@faq", "")
+    for identity in MY_IDENTITIES:
+        clean_query = clean_query.replace(f"@{identity}", "") 
     
+    # Hapus sisa-sisa format mention (@628xxx)
+    return re.sub(r'@\d+', '', clean_query).strip()
+
+def is_rate_limited(remote_jid, chat_key, is_group):
+    checks = [(CHAT_LIMITER, chat_key)]
+    if is_group: checks.append((GROUP_LIMITER, remote_jid))
+    return not allow_all(*checks)
+
+def is_bot_called(message_body, is_group, mentioned_list):
     # === LOGIKA PEMISAH (GRUP vs JAPRI) ===
     if not is_group:
         # KASUS JAPRI (DM):
         # Selalu jawab! Gak perlu nunggu di-tag.
-        should_reply = True
-    else:
-        # KASUS GRUP:
-        # Harus ada keyword @faq ATAU Bot di-mention
-        if "@faq" in message_body.lower():
-            should_reply = True
-        
-        # Cek Mention ID (Support Multiple ID dari .env)
-        if mentioned_list and not should_reply:
-            for mentioned_id in mentioned_list:
-                for my_id in MY_IDENTITIES:
-                    if str(my_id) in str(mentioned_id):
-                        should_reply = True
-                        log(f"🔔 Saya di-tag di Grup (via ID: {my_id})! Membalas...")
-                        break
-                if should_reply: break
-    
-    if not should_reply: 
+        return True
+
+    # KASUS GRUP:
+    # Harus ada keyword @faq ATAU Bot di-mention
+    if "@faq" in message_body.lower():
+        return True
+
+    # Cek Mention ID (Support Multiple ID dari .env)
+    for mentioned_id in mentioned_list or []:
+        for my_id in MY_IDENTITIES:
+            if str(my_id) in str(mentioned_id):
+                log(f"🔔 Saya di-tag di Grup (via ID: {my_id})! Membalas...")
+                return True
+    return False
+
+def route_message(remote_jid, sender_name, message_body, is_group, mentioned_list,
+                  sender_id=None, msg_id=None, reply_to=None):
+    """
+    Jalan di event loop webhook (tanpa I/O): putuskan perlu dibalas atau tidak, lalu
+    gabungkan burst lewat DEBOUNCER. Hanya pertanyaan gabungan yang masuk WEBHOOK_QUEUE.
+    """
+    log(f"⚙️ Pesan Masuk: '{message_body}' dari {sender_name} (Group: {is_group})")
+    chat_key = f"{remote_jid}|{sender_id or sender_name}" if is_group else remote_jid
+    clean_query = clean_message(message_body)
+
+    if not is_bot_called(message_body, is_group, mentioned_list):
         # Kalau di grup dan ga dipanggil, diam aja.
+        # Kecuali balasan/quote ke pertanyaan yang masih dalam jendela debounce
+        DEBOUNCER.append_if_pending(chat_key, clean_query, reply_to, msg_id)
         return
 
-    # --- BERSIHKAN QUERY ---
-    # Hapus tag @faq dan mention bot biar pencarian bersih
-    clean_query = message_body.replace("@faq", "")
-    for identity in MY_IDENTITIES:
-        clean_query = clean_query.replace(f"@{identity}", "") 
-    
-    # Hapus sisa-sisa format mention (@628xxx)
-    clean_query = re.sub(r'@\d+', '', clean_query).strip()
+    # --- GABUNG BURST (Pesan beruntun = 1 pertanyaan) ---
+    DEBOUNCER.add(
+        chat_key, clean_query,
+        lambda text: enqueue_question(remote_jid, sender_name, text, is_group, chat_key),
+        msg_id
+    )
 
+def enqueue_question(remote_jid, sender_name, clean_query, is_group, chat_key):
+    """Dipanggil saat jendela debounce tutup (event loop)."""
     if not clean_query:
         # Kalau cuma nge-tag doang tanpa nanya
-        send_wpp_text(remote_jid, f"Halo {sender_name}, silakan ketik pertanyaan Anda.")
+        queue_text(remote_jid, f"Halo {sender_name}, silakan ketik pertanyaan Anda.")
         return
 
+    # --- RATE LIMIT (Per chat & per grup) ---
+    if is_rate_limited(remote_jid, chat_key, is_group):
+        log(f"⛔ Rate limit: {chat_key}")
+        if NOTICE_LIMITER.allow(chat_key):
+            queue_text(remote_jid, f"Maaf {sender_name}, pertanyaan terlalu banyak dalam waktu singkat. Silakan coba lagi sebentar lagi.")
+        return
+
+    # Dedupe ID pesan sudah dilakukan di webhook (sebelum debounce)
+    if WEBHOOK_QUEUE.submit(None, remote_jid, clean_query, chat_key) == "busy":
+        log(f"⚠️ Antrian penuh, pertanyaan dari {chat_key} ditolak.")
+
+async def process_logic(remote_jid, clean_query, chat_key):
     log(f"🔍 Mencari: '{clean_query}'")
     try:
-        results = database.search_faq_for_bot(clean_query, filter_tag="Semua Modul")
+        # Async: embedding & query Chroma tidak memblok event loop webhook
+        results = await database.async_search_faq_for_bot(clean_query, filter_tag="Semua Modul")
     except:
-        send_wpp_text(remote_jid, "Maaf, database sedang gangguan.")
+        queue_text(remote_jid, "Maaf, database sedang gangguan.")
         return
     
     if not results or not results['ids'][0]:
+        utils.log_failed_search(clean_query, source="bot", dedupe_key=chat_key)
         # Footer Gagal (Clean Text)
         fail_msg = f"Maaf, tidak ditemukan hasil yang relevan untuk: '{clean_query}'\n\n"
         fail_msg += f"Silakan cari manual di: {WEB_V2_URL}"
-        send_wpp_text(remote_jid, fail_msg)
+        queue_text(remote_jid, fail_msg)
         return
 
     meta = results['metadatas'][0][0]
@@ -177,6 +216,12 @@ def process_logic(remote_jid, sender_name, message_body, is_group, mentioned_lis
         header = f"Relevansi: {score:.0f}%\n"
     else:
         header = f"[Relevansi Rendah: {score:.0f}%]\n" 
+    if results.get('degraded'):
+        # Mode darurat: AI embedding sedang lambat/gangguan, hasil dari kecocokan judul & keyword
+        header = "[Pencarian Kata Kunci]\n"
+    elif results.get('lexical'):
+        # Fast path BM25: coverage kata, bukan skor semantik -> jangan tampil sebagai persen
+        header = "[Cocok Kata Kunci]\n"
 
     judul = meta['judul']
     jawaban_raw = meta['jawaban_tampil']
@@ -215,13 +260,13 @@ def process_logic(remote_jid, sender_name, message_body, is_group, mentioned_lis
         else:
             final_text += f"\n\n\nNote: {sumber}"
 
+    # Semua bubble masuk antrian chat ini: terkirim berurutan dengan jeda WPP_SEND_INTERVAL
     # 1. Kirim Jawaban Teks
-    send_wpp_text(remote_jid, final_text)
+    queue_text(remote_jid, final_text)
     
     # 2. Kirim Gambar (Jika ada)
     for i, img in enumerate(list_gambar_to_send):
-        time.sleep(0.5) 
-        send_wpp_image(remote_jid, img, caption=f"Lampiran {i+1}")
+        queue_image(remote_jid, img, caption=f"Lampiran {i+1}")
 
     # --- UPGRADE 3: Footer Bubble Terpisah ---
     footer_text = "------------------------------\n"
@@ -230,11 +275,25 @@ def process_logic(remote_jid, sender_name, message_body, is_group, mentioned_lis
     footer_text += "2. Atau gunakan *kalimat* spesifik beserta nama modul/topik (misal: IPD/ED/Jadwal).\n"
     footer_text += "Contoh: \n\"Gimana cara edit obat di EMR ED Pharmacy?\""
     
-    time.sleep(0.5)
-    send_wpp_text(remote_jid, footer_text)
+    queue_text(remote_jid, footer_text)
+
+# Antrian webhook: worker terbatas (BOT_WORKERS), dedupe ID pesan, tolak kalau penuh
+WEBHOOK_QUEUE = WorkQueue(process_logic)
+
+def get_message_id(data):
+    """ID pesan WPPConnect bisa string atau dict {'_serialized': ...}."""
+    msg_id = data.get("id")
+    if isinstance(msg_id, dict): msg_id = msg_id.get("_serialized") or msg_id.get("id")
+    return str(msg_id) if msg_id else None
+
+def get_quoted_id(data):
+    """ID pesan yang di-reply/quote (kalau ada), untuk menggabung pertanyaan susulan di grup."""
+    quoted = data.get("quotedMsgId") or data.get("quotedStanzaID")
+    if isinstance(quoted, dict): quoted = quoted.get("_serialized") or quoted.get("id")
+    return str(quoted) if quoted else None
 
 @app.post("/webhook")
-async def wpp_webhook(request: Request, background_tasks: BackgroundTasks):
+async def wpp_webhook(request: Request):
     try:
         body = await request.json()
         event = body.get("event")
@@ -260,8 +319,12 @@ async def wpp_webhook(request: Request, background_tasks: BackgroundTasks):
         is_group = data.get("isGroupMsg", False) or "@g.us" in str(remote_jid)
         
         mentioned_list = data.get("mentionedJidList", [])
+        sender_id = data.get("author") or data.get("sender", {}).get("id")
 
-        background_tasks.add_task(process_logic, remote_jid, sender_name, message_body, is_group, mentioned_list)
+        msg_id = get_message_id(data)
+        if WEBHOOK_QUEUE.seen(msg_id): return {"status": "ignored_duplicate"}
+        route_message(remote_jid, sender_name, message_body, is_group, mentioned_list,
+                      sender_id, msg_id, get_quoted_id(data))
         return {"status": "success"}
 
     except Exception as e:
@@ -271,14 +334,37 @@ async def wpp_webhook(request: Request, background_tasks: BackgroundTasks):
 @app.on_event("startup")
 async def startup_event():
     log(f"🚀 Bot WA Start! Identities Loaded: {len(MY_IDENTITIES)}")
-    generate_token()
+    WEBHOOK_QUEUE.start()
+    await asyncio.to_thread(generate_token)
     try:
-        requests.post(
-            f"{WA_BASE_URL}/api/{WA_SESSION_NAME}/start-session",
-            json={"webhook": "http://faq-bot:8000/webhook"},
-            headers=get_headers()
-        )
+        await asyncio.to_thread(WPP.post, "start-session", {"webhook": "http://faq-bot:8000/webhook"})
     except: pass
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await WEBHOOK_QUEUE.stop()
+
+metrics.REGISTRY.register_collector(
+    "faq_image_cache_total", "Lookup cache base64 gambar Bot (result=hits|misses)", "counter",
+    metrics.stats_collector(IMAGE_CACHE.stats, ("hits", "misses"))
+)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+async def bot_stats():
+    """Kedalaman & waktu tunggu antrian webhook, antrian kirim, cache gambar, buffer analytics, dan circuit breaker embedding."""
+    return {
+        "webhook_queue": WEBHOOK_QUEUE.stats(),
+        "outbox": OUTBOX.stats(),
+        "image_cache": IMAGE_CACHE.stats(),
+        "debounce": DEBOUNCER.stats(),
+        "rate_limit": {"chat": CHAT_LIMITER.stats(), "group": GROUP_LIMITER.stats()},
+        "analytics": analytics.get_stats(),
+        "embedding_breaker": database.get_embedding_breaker_stats(),
+    }
+
 if __name__ == "__main__":
     uvicorn.run("bot_wa:app", host="0.0.0.0", port=8000)
\ No newline at end of file
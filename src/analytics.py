@@ -0,0 +1,247 @@
+import atexit
+import csv
+import io
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from .utils import normalize_query
+from .config import (
+    ANALYTICS_DB_PATH, FAILED_SEARCH_LOG, ANALYTICS_FLUSH_SECONDS, ANALYTICS_DEDUPE_SECONDS,
+    ANALYTICS_LOG_MAX_MB, ANALYTICS_LOG_BACKUPS
+)
+
+# --- ANALYTICS: PENCARIAN GAGAL (APP, WEB V2, BOT) ---
+# Dulu tiap miss = buka & append CSV langsung di thread request (dan ulang lagi tiap
+# rerun Streamlit), lalu Admin membaca seluruh CSV. Sekarang:
+# - log_miss() hanya menaruh event ke buffer memori (tanpa I/O), query yang sama dari
+#   sesi/chat yang sama dalam ANALYTICS_DEDUPE_SECONDS dihitung sekali.
+# - Thread background mem-flush buffer tiap ANALYTICS_FLUSH_SECONDS:
+#   1. UPSERT agregat per (query ternormalisasi, tag): count, first/last seen, contoh teks
+#   2. Append log mentah ke FAILED_SEARCH_LOG (1x write per batch, dirotasi per ukuran)
+# - Tab Analytics hanya membaca tabel agregat (get_failed_summary).
+
+FLUSH_BATCH = 500  # buffer sebanyak ini -> flush lebih cepat tanpa menunggu interval
+CSV_HEADER = ["Timestamp", "Query User", "Tag", "Sumber"]
+
+def _tag_key(tag):
+    return tag if (tag and tag != "Semua Modul") else ""
+
+class MissLogger:
+    def __init__(self, db_path=ANALYTICS_DB_PATH, log_path=FAILED_SEARCH_LOG,
+                 flush_seconds=ANALYTICS_FLUSH_SECONDS, dedupe_seconds=ANALYTICS_DEDUPE_SECONDS,
+                 log_max_mb=ANALYTICS_LOG_MAX_MB, log_backups=ANALYTICS_LOG_BACKUPS):
+        self._db_path = db_path
+        self._log_path = log_path
+        self._flush_seconds = flush_seconds
+        self._dedupe_seconds = dedupe_seconds
+        self._log_max_bytes = int(log_max_mb * 1024 * 1024)
+        self._log_backups = log_backups
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._db_lock = threading.Lock()  # koneksi SQLite dipakai writer & pembaca (Admin); log_miss tidak ikut menunggu
+        self._buffer = []   # (ts, query_norm, raw, tag, source)
+        self._recent = {}   # (dedupe_key, query_norm, tag) -> ts terakhir dicatat
+        self._wake = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._legacy_checked = False
+        self._stats = {"logged": 0, "deduped": 0, "flushed": 0, "errors": 0}
+
+    # --- WRITER ---
+    def log_miss(self, query, tag=None, source="app", dedupe_key=None):
+        """Catat 1 pencarian gagal (non-blocking, aman dipanggil dari event loop)."""
+        query_norm = normalize_query(query)
+        if not query_norm: return
+        tag_key = _tag_key(tag)
+        now = time.time()
+        with self._lock:
+            if dedupe_key is not None and self._dedupe_seconds > 0:
+                recent_key = (dedupe_key, query_norm, tag_key)
+                last = self._recent.get(recent_key)
+                if last is not None and now - last < self._dedupe_seconds:
+                    self._stats["deduped"] += 1
+                    return
+                self._recent[recent_key] = now
+            self._buffer.append((now, query_norm, " ".join(str(query).split()), tag_key, source))
+            self._stats["logged"] += 1
+            buffered = len(self._buffer)
+            self._ensure_thread_locked()
+        if buffered >= FLUSH_BATCH: self._wake.set()
+
+    def _ensure_thread_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Tulis buffer ke SQLite (agregat) + log mentah. Return jumlah event yang ditulis."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                cutoff = time.time() - self._dedupe_seconds
+                self._recent = {k: ts for k, ts in self._recent.items() if ts >= cutoff}
+            if not batch: return 0
+            try:
+                self._write_aggregates(batch)
+                self._append_raw_log(batch)
+                self._stats["flushed"] += len(batch)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"⚠️ Gagal menulis analytics ({len(batch)} event): {e}")
+            return len(batch)
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+            conn = sqlite3.connect(self._db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS failed_queries (
+                    query_norm TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    sample TEXT,
+                    count INTEGER NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    last_source TEXT,
+                    PRIMARY KEY (query_norm, tag)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_failed_count ON failed_queries(count DESC)")
+            self._conn = conn
+        return self._conn
+
+    def _write_aggregates(self, batch):
+        # Agregasi di memori dulu: 1 UPSERT per query unik, bukan per event
+        grouped = {}
+        for ts, query_norm, raw, tag, source in batch:
+            row = grouped.get((query_norm, tag))
+            if row is None: grouped[(query_norm, tag)] = [raw, 1, ts, ts, source]
+            else:
+                row[1] += 1
+                row[2] = min(row[2], ts)
+                if ts >= row[3]: row[0], row[3], row[4] = raw, ts, source
+
+        with self._db_lock:
+            conn = self._db()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("""
+                    INSERT INTO failed_queries(query_norm, tag, sample, count, first_seen, last_seen, last_source)
+                    VALUES(?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(query_norm, tag) DO UPDATE SET
+                        count = count + excluded.count,
+                        first_seen = MIN(first_seen, excluded.first_seen),
+                        last_seen = MAX(last_seen, excluded.last_seen),
+                        sample = excluded.sample,
+                        last_source = excluded.last_source
+                    """, [(q, t, r[0], r[1], r[2], r[3], r[4]) for (q, t), r in grouped.items()])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _append_raw_log(self, batch):
+        self._rotate_legacy_log()
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        new_file = not os.path.exists(self._log_path)
+        if new_file: writer.writerow(CSV_HEADER)
+        for ts, _, raw, tag, source in batch:
+            writer.writerow([datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"), raw, tag, source])
+        with open(self._log_path, "a", newline="", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        self._rotate_if_needed()
+
+    def _rotate_legacy_log(self):
+        """CSV format lama (2 kolom) disisihkan ke .legacy sekali, supaya kolom tidak campur."""
+        if self._legacy_checked: return
+        self._legacy_checked = True
+        try:
+            with open(self._log_path, "r", newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), None)
+        except OSError:
+            return
+        if header and header != CSV_HEADER:
+            os.replace(self._log_path, f"{self._log_path}.legacy")
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self._log_path) < self._log_max_bytes: return
+        except OSError:
+            return
+        if self._log_backups <= 0:
+            os.remove(self._log_path)
+            return
+        for i in range(self._log_backups - 1, 0, -1):
+            src = f"{self._log_path}.{i}"
+            if os.path.exists(src): os.replace(src, f"{self._log_path}.{i + 1}")
+        os.replace(self._log_path, f"{self._log_path}.1")
+
+    # --- READER (ADMIN) ---
+    def summary(self, limit=200, tag=None, order="count"):
+        """Agregat pencarian gagal: list dict urut count (atau last_seen) menurun."""
+        order_sql = "last_seen DESC" if order == "last_seen" else "count DESC, last_seen DESC"
+        where, params = "", []
+        if _tag_key(tag):
+            where, params = "WHERE tag = ?", [_tag_key(tag)]
+        with self._db_lock:
+            rows = self._db().execute(
+                f"SELECT query_norm, sample, tag, count, first_seen, last_seen, last_source "
+                f"FROM failed_queries {where} ORDER BY {order_sql} LIMIT ?", params + [int(limit)]
+            ).fetchall()
+        return [
+            {"query": r[0], "sample": r[1], "tag": r[2] or "Semua Modul", "count": r[3],
+             "first_seen": r[4], "last_seen": r[5], "last_source": r[6]}
+            for r in rows
+        ]
+
+    def totals(self):
+        with self._db_lock:
+            row = self._db().execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM failed_queries").fetchone()
+        return {"unique_queries": row[0], "total_misses": row[1]}
+
+    def clear(self):
+        """Hapus agregat, buffer, dan log mentah (termasuk hasil rotasi)."""
+        with self._flush_lock:
+            with self._lock:
+                self._buffer = []
+                self._recent = {}
+            with self._db_lock:
+                self._db().execute("DELETE FROM failed_queries")
+            for path in [self._log_path] + [f"{self._log_path}.{i}" for i in range(1, self._log_backups + 1)]:
+                if os.path.exists(path): os.remove(path)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, buffered=len(self._buffer))
+
+_LOGGER = MissLogger()
+atexit.register(_LOGGER.flush)
+
+def log_miss(query, tag=None, source="app", dedupe_key=None):
+    _LOGGER.log_miss(query, tag, source, dedupe_key)
+
+def flush():
+    return _LOGGER.flush()
+
+def get_failed_summary(limit=200, tag=None, order="count"):
+    _LOGGER.flush()  # Admin lihat miss dari proses ini juga, tanpa tunggu interval
+    return _LOGGER.summary(limit, tag, order)
+
+def get_failed_totals():
+    return _LOGGER.totals()
+
+def clear_failed_searches():
+    _LOGGER.clear()
+
+def get_stats():
+    return _LOGGER.stats()
@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from . import state
+from .utils import normalize_query
+from .config import SNAPSHOT_CHECK_SECONDS
+
+# --- SEMANTIC ANSWER CACHE (BOT WA) ---
+# Pertanyaan yang sama sering datang dengan susunan kata sedikit beda.
+# Cache ini menyimpan (embedding query, hasil top-k) per tag:
+# - Kunci leksikal (query ternormalisasi + tag) cocok -> langsung jawab, tanpa Gemini & Chroma.
+# - Embedding query berada dalam radius cosine ketat dari entry lain -> tanpa query Chroma.
+# Memori dibatasi (max_entries slot di 1 matriks NumPy, LRU), seluruh isi dibuang
+# begitu data version (src/state.py) berubah supaya tidak ada jawaban basi.
+
+class AnswerCache:
+    def __init__(self, max_entries=1000, min_similarity=0.97, ttl_seconds=3600,
+                 check_interval=SNAPSHOT_CHECK_SECONDS):
+        self._max_entries = max(1, int(max_entries))
+        self._min_similarity = min_similarity
+        self._ttl = ttl_seconds
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (query, tag) -> (slot, result, created)
+        self._slot_key = {}            # slot -> (query, tag), hanya entry yang punya vektor
+        self._free = list(range(self._max_entries))
+        self._matrix = None            # (max_entries, dim) vektor ter-normalisasi
+        self._tags = np.empty(self._max_entries, dtype=object)
+        self._valid = np.zeros(self._max_entries, dtype=bool)
+        self._version = None
+        self._last_check = 0.0
+        # Tiap lookup = 1x get_exact (exact_hits + exact_misses = total lookup);
+        # get_similar hanya dipanggil setelah exact miss (semantic_hits + semantic_misses).
+        self._stats = {"exact_hits": 0, "exact_misses": 0, "semantic_hits": 0, "semantic_misses": 0,
+                       "invalidations": 0}
+
+    @staticmethod
+    def _key(query_text, filter_tag):
+        tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+        return normalize_query(query_text), tag
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._slot_key.clear()
+        self._free = list(range(self._max_entries))
+        self._valid[:] = False
+
+    def invalidate(self):
+        with self._lock:
+            self._clear_locked()
+            self._stats["invalidations"] += 1
+
+    def _sync(self):
+        """Buang semua entry kalau data version berubah (dicek maksimal tiap check_interval)."""
+        now = time.monotonic()
+        if now - self._last_check < self._check_interval: return
+        self._last_check = now
+        try:
+            version = state.get_data_version()
+        except Exception as e:
+            print(f"⚠️ Answer cache gagal cek data version: {e}")
+            return
+        if version != self._version:
+            with self._lock:
+                if self._version is not None: self._stats["invalidations"] += 1
+                self._clear_locked()
+                self._version = version
+
+    def _drop_locked(self, key):
+        slot, _, _ = self._entries.pop(key)
+        if slot is not None:
+            self._valid[slot] = False
+            self._slot_key.pop(slot, None)
+            self._free.append(slot)
+
+    def _expired(self, created):
+        return self._ttl > 0 and time.monotonic() - created > self._ttl
+
+    def get_exact(self, query_text, filter_tag=None):
+        """Hit kalau query ternormalisasi + tag sama persis (tanpa embedding)."""
+        self._sync()
+        key = self._key(query_text, filter_tag)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["exact_misses"] += 1
+                return None
+            if self._expired(entry[2]):
+                self._drop_locked(key)
+                self._stats["exact_misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return copy.deepcopy(entry[1])
+
+    def get_similar(self, vector, filter_tag=None):
+        """Hit kalau ada entry (tag sama) dengan cosine >= min_similarity terhadap `vector`."""
+        self._sync()
+        key_tag = self._key("", filter_tag)[1]
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        with self._lock:
+            if self._matrix is None or norm == 0 or q.shape[0] != self._matrix.shape[1]:
+                self._stats["semantic_misses"] += 1
+                return None
+            mask = self._valid & (self._tags == key_tag)
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                self._stats["semantic_misses"] += 1
+                return None
+            sims = self._matrix[candidates] @ (q / norm)
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self._min_similarity:
+                self._stats["semantic_misses"] += 1
+                return None
+
+            key = self._slot_key[int(candidates[best])]
+            _, result, created = self._entries[key]
+            if self._expired(created):
+                self._drop_locked(key)
+                self._stats["semantic_misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["semantic_hits"] += 1
+            return copy.deepcopy(result)
+
+    def put(self, query_text, filter_tag, vector, result):
+        """Simpan hasil. `vector` boleh None (mis. hasil fast path BM25): hanya kunci leksikal."""
+        if result is None: return
+        self._sync()
+        key = self._key(query_text, filter_tag)
+        vec = None
+        if vector is not None and len(vector):
+            vec = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            vec = vec / norm if norm else None
+
+        with self._lock:
+            if key in self._entries: self._drop_locked(key)
+            while len(self._entries) >= self._max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+            slot = None
+            if vec is not None:
+                if self._matrix is None or self._matrix.shape[1] != vec.shape[0]:
+                    # Dimensi baru (ganti model embedding): mulai dari matriks kosong
+                    self._matrix = np.zeros((self._max_entries, vec.shape[0]), dtype=np.float32)
+                    for s in list(self._slot_key): self._drop_locked(self._slot_key[s])
+                slot = self._free.pop()
+                self._matrix[slot] = vec
+                self._tags[slot] = key[1]
+                self._valid[slot] = True
+                self._slot_key[slot] = key
+            self._entries[key] = (slot, copy.deepcopy(result), time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["version"] = self._version
+            return out
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from .config import BASE_DIR, BACKUP_DIR, BACKUP_KEEP_FULL
+
+# --- BACKUP ENGINE (ADMIN) ---
+# Arsip zip ditulis langsung dari file sumber (data/ & images/) ke file tujuan:
+# tanpa copytree ke folder sementara dan tanpa memuat arsip ke memori.
+# - Database SQLite (Chroma, state, cache embedding) diambil lewat online backup API
+#   supaya konsisten walau sedang dipakai Bot/Web V2 (file -wal/-shm tidak ikut).
+# - Gambar (sudah terkompresi) disimpan tanpa deflate, file lain di-deflate.
+# - Tiap arsip membawa `backup_manifest.json` (sha256, size, mtime per file).
+#   Backup incremental hanya mengarsip file yang hash-nya beda dari manifest backup
+#   terakhir (file dengan size + mtime sama tidak dibaca ulang), plus daftar file terhapus.
+# Restore: ekstrak backup penuh, lalu incremental berurutan (restore_backup).
+# Retensi: hanya BACKUP_KEEP_FULL rantai terakhir (1 penuh + incremental sesudahnya) disimpan.
+# Konsistensi: hanya file SQLite yang di-snapshot. File segment HNSW Chroma (folder UUID di
+#   data/faq_db / data/chroma_data) disalin mentah; kalau ada tulis (simpan FAQ, import massal,
+#   re-embed) saat backup berjalan, index vektor di arsip bisa tidak sinkron dengan
+#   chroma.sqlite3. Jalankan backup saat tidak ada yang menulis data (bukan jam edit Admin).
+
+BACKUP_ROOTS = ("data", "images")
+ARCHIVE_NAME = re.compile(r'^backup_faq_(full|incr)_(\d{8}_\d{6})(?:_(\d+))?\.zip$')
+MANIFEST_NAME = "backup_manifest.json"
+LAST_MANIFEST_FILE = "last_manifest.json"
+CHUNK_SIZE = 1024 * 1024
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".zip"}
+SKIPPED_NAME = re.compile(r'(-wal|-shm|-journal|\.tmp\d*|\.part)$')
+SQLITE_MAGIC = b"SQLite format 3\x00"
+ZIP64_LIMIT = (1 << 31) - 1
+
+def _iter_sources(base_dir, roots, exclude_dir):
+    """(path relatif, path penuh) semua file sumber, urut & deterministik."""
+    exclude_dir = os.path.realpath(exclude_dir)
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(base_dir, root)):
+            dirnames[:] = sorted(d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) != exclude_dir)
+            for name in sorted(filenames):
+                if SKIPPED_NAME.search(name): continue
+                full_path = os.path.join(dirpath, name)
+                yield os.path.relpath(full_path, base_dir).replace(os.sep, "/"), full_path
+
+def _is_sqlite(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+@contextmanager
+def _sqlite_snapshot(path, tmp_dir):
+    """Salinan konsisten database yang sedang dipakai (sqlite3 backup API)."""
+    fd, tmp_path = tempfile.mkstemp(suffix=".sqlite.tmp", dir=tmp_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(path, timeout=10)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _write_member(zf, rel_path, src_path, size, mtime_ns):
+    """Stream 1 file ke zip sambil menghitung sha256-nya (1x baca)."""
+    timestamp = time.localtime(max(mtime_ns / 1e9, 315532800))  # zip tidak kenal tanggal < 1980
+    info = zipfile.ZipInfo(rel_path, date_time=timestamp[:6])
+    ext = os.path.splitext(rel_path)[1].lower()
+    info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    info.file_size = size
+
+    digest = hashlib.sha256()
+    with open(src_path, "rb") as src, zf.open(info, "w", force_zip64=size > ZIP64_LIMIT) as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def _archive_file(zf, rel_path, src_path, mtime_ns, prev, trust_stat):
+    """Return (entry manifest, True kalau file masuk arsip)."""
+    size = os.path.getsize(src_path)
+    if prev is not None:
+        if trust_stat and prev.get("size") == size and prev.get("mtime_ns") == mtime_ns:
+            return dict(prev), False
+        digest = _hash_file(src_path)
+        if digest == prev.get("sha256"):
+            return {"sha256": digest, "size": size, "mtime_ns": mtime_ns}, False
+    digest = _write_member(zf, rel_path, src_path, size, mtime_ns)
+    return {"sha256": digest, "size": size, "mtime_ns": mtime_ns}, True
+
+def write_backup(fileobj, base_manifest=None, base_dir=BASE_DIR, roots=BACKUP_ROOTS, backup_dir=BACKUP_DIR):
+    """
+    Tulis arsip zip ke `fileobj` (boleh stream non-seekable).
+    base_manifest=None -> backup penuh, selain itu incremental terhadap manifest tersebut.
+    Return (manifest, stats).
+    """
+    incremental = base_manifest is not None
+    base_files = (base_manifest or {}).get("files", {})
+    files = {}
+    stats = {"files": 0, "archived": 0, "archived_bytes": 0}
+
+    with zipfile.ZipFile(fileobj, "w", allowZip64=True) as zf:
+        for rel_path, full_path in _iter_sources(base_dir, roots, backup_dir):
+            try:
+                mtime_ns = os.stat(full_path).st_mtime_ns
+            except OSError:
+                continue  # file dihapus saat backup berjalan
+            prev = base_files.get(rel_path) if incremental else None
+
+            if _is_sqlite(full_path):
+                try:
+                    with _sqlite_snapshot(full_path, backup_dir) as snapshot:
+                        # mtime database bisa tetap walau isi berubah (WAL): selalu cek hash
+                        entry, archived = _archive_file(zf, rel_path, snapshot, mtime_ns, prev, trust_stat=False)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Snapshot SQLite {rel_path} gagal, arsip file mentah: {e}")
+                    entry, archived = _archive_file(zf, rel_path, full_path, mtime_ns, prev, trust_stat=False)
+            else:
+                entry, archived = _archive_file(zf, rel_path, full_path, mtime_ns, prev, trust_stat=True)
+
+            files[rel_path] = entry
+            stats["files"] += 1
+            if archived:
+                stats["archived"] += 1
+                stats["archived_bytes"] += entry["size"]
+
+        manifest = {
+            "format": 1,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "type": "incremental" if incremental else "full",
+            "base": base_manifest.get("created") if incremental else None,
+            "files": files,
+            "deleted": sorted(set(base_files) - set(files)),
+        }
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+
+    stats["deleted"] = len(manifest["deleted"])
+    return manifest, stats
+
+def load_last_manifest(backup_dir=BACKUP_DIR):
+    try:
+        with open(os.path.join(backup_dir, LAST_MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_last_manifest(manifest, backup_dir):
+    target = os.path.join(backup_dir, LAST_MANIFEST_FILE)
+    fd, tmp_path = tempfile.mkstemp(dir=backup_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def create_backup(incremental=False, backup_dir=BACKUP_DIR, base_dir=BASE_DIR):
+    """
+    Buat arsip di `backup_dir`. Incremental tanpa manifest sebelumnya -> otomatis penuh.
+    Return stats + path, type, size (byte arsip).
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    base_manifest = load_last_manifest(backup_dir) if incremental else None
+    if incremental and base_manifest is None:
+        print("ℹ️ Belum ada manifest backup sebelumnya, membuat backup penuh.")
+    kind = "incr" if base_manifest is not None else "full"
+
+    stem = os.path.join(backup_dir, f"backup_faq_{kind}_{time.strftime('%Y%m%d_%H%M%S')}")
+    archive_path, n = f"{stem}.zip", 1
+    while os.path.exists(archive_path):  # jangan timpa arsip lain di detik yang sama
+        archive_path, n = f"{stem}_{n}.zip", n + 1
+    part_path = f"{archive_path}.part"
+    try:
+        with open(part_path, "wb") as f:
+            manifest, stats = write_backup(f, base_manifest, base_dir=base_dir, backup_dir=backup_dir)
+        os.replace(part_path, archive_path)
+    finally:
+        if os.path.exists(part_path): os.remove(part_path)
+
+    _save_last_manifest(manifest, backup_dir)
+    stats.update(path=archive_path, type=kind, size=os.path.getsize(archive_path))
+    stats["pruned"] = prune_backups(backup_dir)
+    print(f"💾 Backup {kind}: {stats['archived']}/{stats['files']} file diarsip -> {archive_path}")
+    return stats
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """[(kind, path)] arsip di `backup_dir`, urut dari yang terlama."""
+    found = []
+    try:
+        names = os.listdir(backup_dir)
+    except OSError:
+        return []
+    for name in names:
+        match = ARCHIVE_NAME.match(name)
+        if match:
+            found.append(((match.group(2), int(match.group(3) or 0)), match.group(1), os.path.join(backup_dir, name)))
+    return [(kind, path) for _, kind, path in sorted(found)]
+
+def prune_backups(backup_dir=BACKUP_DIR, keep_full=BACKUP_KEEP_FULL):
+    """Hapus rantai lama: simpan `keep_full` backup penuh terakhir + incremental sesudahnya."""
+    if keep_full <= 0: return 0
+    archives = list_backups(backup_dir)
+    fulls = [i for i, (kind, _) in enumerate(archives) if kind == "full"]
+    if len(fulls) <= keep_full: return 0
+    cutoff = fulls[-keep_full]
+    for _, path in archives[:cutoff]:
+        os.remove(path)
+    print(f"🧹 {cutoff} arsip backup lama dihapus (simpan {keep_full} backup penuh terakhir)")
+    return cutoff
+
+def restore_backup(archive_paths, target_dir=BASE_DIR):
+    """Terapkan arsip berurutan (penuh dulu, lalu incremental) ke `target_dir`."""
+    for archive_path in archive_paths:
+        with zipfile.ZipFile(archive_path) as zf:
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+            for info in zf.infolist():
+                if info.filename == MANIFEST_NAME: continue
+                with zf.open(info) as src, open(_safe_target(target_dir, info.filename), "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        for rel_path in manifest.get("deleted", []):
+            path = _safe_target(target_dir, rel_path, create_dirs=False)
+            if os.path.exists(path): os.remove(path)
+
+def _safe_target(target_dir, rel_path, create_dirs=True):
+    root = os.path.realpath(target_dir)
+    path = os.path.realpath(os.path.join(root, rel_path))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"Path arsip tidak valid: {rel_path}")
+    if create_dirs: os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
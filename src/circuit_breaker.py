@@ -0,0 +1,73 @@
+import threading
+import time
+from .config import EMBED_BREAKER_FAILURES, EMBED_BREAKER_COOLDOWN_SECONDS
+
+# --- CIRCUIT BREAKER (EMBEDDING PROVIDER) ---
+# Kalau Gemini lambat/mati, tiap search menunggu sampai timeout lalu gagal. Breaker
+# menghitung kegagalan berturut-turut; setelah `failure_threshold` kali breaker
+# terbuka dan panggilan langsung ditolak (search pindah ke mode darurat) selama
+# `cooldown` detik. Setelah itu 1 panggilan percobaan (half-open) boleh lewat:
+# sukses = tertutup lagi, gagal = terbuka lagi untuk cooldown berikutnya.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=EMBED_BREAKER_FAILURES, cooldown=EMBED_BREAKER_COOLDOWN_SECONDS):
+        self._threshold = max(1, failure_threshold)
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._stats = {"allowed": 0, "rejected": 0, "failures": 0, "opened": 0}
+
+    def allow(self):
+        """Boleh memanggil provider? (half-open: hanya 1 percobaan sekaligus)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self._cooldown:
+                self._state = HALF_OPEN
+                self._probe_started = 0.0
+            if self._state == HALF_OPEN:
+                # Percobaan yang hilang (hasilnya tidak pernah dicatat) tidak mengunci selamanya
+                if self._probe_started and now - self._probe_started < self._cooldown:
+                    self._stats["rejected"] += 1
+                    return False
+                self._probe_started = now
+            elif self._state == OPEN:
+                self._stats["rejected"] += 1
+                return False
+            self._stats["allowed"] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats["failures"] += 1
+            if self._state == HALF_OPEN or self._failures >= self._threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                    print(f"🔌 Circuit breaker embedding TERBUKA ({self._failures}x gagal), "
+                          f"mode darurat {self._cooldown:.0f} detik")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return dict(self._stats, state=state, consecutive_failures=self._failures)
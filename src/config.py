@@ -7,8 +7,11 @@ load_dotenv()
 # --- API KEYS & AUTH ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 ADMIN_PASSWORD_HASH = os.getenv("ADMIN_PASSWORD_HASH", "admin")
+# gemini | local (sentence-transformers, CPU) | hashing (CPU, tanpa model) | fake (deterministik, testing)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini").strip().lower()
 
-if not GOOGLE_API_KEY:
+# API key hanya wajib kalau embedding lewat Gemini
+if not GOOGLE_API_KEY and EMBEDDING_PROVIDER == "gemini":
     raise ValueError("❌ GOOGLE_API_KEY belum diset! Cek file .env.")
 
 # --- PATHS CONFIGURATION ---
@@ -17,7 +20,9 @@ DB_PATH = os.path.join(BASE_DIR, "data", "faq_db")
 TAGS_FILE = os.path.join(BASE_DIR, "data", "tags_config.json")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
 FAILED_SEARCH_LOG = os.path.join(BASE_DIR, "data", "failed_searches.csv")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(BASE_DIR, "data", "state.sqlite"))
 COLLECTION_NAME = "faq_universal_v1"
+EMBEDDING_MODEL = "models/gemini-embedding-001"
 
 # Setup Folder
 os.makedirs(os.path.join(BASE_DIR, "data"), exist_ok=True)
@@ -31,4 +36,248 @@ try:
 except ValueError:
     print("⚠️ Format angka di .env salah, menggunakan default (80.0 & 10.0)")
     BOT_MIN_SCORE = 80.0
-    BOT_MIN_GAP = 10.0
\ No newline at end of file
+    BOT_MIN_GAP = 10.0
+
+# --- CHROMA CONNECTION POOL ---
+# Client + collection handle dipakai ulang per proses (Bot, Web V2, script).
+# IDLE_TTL: client dibuang & dibuat ulang kalau nganggur lebih lama dari ini (detik).
+# HEALTHCHECK_INTERVAL: jeda minimal antar heartbeat ke server (detik).
+try:
+    CHROMA_POOL_IDLE_TTL = float(os.getenv("CHROMA_POOL_IDLE_TTL", "300"))
+    CHROMA_HEALTHCHECK_INTERVAL = float(os.getenv("CHROMA_HEALTHCHECK_INTERVAL", "30"))
+except ValueError:
+    print("⚠️ Format CHROMA_POOL_* di .env salah, menggunakan default (300 & 30)")
+    CHROMA_POOL_IDLE_TTL = 300.0
+    CHROMA_HEALTHCHECK_INTERVAL = 30.0
+
+# --- PERSISTENT EMBEDDING CACHE ---
+# File SQLite di folder data/ dipakai bersama semua container (Bot, Web V2, App, Admin).
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "data", "embedding_cache.sqlite"))
+try:
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+    EMBEDDING_CACHE_TTL_DAYS = float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "30"))
+except ValueError:
+    print("⚠️ Format EMBEDDING_CACHE_* di .env salah, menggunakan default (20000 & 30 hari)")
+    EMBEDDING_CACHE_MAX_ENTRIES = 20000
+    EMBEDDING_CACHE_TTL_DAYS = 30.0
+
+# --- BULK UPSERT (IMPORT SOP MASSAL) ---
+# EMBED_BATCH_SIZE: jumlah teks per request embed_content (limit Gemini = 100).
+# EMBED_MAX_CONCURRENCY: jumlah request embedding paralel (jaga kuota).
+# UPSERT_CHUNK_SIZE: jumlah dokumen per col.upsert.
+try:
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+    EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+    UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", "500"))
+except ValueError:
+    print("⚠️ Format EMBED_*/UPSERT_* di .env salah, menggunakan default (100, 4, 500)")
+    EMBED_BATCH_SIZE = 100
+    EMBED_MAX_CONCURRENCY = 4
+    UPSERT_CHUNK_SIZE = 500
+
+# --- EMBEDDING PROVIDER ---
+# EMBEDDING_PROVIDER (lihat atas) dicatat di metadata collection Chroma; ganti provider
+#   = vektor lama tidak kompatibel, jalankan database.reembed_collection().
+# EMBEDDING_DIM: dimensi output (0 = default provider: gemini 3072, hashing 768, fake 64).
+# EMBEDDING_LOCAL_MODEL: model sentence-transformers untuk provider `local`.
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+try:
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+except ValueError:
+    print("⚠️ Format EMBEDDING_DIM di .env salah, menggunakan default provider")
+    EMBEDDING_DIM = 0
+
+# --- EMBEDDING TIMEOUT & CIRCUIT BREAKER ---
+# EMBED_TIMEOUT_SECONDS: batas waktu 1 panggilan embedding (search/upsert), lewat = gagal.
+# EMBED_BATCH_TIMEOUT_SECONDS: batas waktu 1 batch embedding (import massal / re-embed).
+# EMBED_BREAKER_FAILURES: gagal/timeout berturut-turut sebelum breaker terbuka.
+# EMBED_BREAKER_COOLDOWN_SECONDS: lama breaker terbuka sebelum 1 panggilan percobaan.
+# Selama breaker terbuka, search jalan di mode darurat (kata kunci judul/keywords_raw).
+try:
+    EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", "5"))
+    EMBED_BATCH_TIMEOUT_SECONDS = float(os.getenv("EMBED_BATCH_TIMEOUT_SECONDS", "60"))
+    EMBED_BREAKER_FAILURES = int(os.getenv("EMBED_BREAKER_FAILURES", "5"))
+    EMBED_BREAKER_COOLDOWN_SECONDS = float(os.getenv("EMBED_BREAKER_COOLDOWN_SECONDS", "30"))
+except ValueError:
+    print("⚠️ Format EMBED_TIMEOUT_*/EMBED_BREAKER_* di .env salah, menggunakan default (5s, 60s, 5x, 30s)")
+    EMBED_TIMEOUT_SECONDS = 5.0
+    EMBED_BATCH_TIMEOUT_SECONDS = 60.0
+    EMBED_BREAKER_FAILURES = 5
+    EMBED_BREAKER_COOLDOWN_SECONDS = 30.0
+
+# --- LOCAL VECTOR INDEX (NUMPY MIRROR, OPSIONAL) ---
+# LOCAL_VECTOR_INDEX=1: search_faq / search_faq_for_bot dijawab dari matriks NumPy di memori.
+# Chroma tetap Source of Truth; index disinkronkan lewat data version (data/state.sqlite).
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "0").strip().lower() in ("1", "true", "yes")
+try:
+    VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "2"))
+    VECTOR_INDEX_FULL_SYNC_SECONDS = float(os.getenv("VECTOR_INDEX_FULL_SYNC_SECONDS", "300"))
+except ValueError:
+    print("⚠️ Format VECTOR_INDEX_* di .env salah, menggunakan default (2 & 300)")
+    VECTOR_INDEX_REFRESH_SECONDS = 2.0
+    VECTOR_INDEX_FULL_SYNC_SECONDS = 300.0
+
+# --- DATA VERSION CHECK (ANSWER CACHE) ---
+# Jeda minimal (detik) antar pengecekan data version sebelum isi cache dipakai ulang.
+try:
+    SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "1"))
+except ValueError:
+    print("⚠️ Format SNAPSHOT_CHECK_SECONDS di .env salah, menggunakan default (1)")
+    SNAPSHOT_CHECK_SECONDS = 1.0
+
+# --- DOC INDEX (PAGINASI SERVER-SIDE) ---
+# Jeda (detik) antar pengecekan jumlah dokumen Chroma vs doc_index di data/state.sqlite.
+try:
+    DOC_INDEX_SYNC_SECONDS = float(os.getenv("DOC_INDEX_SYNC_SECONDS", "60"))
+except ValueError:
+    print("⚠️ Format DOC_INDEX_SYNC_SECONDS di .env salah, menggunakan default (60)")
+    DOC_INDEX_SYNC_SECONDS = 60.0
+
+# --- LEXICAL INDEX (BM25) & HYBRID SEARCH ---
+# LEXICAL_INDEX=1 (opsional, default mati): inverted index BM25 di memori atas judul,
+#   keywords_raw & jawaban_tampil. Mengubah ranking (hybrid), jadi diaktifkan eksplisit.
+# LEXICAL_FASTPATH=1 (opsional, butuh LEXICAL_INDEX): query yang jelas cocok secara kata
+#   dijawab tanpa embedding Gemini; hasilnya ditandai "cocok kata kunci", bukan skor semantik.
+# HYBRID_LEXICAL_WEIGHT: seberapa besar kecocokan kata menaikkan skor vektor (0..1).
+# LEXICAL_FASTPATH_MIN_SCORE: coverage minimal kata query di judul/keyword (0..1).
+# LEXICAL_FASTPATH_MIN_TERMS: jumlah kata (non-stopword) minimal agar fast path aktif.
+# LEXICAL_FASTPATH_MARGIN: BM25 top hit harus >= margin x BM25 hit kedua.
+LEXICAL_INDEX = os.getenv("LEXICAL_INDEX", "0").strip().lower() in ("1", "true", "yes")
+LEXICAL_FASTPATH = os.getenv("LEXICAL_FASTPATH", "0").strip().lower() in ("1", "true", "yes")
+try:
+    LEXICAL_INDEX_REFRESH_SECONDS = float(os.getenv("LEXICAL_INDEX_REFRESH_SECONDS", "2"))
+    HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.3"))
+    LEXICAL_FASTPATH_MIN_SCORE = float(os.getenv("LEXICAL_FASTPATH_MIN_SCORE", "0.9"))
+    LEXICAL_FASTPATH_MIN_TERMS = int(os.getenv("LEXICAL_FASTPATH_MIN_TERMS", "2"))
+    LEXICAL_FASTPATH_MARGIN = float(os.getenv("LEXICAL_FASTPATH_MARGIN", "1.5"))
+except ValueError:
+    print("⚠️ Format LEXICAL_*/HYBRID_* di .env salah, menggunakan default (2, 0.3, 0.9, 2, 1.5)")
+    LEXICAL_INDEX_REFRESH_SECONDS = 2.0
+    HYBRID_LEXICAL_WEIGHT = 0.3
+    LEXICAL_FASTPATH_MIN_SCORE = 0.9
+    LEXICAL_FASTPATH_MIN_TERMS = 2
+    LEXICAL_FASTPATH_MARGIN = 1.5
+
+# --- SEMANTIC ANSWER CACHE (BOT WA) ---
+# ANSWER_CACHE=1: hasil search_faq_for_bot di-cache per (query, tag) & per embedding query.
+# ANSWER_CACHE_MIN_SIMILARITY: cosine minimal antar embedding query agar dianggap pertanyaan sama.
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1").strip().lower() in ("1", "true", "yes")
+try:
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", "0.97"))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+except ValueError:
+    print("⚠️ Format ANSWER_CACHE_* di .env salah, menggunakan default (1000, 0.97, 3600)")
+    ANSWER_CACHE_MAX_ENTRIES = 1000
+    ANSWER_CACHE_MIN_SIMILARITY = 0.97
+    ANSWER_CACHE_TTL_SECONDS = 3600.0
+
+# --- WPPCONNECT OUTBOUND CLIENT (BOT WA) ---
+# WPP_TIMEOUT / WPP_CONNECT_TIMEOUT: batas waktu request kirim pesan (detik).
+# WPP_POOL_SIZE: jumlah koneksi keep-alive ke WPPConnect.
+# WPP_SEND_INTERVAL: jeda antar bubble dalam 1 chat (detik, non-blocking).
+# WPP_CHAT_IDLE_SECONDS: worker antrian per chat berhenti kalau nganggur selama ini.
+try:
+    WPP_TIMEOUT = float(os.getenv("WPP_TIMEOUT", "20"))
+    WPP_CONNECT_TIMEOUT = float(os.getenv("WPP_CONNECT_TIMEOUT", "5"))
+    WPP_POOL_SIZE = int(os.getenv("WPP_POOL_SIZE", "10"))
+    WPP_SEND_INTERVAL = float(os.getenv("WPP_SEND_INTERVAL", "0.5"))
+    WPP_CHAT_IDLE_SECONDS = float(os.getenv("WPP_CHAT_IDLE_SECONDS", "30"))
+except ValueError:
+    print("⚠️ Format WPP_* di .env salah, menggunakan default (20, 5, 10, 0.5, 30)")
+    WPP_TIMEOUT = 20.0
+    WPP_CONNECT_TIMEOUT = 5.0
+    WPP_POOL_SIZE = 10
+    WPP_SEND_INTERVAL = 0.5
+    WPP_CHAT_IDLE_SECONDS = 30.0
+
+# --- GAMBAR BOT WA ---
+# WPP_IMAGE_MODE: "base64" (default, file di-encode & dikirim di payload) atau
+#   "url" (WPPConnect mengambil gambar sendiri dari /images Web V2, bot tanpa kerja disk).
+# WPP_IMAGE_BASE_URL: alamat Web V2 yang bisa dijangkau container WPPConnect
+#   (misal http://faq-web-v2:8080). Kosong = pakai WEB_V2_URL di bot_wa.py.
+# WPP_IMAGE_CACHE_MB: batas memori cache payload base64 (mode base64).
+WPP_IMAGE_MODE = os.getenv("WPP_IMAGE_MODE", "base64").strip().lower()
+WPP_IMAGE_BASE_URL = os.getenv("WPP_IMAGE_BASE_URL", "").strip()
+try:
+    WPP_IMAGE_CACHE_MB = float(os.getenv("WPP_IMAGE_CACHE_MB", "64"))
+except ValueError:
+    print("⚠️ Format WPP_IMAGE_CACHE_MB di .env salah, menggunakan default (64)")
+    WPP_IMAGE_CACHE_MB = 64.0
+
+# --- WEBHOOK QUEUE (BOT WA) ---
+# BOT_WORKERS: jumlah pesan yang diproses bersamaan.
+# BOT_QUEUE_SIZE: batas antrian; kalau penuh, pesan baru ditolak (load shedding).
+# BOT_DEDUPE_SECONDS: jendela waktu ID pesan diingat (WPPConnect bisa kirim
+#   onMessage + onAnyMessage untuk pesan yang sama).
+try:
+    BOT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+    BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "200"))
+    BOT_DEDUPE_SECONDS = float(os.getenv("BOT_DEDUPE_SECONDS", "120"))
+except ValueError:
+    print("⚠️ Format BOT_WORKERS/BOT_QUEUE_SIZE/BOT_DEDUPE_SECONDS di .env salah, menggunakan default (8, 200, 120)")
+    BOT_WORKERS = 8
+    BOT_QUEUE_SIZE = 200
+    BOT_DEDUPE_SECONDS = 120.0
+
+# --- DEBOUNCE & RATE LIMIT (BOT WA) ---
+# BOT_DEBOUNCE_SECONDS: pesan beruntun dari chat/pengirim yang sama dalam jeda ini
+#   digabung jadi 1 pertanyaan (0 = mati). BOT_DEBOUNCE_MAX_SECONDS: batas tunggu total.
+# BOT_CHAT_RATE_PER_MIN / BOT_CHAT_BURST: token bucket per chat (atau per pengirim di grup).
+# BOT_GROUP_RATE_PER_MIN / BOT_GROUP_BURST: token bucket total per grup.
+try:
+    BOT_DEBOUNCE_SECONDS = float(os.getenv("BOT_DEBOUNCE_SECONDS", "1.5"))
+    BOT_DEBOUNCE_MAX_SECONDS = float(os.getenv("BOT_DEBOUNCE_MAX_SECONDS", "5"))
+    BOT_CHAT_RATE_PER_MIN = float(os.getenv("BOT_CHAT_RATE_PER_MIN", "6"))
+    BOT_CHAT_BURST = float(os.getenv("BOT_CHAT_BURST", "3"))
+    BOT_GROUP_RATE_PER_MIN = float(os.getenv("BOT_GROUP_RATE_PER_MIN", "20"))
+    BOT_GROUP_BURST = float(os.getenv("BOT_GROUP_BURST", "6"))
+except ValueError:
+    print("⚠️ Format BOT_DEBOUNCE_*/BOT_*_RATE/BURST di .env salah, menggunakan default (1.5, 5, 6, 3, 20, 6)")
+    BOT_DEBOUNCE_SECONDS = 1.5
+    BOT_DEBOUNCE_MAX_SECONDS = 5.0
+    BOT_CHAT_RATE_PER_MIN = 6.0
+    BOT_CHAT_BURST = 3.0
+    BOT_GROUP_RATE_PER_MIN = 20.0
+    BOT_GROUP_BURST = 6.0
+
+# --- IMAGE PIPELINE (UPLOAD ADMIN) ---
+# IMAGE_WORKERS: jumlah proses paralel untuk encode gambar upload (0 = berurutan di proses admin).
+try:
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+except ValueError:
+    IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+    print(f"⚠️ Format IMAGE_WORKERS di .env salah, menggunakan default ({IMAGE_WORKERS})")
+
+# --- BACKUP ---
+# BACKUP_DIR: lokasi arsip backup + manifest incremental (dikecualikan dari isi backup).
+# BACKUP_DOWNLOAD_MAX_MB: arsip lebih besar dari ini tidak ditawarkan lewat tombol download
+#   Streamlit (yang memuat file ke memori), ambil langsung dari BACKUP_DIR di server.
+# BACKUP_KEEP_FULL: jumlah backup penuh terakhir (beserta incremental-nya) yang disimpan,
+#   rantai yang lebih lama dihapus otomatis setelah backup baru jadi (0 = simpan semua).
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(BASE_DIR, "data", "backups"))
+try:
+    BACKUP_DOWNLOAD_MAX_MB = float(os.getenv("BACKUP_DOWNLOAD_MAX_MB", "512"))
+    BACKUP_KEEP_FULL = int(os.getenv("BACKUP_KEEP_FULL", "3"))
+except ValueError:
+    print("⚠️ Format BACKUP_DOWNLOAD_MAX_MB/BACKUP_KEEP_FULL di .env salah, menggunakan default (512 & 3)")
+    BACKUP_DOWNLOAD_MAX_MB = 512.0
+    BACKUP_KEEP_FULL = 3
+
+# --- ANALYTICS (PENCARIAN GAGAL) ---
+# ANALYTICS_DB_PATH: agregat per query (count, first/last seen, tag) yang dibaca tab Analytics.
+# ANALYTICS_FLUSH_SECONDS: interval writer background menulis buffer ke disk.
+# ANALYTICS_DEDUPE_SECONDS: query sama dari sesi/chat yang sama dalam jendela ini dihitung 1x.
+# ANALYTICS_LOG_MAX_MB / ANALYTICS_LOG_BACKUPS: rotasi log mentah FAILED_SEARCH_LOG.
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", os.path.join(BASE_DIR, "data", "analytics.sqlite"))
+try:
+    ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "5"))
+    ANALYTICS_DEDUPE_SECONDS = float(os.getenv("ANALYTICS_DEDUPE_SECONDS", "300"))
+    ANALYTICS_LOG_MAX_MB = float(os.getenv("ANALYTICS_LOG_MAX_MB", "5"))
+    ANALYTICS_LOG_BACKUPS = int(os.getenv("ANALYTICS_LOG_BACKUPS", "3"))
+except ValueError:
+    print("⚠️ Format ANALYTICS_* di .env salah, menggunakan default (5, 300, 5, 3)")
+    ANALYTICS_FLUSH_SECONDS = 5.0
+    ANALYTICS_DEDUPE_SECONDS = 300.0
+    ANALYTICS_LOG_MAX_MB = 5.0
+    ANALYTICS_LOG_BACKUPS = 3
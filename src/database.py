@@ -14,10 +14,34 @@ import time
 import functools
 import random
 import os
-from google import genai
-from google.genai import types
-from .config import GOOGLE_API_KEY, DB_PATH, COLLECTION_NAME
-from .utils import clean_text_for_embedding, load_tags_config
+import threading
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from .config import (
+    DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL,
+    CHROMA_POOL_IDLE_TTL, CHROMA_HEALTHCHECK_INTERVAL,
+    EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY, UPSERT_CHUNK_SIZE,
+    EMBED_TIMEOUT_SECONDS, EMBED_BATCH_TIMEOUT_SECONDS,
+    LOCAL_VECTOR_INDEX, DOC_INDEX_SYNC_SECONDS,
+    LEXICAL_INDEX, LEXICAL_FASTPATH, HYBRID_LEXICAL_WEIGHT,
+    LEXICAL_FASTPATH_MIN_SCORE, LEXICAL_FASTPATH_MIN_TERMS, LEXICAL_FASTPATH_MARGIN,
+    ANSWER_CACHE, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MIN_SIMILARITY, ANSWER_CACHE_TTL_SECONDS
+)
+from .utils import clean_text_for_embedding, load_tags_config, normalize_query, get_max_numeric_id
+from .embedding_cache import get_embedding_cache
+from .embeddings import GeminiProvider, get_provider, batch_limits
+from .singleflight import SingleFlight
+from .vector_index import VectorIndex
+from .lexical_index import LexicalIndex, hybrid_merge, keyword_result, tokenize
+from .circuit_breaker import CircuitBreaker
+from .answer_cache import AnswerCache
+from .image_pipeline import parse_variants, variants_for_paths
+from .metrics import (
+    EMBEDDING_SECONDS, CACHE_REQUESTS, LOCK_RETRIES, SEARCH_DEGRADED, TimedCollection, AsyncTimedCollection, REGISTRY,
+    stats_collector
+)
+from . import state
 
 # --- 3. RETRY DECORATOR (SAFE CONCURRENCY) ---
 def retry_on_lock(max_retries=10, base_delay=0.1):
@@ -36,6 +60,7 @@ def retry_on_lock(max_retries=10, base_delay=0.1):
                     err_msg = str(e).lower()
                     if "locked" in err_msg or "busy" in err_msg:
                         retries += 1
+                        LOCK_RETRIES.inc(func=func.__name__)
                         sleep_time = base_delay * (1 + random.random())
                         time.sleep(sleep_time)
                     else:
@@ -44,13 +69,30 @@ def retry_on_lock(max_retries=10, base_delay=0.1):
         return wrapper
     return decorator
 
+def async_retry_on_lock(max_retries=10, base_delay=0.1):
+    """Versi async dari retry_on_lock (backoff pakai asyncio.sleep, tidak memblok event loop)."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            retries = 0
+            while retries < max_retries:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    err_msg = str(e).lower()
+                    if "locked" in err_msg or "busy" in err_msg:
+                        retries += 1
+                        LOCK_RETRIES.inc(func=func.__name__)
+                        await asyncio.sleep(base_delay * (1 + random.random()))
+                    else:
+                        raise e
+            raise Exception("Database sedang sibuk (High Traffic), silakan coba lagi sesaat.")
+        return wrapper
+    return decorator
+
 # --- 4. RAW FUNCTIONS (UNTUK BOT WA / API) ---
 # Fungsi-fungsi ini TIDAK menggunakan @st.cache, jadi aman dipanggil script luar.
 
-def _get_ai_client_raw():
-    """Membuat koneksi ke Google Gemini (Tanpa Cache Streamlit)"""
-    return genai.Client(api_key=GOOGLE_API_KEY)
-
 def _get_db_client_raw():
     """
     Logika Cerdas:
@@ -68,81 +110,486 @@ def _get_db_client_raw():
         # Local Mode (Fallback)
         return chromadb.PersistentClient(path=DB_PATH)
 
-def _generate_embedding_raw(text):
-    """Generate Embedding langsung (Tanpa Cache Streamlit)"""
-    client = _get_ai_client_raw()
-    try:
-        response = client.models.embed_content(
-            model="models/gemini-embedding-001",
-            contents=text,
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
+class ChromaPool:
+    """
+    Pool koneksi Chroma per proses (Thread-Safe, Tanpa Cache Streamlit).
+    Menyimpan 1 client + 1 collection handle yang dipakai ulang oleh Bot WA,
+    Web V2, maupun script, jadi tiap query tidak perlu bikin HttpClient,
+    heartbeat & lookup collection lagi.
+    - Health check: heartbeat maksimal sekali per `health_interval` detik.
+    - Reconnect: handle dibuang kalau heartbeat/operasi gagal.
+    - Idle lifetime: handle dibuang kalau nganggur lebih dari `idle_ttl` detik.
+    """
+    def __init__(self, client_factory, collection_name,
+                 idle_ttl=CHROMA_POOL_IDLE_TTL, health_interval=CHROMA_HEALTHCHECK_INTERVAL,
+                 on_connect=None):
+        self._factory = client_factory
+        self._collection_name = collection_name
+        self._on_connect = on_connect
+        self._idle_ttl = idle_ttl
+        self._health_interval = health_interval
+        self._lock = threading.RLock()
+        self._client = None
+        self._collection = None
+        self._last_used = 0.0
+        self._last_check = 0.0
+
+    def _reset(self):
+        self._client = None
+        self._collection = None
+
+    def _is_healthy(self):
+        try:
+            self._client.heartbeat()
+            return True
+        except Exception as e:
+            print(f"⚠️ Chroma heartbeat gagal, reconnect: {e}")
+            return False
+
+    def _ensure(self):
+        now = time.monotonic()
+        if self._collection is not None:
+            if now - self._last_used > self._idle_ttl:
+                self._reset()
+            elif now - self._last_check > self._health_interval:
+                self._last_check = now
+                if not self._is_healthy():
+                    self._reset()
+
+        if self._collection is None:
+            self._client = self._factory()
+            # Proxy: durasi col.query / col.get tercatat di metrics (faq_chroma_seconds)
+            self._collection = TimedCollection(self._client.get_or_create_collection(name=self._collection_name))
+            self._last_check = now
+            if self._on_connect:
+                try: self._on_connect(self._collection)
+                except Exception as e: print(f"⚠️ Cek collection saat connect gagal: {e}")
+
+        self._last_used = now
+
+    def get_client(self):
+        with self._lock:
+            self._ensure()
+            return self._client
+
+    def get_collection(self):
+        with self._lock:
+            self._ensure()
+            return self._collection
+
+    def invalidate(self):
+        """Paksa reconnect pada pemanggilan berikutnya."""
+        with self._lock:
+            self._reset()
+
+    def run(self, operation):
+        """
+        Jalankan `operation(collection)`. Kalau gagal karena koneksi (bukan lock),
+        handle dibuang lalu dicoba sekali lagi dengan koneksi baru.
+        Error 'locked/busy' tetap dilempar agar ditangani oleh retry_on_lock.
+        """
+        col = self.get_collection()
+        try:
+            return operation(col)
+        except Exception as e:
+            err_msg = str(e).lower()
+            if "locked" in err_msg or "busy" in err_msg:
+                raise
+            print(f"⚠️ Operasi Chroma gagal, mencoba reconnect: {e}")
+            self.invalidate()
+            return operation(self.get_collection())
+
+# --- PROVIDER EMBEDDING PEMBANGUN COLLECTION ---
+# Metadata collection mencatat provider/model/dimensi yang membangun vektornya.
+# Collection lama (sebelum ada provider) berisi vektor Gemini. Kalau provider aktif beda,
+# vektor query & dokumen tidak sebanding: tulis ditolak sampai reembed_collection() dijalankan.
+# Saat connect (termasuk proses read-only Bot/Web V2) metadata hanya DIBACA; dicatat
+# hanya oleh write path (upsert_faq, upsert_faq_many, reembed_collection).
+_PROVIDER_MISMATCH = None
+LEGACY_BUILT_BY = {"embedding_provider": "gemini", "embedding_model": EMBEDDING_MODEL,
+                   "embedding_dim": GeminiProvider.DEFAULT_DIMENSION}
+
+def _collection_built_by(col):
+    """(info pembangun atau None kalau collection kosong & belum tercatat, sudah tercatat?)"""
+    meta = col.metadata or {}
+    if "embedding_provider" in meta:
+        return {k: meta.get(k) for k in LEGACY_BUILT_BY}, True
+    if col.count() == 0: return None, False
+    return dict(LEGACY_BUILT_BY), False
+
+def _check_collection_provider(col):
+    """Dipanggil saat pool connect: baca metadata, peringatkan kalau provider beda."""
+    global _PROVIDER_MISMATCH
+    active = get_provider().info()
+    built_by, _ = _collection_built_by(col)
+    _PROVIDER_MISMATCH = built_by if (built_by and built_by != active) else None
+    if _PROVIDER_MISMATCH:
+        print(f"⚠️ Collection dibangun oleh {built_by}, provider aktif {active}. "
+              f"Jalankan database.reembed_collection() sebelum menulis data.")
+
+def _prepare_write(col):
+    """Tolak tulis kalau provider beda; catat provider aktif kalau belum tercatat."""
+    global _PROVIDER_MISMATCH
+    active = get_provider().info()
+    built_by, recorded = _collection_built_by(col)
+    if built_by and built_by != active:
+        _PROVIDER_MISMATCH = built_by
+        raise Exception(
+            f"Provider embedding aktif ({active['embedding_provider']}) beda dengan pembangun collection "
+            f"({built_by.get('embedding_provider')}). Jalankan reembed_collection() dulu."
         )
-        return response.embeddings[0].values
+    _PROVIDER_MISMATCH = None
+    if not recorded:
+        col.modify(metadata={**(col.metadata or {}), **active})
+
+def get_embedding_provider_stats():
+    provider = get_provider()
+    return {"active": provider.info(), "mismatch": _PROVIDER_MISMATCH,
+            "max_batch_size": provider.max_batch_size, "max_concurrency": provider.max_concurrency}
+
+_CHROMA_POOL = ChromaPool(lambda: _get_db_client_raw(), COLLECTION_NAME, on_connect=_check_collection_provider)
+
+def get_chroma_pool():
+    """Pool Chroma bersama untuk seluruh proses (Bot, Web V2, Streamlit, script)."""
+    return _CHROMA_POOL
+
+# Index NumPy lokal (opsional) untuk read path. Chroma tetap Source of Truth.
+_VECTOR_INDEX = VectorIndex(_CHROMA_POOL) if LOCAL_VECTOR_INDEX else None
+
+def get_vector_index_stats():
+    return _VECTOR_INDEX.stats() if _VECTOR_INDEX is not None else {"loaded": False}
+
+def _query_top_k(vec, n_results, filter_tag):
+    """
+    Top-k untuk search: dari index NumPy lokal kalau aktif (tanpa round-trip),
+    fallback ke col.query() Chroma kalau index mati / error.
+    """
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    if _VECTOR_INDEX is not None:
+        try:
+            _VECTOR_INDEX.refresh()
+            return _VECTOR_INDEX.query(vec, n_results, tag)
+        except Exception as e:
+            print(f"⚠️ Vector index lokal gagal, fallback ke Chroma: {e}")
+
+    # Pre-Filtering logic
+    where_clause = {"tag": tag} if tag else None
+    return _CHROMA_POOL.run(lambda col: col.query(
+        query_embeddings=[vec],
+        n_results=n_results,
+        where=where_clause
+    ))
+
+# Index BM25 lokal: fast path tanpa embedding + hybrid fusion dengan skor vektor.
+_LEXICAL_INDEX = LexicalIndex(_CHROMA_POOL) if LEXICAL_INDEX else None
+
+def get_lexical_index_stats():
+    return _LEXICAL_INDEX.stats() if _LEXICAL_INDEX is not None else {"loaded": False}
+
+def _lexical_search(query_text, n_results, filter_tag):
+    """LexicalMatch untuk query, atau None kalau index mati / error (search jalan seperti biasa)."""
+    if _LEXICAL_INDEX is None: return None
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    try:
+        _LEXICAL_INDEX.refresh()
+        return _LEXICAL_INDEX.search(query_text, n_results, tag)
     except Exception as e:
-        print(f"⚠️ Error Embedding AI: {e}")
-        return []
+        print(f"⚠️ Lexical index gagal, lanjut tanpa BM25: {e}")
+        return None
+
+def _lexical_fast_path(match, n_results):
+    """Hasil siap pakai kalau kecocokan kata sudah meyakinkan (skip Gemini), else None."""
+    if not LEXICAL_FASTPATH or match is None: return None
+    if not match.is_confident(LEXICAL_FASTPATH_MIN_SCORE, LEXICAL_FASTPATH_MIN_TERMS, LEXICAL_FASTPATH_MARGIN):
+        return None
+    return match.as_result(n_results)
+
+def _hybrid(vector_result, match, n_results):
+    return hybrid_merge(vector_result, match, HYBRID_LEXICAL_WEIGHT, n_results)
+
+# Mode darurat: embedding tidak tersedia (breaker terbuka / timeout / error provider).
+# Lexical index aktif -> dipakai ulang (hanya kata judul/keywords_raw). Kalau mati, fallback
+# tipis: filter $contains di Chroma (teks HyDE memuat judul & keyword), tanpa full scan.
+_EMPTY_RESULT = {"ids": [[]], "metadatas": [[]], "distances": [[]]}
+KEYWORD_SCAN_LIMIT = 200
+
+def _keyword_scan(query_text, n_results, tag):
+    terms = list(dict.fromkeys(tokenize(query_text)))
+    if not terms: return None
+    # $contains case-sensitive: coba huruf kecil, Kapital & KAPITAL
+    variants = sorted({v for t in terms for v in (t, t.capitalize(), t.upper())})
+    clauses = [{"$contains": v} for v in variants]
+    where_document = {"$or": clauses} if len(clauses) > 1 else clauses[0]
+    data = _CHROMA_POOL.run(lambda col: col.get(
+        where={"tag": tag} if tag else None, where_document=where_document,
+        limit=KEYWORD_SCAN_LIMIT, include=['metadatas']
+    ))
+    return keyword_result(query_text, data['ids'], data['metadatas'], n_results)
+
+def _degraded_search(query_text, n_results, filter_tag, kind):
+    """Hasil kata kunci judul/keywords_raw (format col.query + degraded=True), None kalau gagal."""
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    try:
+        if _LEXICAL_INDEX is not None:
+            _LEXICAL_INDEX.refresh()
+            result = _LEXICAL_INDEX.search(query_text, n_results, tag, strong_only=True).as_result(n_results)
+        else:
+            result = _keyword_scan(query_text, n_results, tag)
+    except Exception as e:
+        print(f"⚠️ Pencarian darurat gagal: {e}")
+        return None
+    if result is None: return None
+    SEARCH_DEGRADED.inc(kind=kind)
+    result["degraded"] = True
+    return result
+
+def _record_changes(doc_ids, op, tags=None):
+    """
+    Naikkan data version (data/state.sqlite) agar cache/index proses lain ikut sinkron.
+    `tags` (sejajar doc_ids) memperbarui doc_index untuk paginasi browse mode.
+    """
+    try:
+        state.record_changes(doc_ids, op, tags)
+    except Exception as e:
+        print(f"⚠️ Gagal mencatat perubahan data ({op} {doc_ids}): {e}")
+    # Proses ini langsung melihat perubahannya sendiri tanpa menunggu interval cek
+    if _LEXICAL_INDEX is not None: _LEXICAL_INDEX.expire()
+    if _ANSWER_CACHE is not None: _ANSWER_CACHE.invalidate()
+
+def _get_embedding_cache_safe():
+    """Cache embedding di disk. Kalau file tidak bisa dibuka, jalan tanpa cache."""
+    try:
+        return get_embedding_cache()
+    except Exception as e:
+        print(f"⚠️ Embedding cache tidak tersedia: {e}")
+        return None
+
+# --- EMBEDDING: BATAS WAKTU & CIRCUIT BREAKER ---
+# Panggilan embedding tunggal (search, upsert) dibatasi EMBED_TIMEOUT_SECONDS. Gagal/timeout
+# berturut-turut membuka breaker: panggilan berikutnya langsung return [] (tanpa menunggu
+# provider) dan search memakai mode darurat kata kunci (_degraded_search).
+# Panggilan sync jalan di executor kecil agar bisa ditinggal saat timeout. Slot (semaphore)
+# baru dilepas saat panggilan provider benar-benar selesai: kalau semua slot dipegang
+# panggilan yang menggantung, panggilan baru langsung gagal ("busy") tanpa antri di
+# executor, dan tidak dihitung sebagai kegagalan provider oleh breaker.
+EMBED_WORKERS = 8
+_EMBED_BREAKER = CircuitBreaker()
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+_EMBED_SLOTS = threading.BoundedSemaphore(EMBED_WORKERS)
+
+def _embed_in_slot(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        _EMBED_SLOTS.release()
+
+def _embed_with_budget(provider, texts, task_type, timeout, timing, wait=0):
+    """
+    provider.embed(texts) dengan batas waktu. Return list vektor, atau None kalau semua
+    slot sibuk (setelah menunggu `wait` detik) / breaker terbuka.
+    """
+    acquired = _EMBED_SLOTS.acquire(timeout=wait) if wait else _EMBED_SLOTS.acquire(blocking=False)
+    if not acquired:
+        print(f"⚠️ Embedding ({provider.name}) ditolak: {EMBED_WORKERS} panggilan masih berjalan")
+        timing["result"] = "busy"
+        timing["status"] = "error"
+        return None
+    if _embed_rejected(timing):
+        _EMBED_SLOTS.release()
+        return None
+    try:
+        future = _EMBED_EXECUTOR.submit(_embed_in_slot, provider.embed, texts, task_type)
+    except Exception:
+        _EMBED_SLOTS.release()
+        raise
+    return future.result(timeout=timeout)
+
+def get_embedding_breaker_stats():
+    return _EMBED_BREAKER.stats()
+
+def _embed_rejected(timing):
+    """Breaker terbuka: jangan panggil provider sama sekali."""
+    if _EMBED_BREAKER.allow(): return False
+    timing["result"] = "breaker_open"
+    timing["status"] = "error"
+    return True
+
+def _embed_failed(provider, timing, error, kind="error"):
+    _EMBED_BREAKER.record_failure()
+    print(f"⚠️ Error Embedding AI ({provider.name}, {kind}): {error}")
+    timing["result"] = kind
+    timing["status"] = "error"
+    return []
+
+def _generate_embedding_raw(text, task_type="RETRIEVAL_DOCUMENT", timeout=EMBED_TIMEOUT_SECONDS, query=False):
+    """
+    Generate Embedding lewat provider aktif (Tanpa Cache Streamlit).
+    Cek dulu cache SQLite bersama (data/embedding_cache.sqlite), baru panggil provider.
+    query=True: kunci cache pakai teks ternormalisasi (pertanyaan user, bukan dokumen).
+    Return [] kalau gagal, lewat `timeout` detik, atau breaker terbuka.
+    """
+    provider = get_provider()
+    with EMBEDDING_SECONDS.time(result="api", provider=provider.name) as timing:
+        cache = _get_embedding_cache_safe() if provider.cacheable else None
+        if cache:
+            cached = cache.get(text, provider.cache_key, task_type, normalize=query)
+            CACHE_REQUESTS.inc(cache="embedding", result="hit" if cached else "miss")
+            if cached:
+                timing["result"] = "cache"
+                return cached
+
+        try:
+            if timeout:
+                vectors = _embed_with_budget(provider, [text], task_type, timeout, timing)
+                if vectors is None: return []
+                vector = vectors[0]
+            else:
+                if _embed_rejected(timing): return []
+                vector = provider.embed([text], task_type)[0]
+        except FuturesTimeout:
+            return _embed_failed(provider, timing, f"lewat {timeout}s", "timeout")
+        except Exception as e:
+            return _embed_failed(provider, timing, e)
+        _EMBED_BREAKER.record_success()
+
+        if cache: cache.set(text, provider.cache_key, task_type, vector, normalize=query)
+        return vector
+
+def _generate_embeddings_batch_raw(texts, task_type="RETRIEVAL_DOCUMENT",
+                                   batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_MAX_CONCURRENCY):
+    """
+    Embedding banyak teks sekaligus (Tanpa Cache Streamlit).
+    - Teks yang sudah ada di cache disk tidak dikirim ulang.
+    - Sisanya dikirim per `batch_size` teks dalam 1 panggilan provider,
+      maksimal `max_workers` panggilan paralel (dibatasi lagi oleh deklarasi provider).
+    Return: list sejajar `texts` berisi (vector, error). Vector [] kalau gagal.
+    """
+    results = [([], None)] * len(texts)
+    provider = get_provider()
+    cache = _get_embedding_cache_safe() if provider.cacheable else None
+
+    pending = []
+    for i, text in enumerate(texts):
+        cached = cache.get(text, provider.cache_key, task_type) if cache else None
+        if cached: results[i] = (cached, None)
+        else: pending.append(i)
+
+    if not pending: return results
+
+    batch_size, max_workers = batch_limits(batch_size, max_workers, provider)
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    def embed_batch(indexes):
+        # Lewat slot, timeout & breaker yang sama dengan search: provider mati saat import
+        # massal membuka breaker, bukan menggantung. Slot ditunggu (bukan langsung "busy").
+        with EMBEDDING_SECONDS.time(result="api", provider=provider.name) as timing:
+            try:
+                vectors = _embed_with_budget(provider, [texts[i] for i in indexes], task_type,
+                                             EMBED_BATCH_TIMEOUT_SECONDS, timing, wait=EMBED_BATCH_TIMEOUT_SECONDS)
+                if vectors is None:
+                    return indexes, None, f"provider tidak tersedia ({timing['result']})"
+                if len(vectors) != len(indexes):
+                    raise ValueError(f"Jumlah embedding {len(vectors)} != jumlah teks {len(indexes)}")
+            except FuturesTimeout:
+                _embed_failed(provider, timing, f"batch {len(indexes)} teks lewat {EMBED_BATCH_TIMEOUT_SECONDS}s", "timeout")
+                return indexes, None, f"timeout {EMBED_BATCH_TIMEOUT_SECONDS}s"
+            except Exception as e:
+                _embed_failed(provider, timing, f"batch {len(indexes)} teks: {e}")
+                return indexes, None, str(e)
+            _EMBED_BREAKER.record_success()
+            return indexes, vectors, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for indexes, vectors, error in pool.map(embed_batch, batches):
+            for j, i in enumerate(indexes):
+                if vectors:
+                    results[i] = (vectors[j], None)
+                    if cache: cache.set(texts[i], provider.cache_key, task_type, vectors[j])
+                else:
+                    results[i] = ([], error)
+
+    return results
+
+def get_embedding_cache_stats():
+    """Statistik hit/miss cache embedding (per proses & gabungan semua container)."""
+    cache = _get_embedding_cache_safe()
+    return cache.stats() if cache else {}
 
 # --- 5. STREAMLIT CACHED FUNCTIONS (UNTUK WEB APP) ---
 # Fungsi ini khusus untuk Web App agar performa cepat (pake cache).
 
-@st.cache_resource(show_spinner=False)
 def get_db_client():
-    return _get_db_client_raw()
-
-@st.cache_resource(show_spinner=False)
-def get_ai_client():
-    return _get_ai_client_raw()
+    # Pool sudah process-wide, tidak perlu st.cache_resource lagi
+    return _CHROMA_POOL.get_client()
 
 def get_collection():
-    client = get_db_client()
-    return client.get_or_create_collection(name=COLLECTION_NAME)
+    return _CHROMA_POOL.get_collection()
+
+class _EmbeddingUnavailable(Exception):
+    pass
 
 @st.cache_data(show_spinner=False)
-def generate_embedding_cached(text):
-    # Wrapper agar embedding di-cache oleh Streamlit
-    return _generate_embedding_raw(text)
+def _generate_embedding_st_cached(text, query=False):
+    # Gagal dilempar (bukan return []) supaya Streamlit tidak meng-cache kegagalan
+    vector = _generate_embedding_raw(text, query=query)
+    if not vector: raise _EmbeddingUnavailable()
+    return vector
+
+def generate_embedding_cached(text, query=False):
+    # Wrapper agar embedding di-cache oleh Streamlit (query=True untuk pertanyaan user)
+    try:
+        return _generate_embedding_st_cached(text, query)
+    except _EmbeddingUnavailable:
+        return []
 
 # --- 6. INTERNAL HELPER (ID GENERATOR) ---
-def _get_next_id_internal(collection):
-    data = collection.get(include=[])
-    existing_ids = data['ids']
-    
-    if not existing_ids: return "1"
-    
-    numeric_ids = []
-    for x in existing_ids:
-        if x.isdigit(): 
-            numeric_ids.append(int(x))
-    
-    if not numeric_ids: return "1"
-    return str(max(numeric_ids) + 1)
+def _allocate_doc_ids(count=1):
+    """
+    ID baru dari sequence atomik di data/state.sqlite (O(1), aman dipakai
+    beberapa admin/container bersamaan). Scan ID Chroma hanya sekali untuk seed.
+    """
+    return state.allocate_doc_ids(count, seed_max=lambda: get_max_numeric_id(get_collection()))
 
 # --- 7. CORE LOGIC (READ - USER WEB APP) ---
-@retry_on_lock()
+# Single-flight: pencarian identik yang sedang berjalan (query ternormalisasi, tag,
+# n_results) cukup 1x embedding + 1x query Chroma, sisanya menumpang hasilnya.
+_SEARCH_FLIGHT = SingleFlight()
+
+def _flight_key(kind, query_text, filter_tag, n_results):
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    return (kind, normalize_query(query_text), tag, n_results)
+
+def get_search_coalescing_stats():
+    """Counter single-flight: requests, executions, coalesced."""
+    return _SEARCH_FLIGHT.stats()
+
 def search_faq(query_text, filter_tag=None, n_results=50):
     """
     Digunakan oleh app.py (Web). Menggunakan Embedding Ter-Cache.
+    Request identik yang bersamaan di-coalesce (single-flight).
     """
-    col = get_collection()
-    vec = generate_embedding_cached(query_text) # Pake Cache
-    
-    if not vec: 
-        return {"ids": [[]], "metadatas": [[]], "distances": [[]]}
-
-    # Pre-Filtering logic
-    where_clause = {"tag": filter_tag} if (filter_tag and filter_tag != "Semua Modul") else None
-    
-    return col.query(
-        query_embeddings=[vec],
-        n_results=n_results,
-        where=where_clause
+    return _SEARCH_FLIGHT.do(
+        _flight_key("web", query_text, filter_tag, n_results),
+        lambda: _search_faq_direct(query_text, filter_tag, n_results)
     )
 
 @retry_on_lock()
-def get_all_faqs_sorted():
-    col = get_collection()
-    data = col.get(include=['metadatas'])
+def _search_faq_direct(query_text, filter_tag=None, n_results=50):
+    # 0. BM25 dulu: query yang cocok persis dengan judul/keyword tidak perlu embedding
+    match = _lexical_search(query_text, n_results, filter_tag)
+    fast = _lexical_fast_path(match, n_results)
+    if fast is not None: return fast
+
+    vec = generate_embedding_cached(query_text, query=True) # Pake Cache
     
+    if not vec: 
+        # Embedding gagal / breaker terbuka: tetap jawab lewat kata kunci
+        return _degraded_search(query_text, n_results, filter_tag, "web") or _EMPTY_RESULT
+
+    return _hybrid(_query_top_k(vec, n_results, filter_tag), match, n_results)
+
+def _sort_metadatas(data):
+    """Gabungkan hasil col.get() jadi list metadata terurut ID Descending (Terbaru)."""
     results = []
     if data['ids']:
         for i, doc_id in enumerate(data['ids']):
@@ -157,15 +604,89 @@ def get_all_faqs_sorted():
     results.sort(key=lambda x: x.get('id_num', 0), reverse=True)
     return results
 
+@retry_on_lock()
+def _load_sorted_metadatas():
+    data = _CHROMA_POOL.run(lambda col: col.get(include=['metadatas']))
+    return _sort_metadatas(data)
+
+# Dump penuh (full scan). Browse mode & list tag memakai doc_index (list_faqs).
+def get_all_faqs_sorted():
+    return _load_sorted_metadatas()
+
 def get_unique_tags_from_db():
-    col = get_collection()
-    data = col.get(include=['metadatas'])
-    unique_tags = set()
-    if data['metadatas']:
-        for meta in data['metadatas']:
-            if meta and meta.get('tag'):
-                unique_tags.add(meta['tag'])
-    return sorted(list(unique_tags))
+    _ensure_doc_index()
+    return state.doc_index_tags()
+
+# --- 7B. PAGINASI SERVER-SIDE (BROWSE MODE) ---
+# Urutan ID Descending per tag disimpan di doc_index (data/state.sqlite), di-maintain
+# oleh upsert_faq / delete_faq. Tiap halaman hanya fetch metadata ID yang tampil
+# lewat col.get(ids=...), jadi memori & latency tetap datar walau data puluhan ribu.
+_DOC_INDEX_LOCK = threading.Lock()
+_DOC_INDEX_LAST_SYNC = 0.0
+DOC_INDEX_SEED_PAGE = 1000
+
+def _reseed_doc_index():
+    entries = []
+    offset = 0
+    while True:
+        data = _CHROMA_POOL.run(lambda col: col.get(include=['metadatas'], limit=DOC_INDEX_SEED_PAGE, offset=offset))
+        if not data['ids']: break
+        for i, doc_id in enumerate(data['ids']):
+            meta = data['metadatas'][i] or {}
+            entries.append((doc_id, meta.get('tag')))
+        offset += len(data['ids'])
+        if len(data['ids']) < DOC_INDEX_SEED_PAGE: break
+    state.replace_doc_index(entries)
+    print(f"📇 Doc index di-seed ulang: {len(entries)} dokumen")
+
+@retry_on_lock()
+def _ensure_doc_index():
+    """Seed doc_index kalau jumlahnya beda dengan Chroma (dicek tiap DOC_INDEX_SYNC_SECONDS)."""
+    global _DOC_INDEX_LAST_SYNC
+    if time.monotonic() - _DOC_INDEX_LAST_SYNC < DOC_INDEX_SYNC_SECONDS: return
+    with _DOC_INDEX_LOCK:
+        if time.monotonic() - _DOC_INDEX_LAST_SYNC < DOC_INDEX_SYNC_SECONDS: return
+        count = _CHROMA_POOL.run(lambda col: col.count())
+        if count != state.doc_index_count():
+            _reseed_doc_index()
+        _DOC_INDEX_LAST_SYNC = time.monotonic()
+
+def _doc_index_page(tag, page, page_size):
+    """Return (ids halaman, total, page terkoreksi, total_pages)."""
+    _ensure_doc_index()
+    tag = tag if (tag and tag != "Semua Modul") else None
+    total = state.doc_index_count(tag)
+    total_pages = math.ceil(total / page_size) if page_size > 0 else 0
+
+    # Guard: jangan sampai page melebihi total
+    if page >= total_pages or page < 0: page = 0
+
+    ids = state.doc_index_page(tag, page * page_size, page_size)
+    return ids, total, page, total_pages
+
+def _build_page(ids, data, total, page, total_pages):
+    by_id = {}
+    for i, doc_id in enumerate(data['ids'] if data else []):
+        meta = data['metadatas'][i] or {}
+        meta['id'] = doc_id
+        try: meta['id_num'] = int(doc_id)
+        except: meta['id_num'] = 0
+        by_id[doc_id] = meta
+    return {
+        "items": [by_id[x] for x in ids if x in by_id],
+        "total": total,
+        "page": page,
+        "total_pages": total_pages
+    }
+
+def list_faqs(tag=None, page=0, page_size=10):
+    """
+    Browse mode terpaginasi (ID Descending / Terbaru).
+    Return: {"items": [meta...], "total": n, "page": p, "total_pages": tp}
+    """
+    ids, total, page, total_pages = _doc_index_page(tag, page, page_size)
+    data = _CHROMA_POOL.run(lambda col: col.get(ids=ids, include=['metadatas'])) if ids else None
+    return _build_page(ids, data, total, page, total_pages)
 
 # --- 8. CORE LOGIC (WRITE - ADMIN) ---
 # Admin selalu diakses via Streamlit, jadi aman pakai retry dan logic biasa.
@@ -187,6 +708,7 @@ def get_all_data_as_df():
             "Jawaban": meta.get('jawaban_tampil'),
             "Keyword": meta.get('keywords_raw'),
             "Gambar": meta.get('path_gambar'),
+            "Varian Gambar": meta.get('gambar_variants', ''),
             "Source": meta.get('sumber_url'),
             "AI Context": data['documents'][i] if data['documents'] else ""
         })
@@ -195,60 +717,269 @@ def get_all_data_as_df():
     df['ID_Num'] = pd.to_numeric(df['ID'], errors='coerce').fillna(0)
     return df.sort_values('ID_Num', ascending=False).drop(columns=['ID_Num'])
 
-@retry_on_lock()
-def upsert_faq(doc_id, tag, judul, jawaban, keyword, img_paths, src_url):
-    col = get_collection()
-    
-    final_id = str(doc_id)
-    if doc_id == "auto" or doc_id is None:
-        final_id = _get_next_id_internal(col)
-    
-    clean_jawaban = clean_text_for_embedding(jawaban)
-    
+def _load_tags_config_safe():
     try:
-        tags_config = load_tags_config()
-        tag_desc = tags_config.get(tag, {}).get("desc", "")
+        return load_tags_config()
     except:
-        tag_desc = ""
-    
+        return {}
+
+def _build_embed_text(tag, judul, jawaban, keyword, tags_config):
+    """Format Embedding HyDE (dipakai upsert tunggal maupun bulk)."""
+    clean_jawaban = clean_text_for_embedding(jawaban)
+    tag_desc = tags_config.get(tag, {}).get("desc", "")
     domain_str = f"{tag} ({tag_desc})" if tag_desc else tag
 
-    # Format Embedding HyDE
-    text_embed = f"""DOMAIN: {domain_str}
+    return f"""DOMAIN: {domain_str}
 DOKUMEN: {judul}
 VARIASI PERTANYAAN USER: {keyword}
 ISI KONTEN: {clean_jawaban}"""
+
+def _build_metadata(tag, judul, jawaban, keyword, img_paths, src_url, img_variants=""):
+    meta = {
+        "tag": tag, 
+        "judul": judul, 
+        "jawaban_tampil": jawaban, 
+        "keywords_raw": keyword,
+        "path_gambar": img_paths,
+        "sumber_url": src_url
+    }
+    # JSON varian gambar (thumbnail/WebP) dari image_pipeline, sejajar path_gambar
+    if img_variants: meta["gambar_variants"] = img_variants
+    return meta
+
+def _existing_variants(col, doc_id, img_paths):
+    """Varian lama yang master-nya masih dipakai (edit tanpa upload gambar baru)."""
+    try:
+        data = col.get(ids=[doc_id], include=['metadatas'])
+        if data['metadatas'] and data['metadatas'][0]:
+            return variants_for_paths(data['metadatas'][0].get('gambar_variants'), img_paths)
+    except Exception as e:
+        print(f"⚠️ Gagal membaca varian gambar lama ({doc_id}): {e}")
+    return ""
+
+@retry_on_lock()
+def _prepare_upsert(final_id, tag, judul, jawaban, keyword, img_paths, img_variants):
+    """Teks HyDE + embedding 1 dokumen. Return (text_embed, vector, img_variants)."""
+    col = get_collection()
+    _prepare_write(col)
+
+    if final_id is None:
+        if img_variants is None: img_variants = ""
+    elif img_variants is None:
+        img_variants = _existing_variants(col, final_id, img_paths)
+    
+    text_embed = _build_embed_text(tag, judul, jawaban, keyword, _load_tags_config_safe())
     
     # Gunakan cached embedding agar konsisten, toh ini proses lambat (write)
     vector = generate_embedding_cached(text_embed)
-    
-    col.upsert(
-        ids=[final_id],
-        embeddings=[vector],
-        documents=[text_embed],
-        metadatas=[{
-            "tag": tag, 
-            "judul": judul, 
-            "jawaban_tampil": jawaban, 
-            "keywords_raw": keyword,
-            "path_gambar": img_paths,
-            "sumber_url": src_url
-        }]
+    if not vector:
+        raise Exception("Embedding gagal (provider lambat / tidak tersedia), data belum disimpan. Coba lagi nanti.")
+    return text_embed, vector, img_variants
+
+@retry_on_lock()
+def _upsert_one(final_id, vector, text_embed, metadata):
+    get_collection().upsert(ids=[final_id], embeddings=[vector], documents=[text_embed], metadatas=[metadata])
+
+def upsert_faq(doc_id, tag, judul, jawaban, keyword, img_paths, src_url, img_variants=None):
+    """
+    `img_variants`: JSON gambar_variants dari image_pipeline.save_uploads.
+    None = pertahankan varian lama yang master-nya masih ada di img_paths.
+    """
+    final_id = None if (doc_id == "auto" or doc_id is None) else str(doc_id)
+    text_embed, vector, img_variants = _prepare_upsert(
+        final_id, tag, judul, jawaban, keyword, img_paths, img_variants
     )
+
+    # ID baru diambil setelah embedding berhasil & di luar blok yang di-retry:
+    # embedding gagal / retry lock tidak menghabiskan nomor ID.
+    if final_id is None: final_id = _allocate_doc_ids(1)[0]
+
+    _upsert_one(final_id, vector, text_embed,
+                _build_metadata(tag, judul, jawaban, keyword, img_paths, src_url, img_variants))
+    _record_changes([final_id], "upsert", [tag])
     return final_id
 
+@retry_on_lock()
+def _upsert_chunk(ids, embeddings, documents, metadatas):
+    get_collection().upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+def upsert_faq_many(items, chunk_size=UPSERT_CHUNK_SIZE, batch_size=EMBED_BATCH_SIZE,
+                    max_workers=EMBED_MAX_CONCURRENCY):
+    """
+    Bulk upsert untuk import SOP massal (tanpa Cache Streamlit).
+    `items`: list of dict dengan key seperti argumen upsert_faq:
+        doc_id (opsional, "auto"/None = ID baru), tag, judul, jawaban,
+        keyword, img_paths, src_url, img_variants
+    Alur: bangun semua teks HyDE -> embedding batch paralel -> col.upsert per chunk.
+    Return: list hasil per item (urutan sama dengan input):
+        {"index": i, "id": "123", "ok": True/False, "error": None/"pesan"}
+    """
+    if not items: return []
+    _prepare_write(get_collection())
+
+    tags_config = _load_tags_config_safe()
+    report = []
+    prepared = []  # [index, id, text_embed, metadata], id None = butuh ID baru
+
+    for i, item in enumerate(items):
+        try:
+            tag = item["tag"]
+            judul = item["judul"]
+            jawaban = item["jawaban"]
+            keyword = item.get("keyword", "")
+
+            doc_id = item.get("doc_id")
+            final_id = None if (doc_id == "auto" or doc_id is None) else str(doc_id)
+
+            text_embed = _build_embed_text(tag, judul, jawaban, keyword, tags_config)
+            meta = _build_metadata(tag, judul, jawaban, keyword,
+                                   item.get("img_paths", "none"), item.get("src_url", ""),
+                                   item.get("img_variants", ""))
+            prepared.append([i, final_id, text_embed, meta])
+            report.append({"index": i, "id": final_id, "ok": False, "error": None})
+        except Exception as e:
+            report.append({"index": i, "id": None, "ok": False, "error": f"Data tidak valid: {e}"})
+
+    vectors = _generate_embeddings_batch_raw(
+        [p[2] for p in prepared], batch_size=batch_size, max_workers=max_workers
+    )
+
+    ready = []
+    for (i, final_id, text_embed, meta), (vector, error) in zip(prepared, vectors):
+        if vector:
+            ready.append([i, final_id, text_embed, meta, vector])
+        else:
+            report[i]["error"] = f"Embedding gagal: {error}"
+
+    # Blok ID baru sekaligus (1 transaksi di sequence), hanya untuk dokumen yang embedding-nya berhasil
+    auto_slots = [c for c in ready if c[1] is None]
+    for c, new_id in zip(auto_slots, _allocate_doc_ids(len(auto_slots))):
+        c[1] = new_id
+        report[c[0]]["id"] = new_id
+
+    for start in range(0, len(ready), chunk_size):
+        chunk = ready[start:start + chunk_size]
+        try:
+            _upsert_chunk(
+                ids=[c[1] for c in chunk],
+                embeddings=[c[4] for c in chunk],
+                documents=[c[2] for c in chunk],
+                metadatas=[c[3] for c in chunk]
+            )
+            for c in chunk:
+                report[c[0]]["ok"] = True
+            _record_changes([c[1] for c in chunk], "upsert", [c[3]["tag"] for c in chunk])
+        except Exception as e:
+            print(f"⚠️ Gagal upsert chunk {start}-{start + len(chunk)}: {e}")
+            for c in chunk:
+                report[c[0]]["error"] = f"Upsert gagal: {e}"
+
+    ok_count = sum(1 for r in report if r["ok"])
+    print(f"📦 Bulk upsert selesai: {ok_count}/{len(items)} berhasil")
+    return report
+
+REEMBED_PAGE_SIZE = 500
+
+def _rename_into_place(client, col, name):
+    """
+    Rename `col` ke `name`. Proses lain yang connect tepat di sela rename bisa membuat
+    collection kosong bernama sama (get_or_create): yang kosong itu dibuang lalu dicoba lagi.
+    """
+    try:
+        col.modify(name=name)
+    except Exception:
+        placeholder = client.get_collection(name=name)
+        if placeholder.count() != 0: raise
+        client.delete_collection(name=name)
+        col.modify(name=name)
+
+def reembed_collection(chunk_size=UPSERT_CHUNK_SIZE, batch_size=EMBED_BATCH_SIZE,
+                       max_workers=EMBED_MAX_CONCURRENCY):
+    """
+    Bangun ulang semua vektor dengan provider aktif (setelah ganti EMBEDDING_PROVIDER/DIM).
+    Dokumen (teks HyDE) & metadata disalin ke collection sementara yang di-embed ulang,
+    baru menggantikan collection lama (rename) kalau semua dokumen berhasil & jumlahnya
+    cocok. Selama proses, collection lama tetap melayani pencarian.
+    Return: {"count": jumlah dokumen, "provider": info provider}
+    """
+    provider = get_provider()
+    client = _CHROMA_POOL.get_client()
+    old = client.get_collection(name=COLLECTION_NAME)
+    tmp_name = f"{COLLECTION_NAME}__reembed"
+
+    ids, documents, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = old.get(include=['documents', 'metadatas'], limit=REEMBED_PAGE_SIZE, offset=offset)
+        if not page['ids']: break
+        ids += page['ids']
+        documents += [d or "" for d in page['documents']]
+        metadatas += page['metadatas']
+        offset += len(page['ids'])
+
+    print(f"🔁 Re-embed {len(ids)} dokumen dengan provider {provider.name} ({provider.model}, dim {provider.dimension})")
+    vectors = _generate_embeddings_batch_raw(documents, batch_size=batch_size, max_workers=max_workers)
+    failed = [ids[i] for i, (vector, _) in enumerate(vectors) if not vector]
+    if failed:
+        raise Exception(f"Re-embed dibatalkan, {len(failed)} dokumen gagal di-embed (contoh ID: {failed[:5]})")
+
+    try: client.delete_collection(name=tmp_name)
+    except Exception: pass  # Sisa re-embed yang gagal sebelumnya
+    meta = {k: v for k, v in (old.metadata or {}).items() if not k.startswith("embedding_")}
+    tmp = client.create_collection(name=tmp_name, metadata={**meta, **provider.info()})
+    for start in range(0, len(ids), chunk_size):
+        end = start + chunk_size
+        tmp.upsert(ids=ids[start:end], embeddings=[v for v, _ in vectors[start:end]],
+                   documents=documents[start:end], metadatas=metadatas[start:end])
+
+    if tmp.count() != len(ids):
+        raise Exception(f"Re-embed dibatalkan: collection baru berisi {tmp.count()} dari {len(ids)} dokumen")
+
+    # Tukar lewat rename (bukan hapus dulu): lama -> backup, baru -> nama asli, baru hapus backup.
+    # Kalau rename kedua gagal, collection lama dikembalikan ke namanya.
+    backup_name = f"{COLLECTION_NAME}__backup"
+    try: client.delete_collection(name=backup_name)
+    except Exception: pass
+    old.modify(name=backup_name)
+    try:
+        _rename_into_place(client, tmp, COLLECTION_NAME)
+    except Exception:
+        old.modify(name=COLLECTION_NAME)
+        raise
+    _CHROMA_POOL.invalidate()
+    _ASYNC_CHROMA_POOL.invalidate()
+    client.delete_collection(name=backup_name)
+
+    _record_changes(ids, "upsert", [(m or {}).get("tag") for m in metadatas])
+    if _VECTOR_INDEX is not None: _VECTOR_INDEX.refresh(force=True)
+    get_collection()  # Reconnect: cek ulang provider (mismatch hilang)
+    print(f"✅ Re-embed selesai: {len(ids)} dokumen")
+    return {"count": len(ids), "provider": provider.info()}
+
+def _image_paths(meta):
+    """Semua file gambar milik 1 dokumen: master path_gambar + thumbnail & WebP image_pipeline."""
+    img_str = (meta or {}).get('path_gambar', 'none')
+    if not img_str or img_str.lower() == 'none': return set()
+    paths = img_str.split(';')
+    for variant in parse_variants(meta.get('gambar_variants')):
+        if isinstance(variant, dict):
+            paths.extend(v for k, v in variant.items() if k != "jpg" and isinstance(v, str))
+    return {p.replace("\\", "/") for p in paths if p}
+
 @retry_on_lock()
 def delete_faq(doc_id):
     col = get_collection()
     try:
         data = col.get(ids=[str(doc_id)], include=['metadatas'])
         if data['metadatas'] and len(data['metadatas']) > 0:
-            meta = data['metadatas'][0]
-            img_str = meta.get('path_gambar', 'none')
-            if img_str and img_str.lower() != 'none':
-                paths = img_str.split(';')
-                for p in paths:
-                    clean_path = p.replace("\\", "/")
+            paths = _image_paths(data['metadatas'][0])
+            if paths:
+                # Nama file = {judul}_{tag}_{hash}: dokumen lain dengan judul, tag & gambar
+                # yang sama memakai file yang sama. File yang masih dirujuk tidak dihapus.
+                others = col.get(include=['metadatas'])
+                for other_id, other_meta in zip(others['ids'], others['metadatas']):
+                    if other_id != str(doc_id): paths -= _image_paths(other_meta)
+                for clean_path in sorted(paths):
                     if os.path.exists(clean_path):
                         try:
                             os.remove(clean_path)
@@ -259,32 +990,298 @@ def delete_faq(doc_id):
         print(f"⚠️ Error cleaning images: {e}")
 
     col.delete(ids=[str(doc_id)])
+    _record_changes([str(doc_id)], "delete")
 
 # --- 9. SPECIAL FUNCTION FOR BOT WA (NO STREAMLIT DEPENDENCY) ---
-@retry_on_lock()
+# Cache jawaban semantik: pertanyaan berulang (kata sama / embedding sangat mirip)
+# tidak perlu query Chroma lagi. Dibuang otomatis saat data version berubah.
+_ANSWER_CACHE = AnswerCache(
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MIN_SIMILARITY, ANSWER_CACHE_TTL_SECONDS
+) if ANSWER_CACHE else None
+
+def get_answer_cache_stats():
+    return _ANSWER_CACHE.stats() if _ANSWER_CACHE is not None else {}
+
+REGISTRY.register_collector(
+    "faq_answer_cache_total",
+    "Lookup answer cache Bot (result=exact_hits|exact_misses|semantic_hits|semantic_misses)", "counter",
+    stats_collector(get_answer_cache_stats, ("exact_hits", "exact_misses", "semantic_hits", "semantic_misses"))
+)
+REGISTRY.register_collector(
+    "faq_embedding_breaker_total", "Circuit breaker embedding (result=allowed|rejected|failures|opened)", "counter",
+    stats_collector(get_embedding_breaker_stats, ("allowed", "rejected", "failures", "opened"))
+)
+REGISTRY.register_collector(
+    "faq_embedding_breaker_open", "1 kalau breaker embedding terbuka (search mode darurat)", "gauge",
+    lambda: {(): 1 if get_embedding_breaker_stats()["state"] == "open" else 0}
+)
+REGISTRY.register_collector(
+    "faq_search_coalescing_total", "Single-flight search (result=requests|executions|coalesced)", "counter",
+    stats_collector(get_search_coalescing_stats, ("requests", "executions", "coalesced"))
+)
+
+def _answer_cache_call(method, *args):
+    """Panggil AnswerCache tanpa pernah menggagalkan search (cache rusak = jalan tanpa cache)."""
+    if _ANSWER_CACHE is None: return None
+    try:
+        return getattr(_ANSWER_CACHE, method)(*args)
+    except Exception as e:
+        print(f"⚠️ Answer cache error ({method}): {e}")
+        return None
+
+async def _aanswer_cache_call(method, *args):
+    """Versi async: cek data version (SQLite) & operasi matriks NumPy jalan di thread."""
+    if _ANSWER_CACHE is None: return None
+    return await asyncio.to_thread(_answer_cache_call, method, *args)
+
 def search_faq_for_bot(query_text, filter_tag="Semua Modul"):
     """
     Fungsi khusus untuk Bot WA / API External.
-    MANDIRI: Membuka koneksi sendiri, Embedding sendiri tanpa Cache Streamlit.
+    MANDIRI: Koneksi dari Pool proses (bukan st.cache_resource), Embedding tanpa Cache Streamlit.
+    Request identik yang bersamaan di-coalesce (single-flight).
     """
-    # 1. Buka Koneksi Raw (Tanpa st.cache_resource)
-    client = _get_db_client_raw()
-    col = client.get_or_create_collection(name=COLLECTION_NAME)
-    
-    # 2. Embedding Raw (Tanpa st.cache_data)
-    vec = _generate_embedding_raw(query_text)
+    return _SEARCH_FLIGHT.do(
+        _flight_key("bot", query_text, filter_tag, 5),
+        lambda: _search_faq_for_bot_direct(query_text, filter_tag)
+    )
+
+@retry_on_lock()
+def _search_faq_for_bot_direct(query_text, filter_tag="Semua Modul"):
+    # 0. Pertanyaan yang persis sama sudah pernah dijawab
+    cached = _answer_cache_call("get_exact", query_text, filter_tag)
+    if cached is not None: return cached
+
+    # 0b. Fast path BM25 (Tanpa Gemini)
+    match = _lexical_search(query_text, 5, filter_tag)
+    fast = _lexical_fast_path(match, 5)
+    if fast is not None:
+        _answer_cache_call("put", query_text, filter_tag, None, fast)
+        return fast
+
+    # 1. Embedding Raw (Tanpa st.cache_data)
+    vec = _generate_embedding_raw(query_text, query=True)
     
     if not vec: 
-        return None # Return None jika gagal embedding
+        # Mode darurat (tidak masuk answer cache). None kalau pencarian darurat pun gagal
+        return _degraded_search(query_text, 5, filter_tag, "bot")
 
-    # 3. Filtering Logic
-    where_clause = {"tag": filter_tag} if (filter_tag and filter_tag != "Semua Modul") else None
+    # 1b. Pertanyaan mirip (radius cosine ketat) sudah pernah dijawab -> skip Chroma
+    cached = _answer_cache_call("get_similar", vec, filter_tag)
+    if cached is not None: return cached
+
+    # 2. Query (Index lokal / Pool Chroma, Filtering Tag di dalamnya) + fusion BM25
+    results = _hybrid(_query_top_k(vec, 5, filter_tag), match, 5) # Ambil Top 5 aja buat Bot
+    _answer_cache_call("put", query_text, filter_tag, vec, results)
     
-    # 4. Query
-    results = col.query(
-        query_embeddings=[vec],
-        n_results=5, # Ambil Top 5 aja buat Bot
-        where=where_clause
+    return results
+
+# --- 10. ASYNC API (WEB V2 & BOT WA) ---
+# Versi non-blocking untuk FastAPI: embedding pakai client.aio (async Gemini),
+# Chroma pakai AsyncHttpClient di mode server. Di mode file lokal (PersistentClient)
+# tidak ada client async, jadi query dijalankan di thread terpisah (asyncio.to_thread).
+
+def _is_server_mode():
+    return bool(os.getenv("CHROMA_HOST") and os.getenv("CHROMA_PORT"))
+
+class AsyncChromaPool:
+    """
+    Padanan ChromaPool untuk AsyncHttpClient (health check, reconnect, idle lifetime).
+    Handle async terikat ke event loop, jadi dibuat ulang kalau loop-nya berganti.
+    """
+    def __init__(self, collection_name,
+                 idle_ttl=CHROMA_POOL_IDLE_TTL, health_interval=CHROMA_HEALTHCHECK_INTERVAL):
+        self._collection_name = collection_name
+        self._idle_ttl = idle_ttl
+        self._health_interval = health_interval
+        self._lock = None
+        self._loop = None
+        self._client = None
+        self._collection = None
+        self._stale = False
+        self._last_used = 0.0
+        self._last_check = 0.0
+
+    def _reset(self):
+        self._client = None
+        self._collection = None
+
+    async def get_collection(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._reset()
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._stale:
+                self._stale = False
+                self._reset()
+            if self._collection is not None:
+                if now - self._last_used > self._idle_ttl:
+                    self._reset()
+                elif now - self._last_check > self._health_interval:
+                    self._last_check = now
+                    try:
+                        await self._client.heartbeat()
+                    except Exception as e:
+                        print(f"⚠️ Chroma (async) heartbeat gagal, reconnect: {e}")
+                        self._reset()
+
+            if self._collection is None:
+                self._client = await chromadb.AsyncHttpClient(
+                    host=os.getenv("CHROMA_HOST"), port=int(os.getenv("CHROMA_PORT"))
+                )
+                self._collection = AsyncTimedCollection(
+                    await self._client.get_or_create_collection(name=self._collection_name)
+                )
+                self._last_check = now
+
+            self._last_used = now
+            return self._collection
+
+    def invalidate(self):
+        """
+        Tandai handle basi; reset-nya dilakukan get_collection berikutnya di bawah lock,
+        jadi aman dipanggil dari kode sync/thread lain (mis. reembed_collection).
+        """
+        self._stale = True
+
+    async def run(self, operation):
+        """Sama seperti ChromaPool.run, tapi `operation(collection)` berupa coroutine."""
+        col = await self.get_collection()
+        try:
+            return await operation(col)
+        except Exception as e:
+            err_msg = str(e).lower()
+            if "locked" in err_msg or "busy" in err_msg:
+                raise
+            print(f"⚠️ Operasi Chroma (async) gagal, mencoba reconnect: {e}")
+            self.invalidate()
+            return await operation(await self.get_collection())
+
+_ASYNC_CHROMA_POOL = AsyncChromaPool(COLLECTION_NAME)
+
+async def _acollection_call(method, **kwargs):
+    """Panggil method collection tanpa memblok event loop (async client / thread)."""
+    if _is_server_mode():
+        return await _ASYNC_CHROMA_POOL.run(lambda col: getattr(col, method)(**kwargs))
+    return await asyncio.to_thread(_CHROMA_POOL.run, lambda col: getattr(col, method)(**kwargs))
+
+async def _aquery_top_k(vec, n_results, filter_tag):
+    """Versi async _query_top_k: sync index di thread hanya kalau memang jatuh tempo."""
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    if _VECTOR_INDEX is not None:
+        try:
+            if _VECTOR_INDEX.refresh_due():
+                await asyncio.to_thread(_VECTOR_INDEX.refresh)
+            return _VECTOR_INDEX.query(vec, n_results, tag)
+        except Exception as e:
+            print(f"⚠️ Vector index lokal gagal, fallback ke Chroma: {e}")
+
+    where_clause = {"tag": tag} if tag else None
+    return await _acollection_call(
+        "query", query_embeddings=[vec], n_results=n_results, where=where_clause
     )
-    
-    return results
\ No newline at end of file
+
+async def _alexical_search(query_text, n_results, filter_tag):
+    """Versi async _lexical_search: sync index di thread hanya kalau jatuh tempo."""
+    if _LEXICAL_INDEX is None: return None
+    tag = filter_tag if (filter_tag and filter_tag != "Semua Modul") else None
+    try:
+        if _LEXICAL_INDEX.refresh_due():
+            await asyncio.to_thread(_LEXICAL_INDEX.refresh)
+        return _LEXICAL_INDEX.search(query_text, n_results, tag)
+    except Exception as e:
+        print(f"⚠️ Lexical index gagal, lanjut tanpa BM25: {e}")
+        return None
+
+async def _agenerate_embedding_raw(text, task_type="RETRIEVAL_DOCUMENT", timeout=EMBED_TIMEOUT_SECONDS, query=False):
+    """Versi async dari _generate_embedding_raw (cache disk, timeout & breaker dipakai bersama)."""
+    provider = get_provider()
+    with EMBEDDING_SECONDS.time(result="api", provider=provider.name) as timing:
+        cache = _get_embedding_cache_safe() if provider.cacheable else None
+        if cache:
+            cached = await asyncio.to_thread(cache.get, text, provider.cache_key, task_type, query)
+            CACHE_REQUESTS.inc(cache="embedding", result="hit" if cached else "miss")
+            if cached:
+                timing["result"] = "cache"
+                return cached
+
+        if _embed_rejected(timing): return []
+        try:
+            vector = (await asyncio.wait_for(provider.aembed([text], task_type), timeout or None))[0]
+        except asyncio.TimeoutError:
+            return _embed_failed(provider, timing, f"lewat {timeout}s", "timeout")
+        except Exception as e:
+            return _embed_failed(provider, timing, e)
+        _EMBED_BREAKER.record_success()
+
+        if cache: await asyncio.to_thread(cache.set, text, provider.cache_key, task_type, vector, query)
+        return vector
+
+async def _adegraded_search(query_text, n_results, filter_tag, kind):
+    # Index lokal sudah di-refresh oleh _alexical_search di request yang sama (operasi memori)
+    if _LEXICAL_INDEX is not None and not _LEXICAL_INDEX.refresh_due():
+        return _degraded_search(query_text, n_results, filter_tag, kind)
+    return await asyncio.to_thread(_degraded_search, query_text, n_results, filter_tag, kind)
+
+async def async_search_faq(query_text, filter_tag=None, n_results=50):
+    """Padanan async dari search_faq (dipakai Web V2), ikut di-coalesce (single-flight)."""
+    return await _SEARCH_FLIGHT.do_async(
+        _flight_key("web", query_text, filter_tag, n_results),
+        lambda: _async_search_faq_direct(query_text, filter_tag, n_results)
+    )
+
+@async_retry_on_lock()
+async def _async_search_faq_direct(query_text, filter_tag=None, n_results=50):
+    match = await _alexical_search(query_text, n_results, filter_tag)
+    fast = _lexical_fast_path(match, n_results)
+    if fast is not None: return fast
+
+    vec = await _agenerate_embedding_raw(query_text, query=True)
+
+    if not vec:
+        return await _adegraded_search(query_text, n_results, filter_tag, "web") or _EMPTY_RESULT
+
+    return _hybrid(await _aquery_top_k(vec, n_results, filter_tag), match, n_results)
+
+async def async_search_faq_for_bot(query_text, filter_tag="Semua Modul"):
+    """Padanan async dari search_faq_for_bot (dipakai Bot WA). Embedding gagal = mode darurat."""
+    return await _SEARCH_FLIGHT.do_async(
+        _flight_key("bot", query_text, filter_tag, 5),
+        lambda: _async_search_faq_for_bot_direct(query_text, filter_tag)
+    )
+
+@async_retry_on_lock()
+async def _async_search_faq_for_bot_direct(query_text, filter_tag="Semua Modul"):
+    # Answer cache (cek data version SQLite + NumPy) selalu di thread, bukan di event loop
+    cached = await _aanswer_cache_call("get_exact", query_text, filter_tag)
+    if cached is not None: return cached
+
+    match = await _alexical_search(query_text, 5, filter_tag)
+    fast = _lexical_fast_path(match, 5)
+    if fast is not None:
+        await _aanswer_cache_call("put", query_text, filter_tag, None, fast)
+        return fast
+
+    vec = await _agenerate_embedding_raw(query_text, query=True)
+
+    if not vec:
+        return await _adegraded_search(query_text, 5, filter_tag, "bot")
+
+    cached = await _aanswer_cache_call("get_similar", vec, filter_tag)
+    if cached is not None: return cached
+
+    results = _hybrid(await _aquery_top_k(vec, 5, filter_tag), match, 5)
+    await _aanswer_cache_call("put", query_text, filter_tag, vec, results)
+    return results
+
+async def async_get_unique_tags_from_db():
+    return await asyncio.to_thread(get_unique_tags_from_db)
+
+async def async_list_faqs(tag=None, page=0, page_size=10):
+    """Padanan async dari list_faqs (dipakai Web V2 browse mode)."""
+    ids, total, page, total_pages = await asyncio.to_thread(_doc_index_page, tag, page, page_size)
+    data = await _acollection_call("get", ids=ids, include=['metadatas']) if ids else None
+    return _build_page(ids, data, total, page, total_pages)
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from .utils import normalize_query
+from .config import (
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL_DAYS
+)
+
+# --- PERSISTENT EMBEDDING CACHE (SQLITE, LINTAS PROSES) ---
+# Dipakai bersama oleh Bot WA, Web V2, App User & Admin lewat file di folder data/.
+# Satu file SQLite (mode WAL) aman dibaca/ditulis banyak container sekaligus.
+
+def make_key(text, model, task_type, normalize=False):
+    # normalize=True untuk query pencarian (variasi ketik user = 1 entry). Embedding dokumen
+    # dikunci dengan teks persis: beda huruf besar/spasi = teks dokumen yang beda.
+    # Prefix "q" memisahkan keduanya: vektor query tidak pernah dipakai untuk dokumen.
+    if normalize: text = "q\x1f" + normalize_query(text)
+    raw = f"{model}\x1f{task_type}\x1f{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Cache embedding berbasis SQLite dengan eviction LRU + TTL + batas jumlah entry.
+    - Key   : sha256(model, task_type, teks) — teks dinormalisasi hanya untuk query (normalize=True)
+    - Value : vektor float32 (BLOB)
+    Counter hit/miss disimpan per proses dan di-flush berkala ke tabel `counters`
+    supaya statistik gabungan semua container bisa dibaca dari mana saja.
+    """
+    TOUCH_INTERVAL = 60      # Detik, jeda minimal update last_access (hemat write)
+    PURGE_EVERY = 200        # Cek eviction tiap N write
+    FLUSH_INTERVAL = 30      # Detik, jeda flush counter ke SQLite
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 ttl_seconds=EMBEDDING_CACHE_TTL_DAYS * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._pending = dict(self._counts)
+        self._last_flush = time.monotonic()
+        self._writes_since_purge = 0
+        self._init_schema()
+
+    # --- Koneksi per thread (sqlite3 connection tidak boleh lintas thread) ---
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_emb_last_access ON embeddings(last_access)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )""")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+            self._pending[name] += n
+            due = time.monotonic() - self._last_flush > self.FLUSH_INTERVAL
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self):
+        with self._lock:
+            pending = {k: v for k, v in self._pending.items() if v}
+            self._pending = {k: 0 for k in self._pending}
+            self._last_flush = time.monotonic()
+        if not pending: return
+        try:
+            conn = self._conn()
+            for name, value in pending.items():
+                conn.execute(
+                    "INSERT INTO counters(name, value) VALUES(?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Gagal flush counter embedding cache: {e}")
+
+    # --- API UTAMA ---
+    def get(self, text, model, task_type, normalize=False):
+        key = make_key(text, model, task_type, normalize)
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT vector, created_at, last_access FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+
+            blob, created_at, last_access = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._count("evictions")
+                self._count("misses")
+                return None
+
+            if now - last_access > self.TOUCH_INTERVAL:
+                conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache read error: {e}")
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        vec = array("f")
+        vec.frombytes(blob)
+        return vec.tolist()
+
+    def set(self, text, model, task_type, vector, normalize=False):
+        if not vector: return
+        key = make_key(text, model, task_type, normalize)
+        now = time.time()
+        blob = array("f", vector).tobytes()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO embeddings(key, model, task_type, vector, created_at, last_access) "
+                "VALUES(?, ?, ?, ?, ?, ?)",
+                (key, model, task_type, blob, now, now)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache write error: {e}")
+            return
+        self._count("writes")
+
+        with self._lock:
+            self._writes_since_purge += 1
+            due = self._writes_since_purge >= self.PURGE_EVERY
+            if due: self._writes_since_purge = 0
+        if due:
+            self.purge()
+
+    def purge(self):
+        """Buang entry kadaluarsa (TTL) lalu entry paling lama tidak dipakai (LRU)."""
+        try:
+            conn = self._conn()
+            cur = conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            removed = cur.rowcount or 0
+            total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = total - self.max_entries
+            if overflow > 0:
+                cur = conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                removed += cur.rowcount or 0
+            if removed:
+                self._count("evictions", removed)
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache purge error: {e}")
+
+    def stats(self):
+        """Counter proses ini + counter gabungan semua proses + jumlah entry."""
+        self.flush_counters()
+        with self._lock:
+            local = dict(self._counts)
+        result = {"process": local, "global": {}, "entries": 0}
+        try:
+            conn = self._conn()
+            result["global"] = {name: value for name, value in conn.execute("SELECT name, value FROM counters")}
+            result["entries"] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache stats error: {e}")
+        lookups = local["hits"] + local["misses"]
+        result["hit_rate"] = round(local["hits"] / lookups, 4) if lookups else 0.0
+        return result
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_embedding_cache():
+    """Singleton cache per proses (file SQLite-nya dipakai bersama lintas proses)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = EmbeddingCache()
+    return _CACHE
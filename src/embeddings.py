@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+from .config import (
+    GOOGLE_API_KEY, EMBEDDING_MODEL, EMBEDDING_PROVIDER, EMBEDDING_DIM, EMBEDDING_LOCAL_MODEL,
+    EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY
+)
+
+# --- EMBEDDING PROVIDERS ---
+# Semua embedding (search, upsert, bulk import) lewat 1 provider yang dipilih config
+# EMBEDDING_PROVIDER, bukan langsung ke Gemini:
+# - gemini  : Gemini API (default, kualitas terbaik, butuh jaringan & kuota)
+# - local   : model sentence-transformers di CPU (opsional, pip install sentence-transformers)
+# - hashing : hashing kata + n-gram karakter di CPU, tanpa model & tanpa jaringan
+# - fake    : vektor acak deterministik per teks, untuk test/benchmark offline
+# Tiap provider mendeklarasikan dimensi & batas batch/konkurensi. `info()` dicatat di
+# metadata collection Chroma supaya ketahuan provider mana yang membangun vektornya.
+
+def _normalize(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return (vec / norm if norm else vec).tolist()
+
+class EmbeddingProvider:
+    """
+    Kontrak provider. `embed(texts, task_type)` -> list vektor sejajar `texts`,
+    melempar exception kalau gagal (pemanggil yang memutuskan fallback).
+    """
+    name = "base"
+    max_batch_size = 1       # teks per panggilan embed()
+    max_concurrency = 1      # panggilan embed() paralel (bulk import)
+    cacheable = True         # hasil layak disimpan di cache embedding disk
+
+    @property
+    def model(self):
+        raise NotImplementedError
+
+    @property
+    def dimension(self):
+        raise NotImplementedError
+
+    @property
+    def cache_key(self):
+        """Kunci `model` di embedding cache: beda provider/dimensi = entry terpisah."""
+        return f"{self.name}:{self.model}:{self.dimension}"
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        raise NotImplementedError
+
+    async def aembed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        return await asyncio.to_thread(self.embed, texts, task_type)
+
+    def info(self):
+        """Identitas provider untuk metadata collection (nilai skalar, aman untuk Chroma)."""
+        return {"embedding_provider": self.name, "embedding_model": self.model,
+                "embedding_dim": int(self.dimension)}
+
+class GeminiProvider(EmbeddingProvider):
+    name = "gemini"
+    max_batch_size = 100  # limit embed_content Gemini
+    DEFAULT_DIMENSION = 3072
+
+    def __init__(self, model=EMBEDDING_MODEL, dimension=None, api_key=GOOGLE_API_KEY,
+                 max_concurrency=EMBED_MAX_CONCURRENCY):
+        self._model = model
+        self._dimension = dimension or self.DEFAULT_DIMENSION
+        self._api_key = api_key
+        self.max_concurrency = max(1, max_concurrency)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    @property
+    def cache_key(self):
+        # Dimensi default memakai kunci lama (EMBEDDING_MODEL): cache yang sudah ada tetap terpakai
+        if self._dimension == self.DEFAULT_DIMENSION: return self._model
+        return f"{self._model}@{self._dimension}"
+
+    def _get_client(self):
+        """Koneksi ke Google Gemini, dibuat sekali per proses."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self._api_key)
+        return self._client
+
+    def _config(self, task_type):
+        from google.genai import types
+        if self._dimension == self.DEFAULT_DIMENSION:
+            return types.EmbedContentConfig(task_type=task_type)
+        return types.EmbedContentConfig(task_type=task_type, output_dimensionality=self._dimension)
+
+    def _vectors(self, response, count):
+        vectors = [e.values for e in response.embeddings]
+        if len(vectors) != count:
+            raise ValueError(f"Jumlah embedding {len(vectors)} != jumlah teks {count}")
+        # Dimensi terpotong (bukan 3072) tidak ter-normalisasi dari Gemini
+        if self._dimension != self.DEFAULT_DIMENSION: vectors = [_normalize(v) for v in vectors]
+        return vectors
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        response = self._get_client().models.embed_content(
+            model=self._model, contents=list(texts), config=self._config(task_type)
+        )
+        return self._vectors(response, len(texts))
+
+    async def aembed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        response = await self._get_client().aio.models.embed_content(
+            model=self._model, contents=list(texts), config=self._config(task_type)
+        )
+        return self._vectors(response, len(texts))
+
+class LocalModelProvider(EmbeddingProvider):
+    """Model sentence-transformers di CPU (dependency opsional, di-load saat pertama dipakai)."""
+    name = "local"
+    max_batch_size = 64
+    max_concurrency = 1  # model in-process: paralel thread tidak menambah throughput
+
+    def __init__(self, model_name=EMBEDDING_LOCAL_MODEL):
+        self._model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError:
+                        raise RuntimeError(
+                            "EMBEDDING_PROVIDER=local butuh paket sentence-transformers "
+                            "(pip install sentence-transformers)"
+                        )
+                    print(f"🧠 Memuat model embedding lokal: {self._model_name}")
+                    self._model = SentenceTransformer(self._model_name, device="cpu")
+        return self._model
+
+    @property
+    def model(self):
+        return self._model_name
+
+    @property
+    def dimension(self):
+        return self._load().get_sentence_embedding_dimension()
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        vectors = self._load().encode(list(texts), batch_size=self.max_batch_size, normalize_embeddings=True)
+        return [v.tolist() for v in vectors]
+
+class HashingProvider(EmbeddingProvider):
+    """
+    Feature hashing: kata, pasangan kata, dan n-gram karakter (tahan imbuhan/typo)
+    -> indeks & tanda deterministik. Cocok sebagai fallback offline, bukan pengganti semantik.
+    """
+    name = "hashing"
+    max_batch_size = 1000
+    max_concurrency = 1
+    cacheable = False  # lebih murah dihitung ulang daripada dibaca dari disk
+    DEFAULT_DIMENSION = 768
+    CHAR_NGRAM = 3
+    CHAR_WEIGHT = 0.5
+
+    def __init__(self, dimension=None):
+        self._dimension = dimension or self.DEFAULT_DIMENSION
+
+    @property
+    def model(self):
+        return "hashing-v1"
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    def _features(self, text):
+        tokens = re.findall(r"\w+", str(text).lower())
+        for token in tokens:
+            yield token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - self.CHAR_NGRAM + 1):
+                yield "c:" + padded[i:i + self.CHAR_NGRAM], self.CHAR_WEIGHT
+        for a, b in zip(tokens, tokens[1:]):
+            yield f"{a}_{b}", 1.0
+
+    def _embed_one(self, text):
+        vec = np.zeros(self._dimension, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self._dimension] += weight if (h >> 63) else -weight
+        if not vec.any(): vec[0] = 1.0  # teks kosong: tetap vektor valid
+        return _normalize(vec)
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        return [self._embed_one(t) for t in texts]
+
+class FakeProvider(EmbeddingProvider):
+    """
+    Vektor acak deterministik (seed = sha256 teks). Teks sama = vektor sama, tanpa makna.
+    `latency` (detik) & `fail` untuk mensimulasikan provider lambat / mati di test.
+    """
+    name = "fake"
+    max_batch_size = 1000
+    max_concurrency = 4
+    cacheable = False
+    DEFAULT_DIMENSION = 64
+
+    def __init__(self, dimension=None, latency=0.0, fail=False):
+        self._dimension = dimension or self.DEFAULT_DIMENSION
+        self.latency = latency
+        self.fail = fail
+
+    @property
+    def model(self):
+        return "fake-v1"
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    def _vectors(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+            vectors.append(_normalize(np.random.default_rng(seed).standard_normal(self._dimension)))
+        return vectors
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        if self.latency: time.sleep(self.latency)
+        if self.fail: raise RuntimeError("FakeProvider: simulasi provider gagal")
+        return self._vectors(texts)
+
+    async def aembed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        if self.latency: await asyncio.sleep(self.latency)
+        if self.fail: raise RuntimeError("FakeProvider: simulasi provider gagal")
+        return self._vectors(texts)
+
+PROVIDERS = {
+    "gemini": lambda: GeminiProvider(dimension=EMBEDDING_DIM or None),
+    "local": lambda: LocalModelProvider(),
+    "hashing": lambda: HashingProvider(dimension=EMBEDDING_DIM or None),
+    "fake": lambda: FakeProvider(dimension=EMBEDDING_DIM or None),
+}
+
+_PROVIDER = None
+_PROVIDER_LOCK = threading.Lock()
+
+def get_provider():
+    """Provider aktif (dibuat sekali per proses dari EMBEDDING_PROVIDER)."""
+    global _PROVIDER
+    if _PROVIDER is None:
+        with _PROVIDER_LOCK:
+            if _PROVIDER is None:
+                factory = PROVIDERS.get(EMBEDDING_PROVIDER)
+                if factory is None:
+                    raise ValueError(f"❌ EMBEDDING_PROVIDER tidak dikenal: '{EMBEDDING_PROVIDER}' "
+                                     f"(pilihan: {', '.join(PROVIDERS)})")
+                _PROVIDER = factory()
+    return _PROVIDER
+
+def set_provider(provider):
+    """Ganti provider aktif (test, benchmark, script migrasi)."""
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        _PROVIDER = provider
+    return provider
+
+def batch_limits(batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_MAX_CONCURRENCY, provider=None):
+    """Batas batch & konkurensi efektif: config dibatasi lagi oleh deklarasi provider."""
+    provider = provider or get_provider()
+    return (max(1, min(batch_size, provider.max_batch_size)),
+            max(1, min(max_workers, provider.max_concurrency)))
@@ -0,0 +1,162 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from .config import IMAGES_DIR, IMAGE_WORKERS
+
+# --- IMAGE INGESTION PIPELINE (ADMIN UPLOAD) ---
+# Upload SOP (sering 5-10 screenshot) diproses paralel di process pool, bukan
+# berurutan di thread request Streamlit. Per gambar dihasilkan:
+# - master JPEG maks 1024px (path lama di `path_gambar`, dipakai Bot & Web)
+# - master WebP, thumbnail JPEG & WebP (lebar THUMB_WIDTH) untuk srcset Web V2
+# Nama file memakai hash isi: {judul}_{tag}_{hash}. Upload ulang file yang identik
+# tidak di-encode lagi, file lama langsung dipakai.
+# Daftar varian disimpan di metadata `gambar_variants` (JSON, sejajar path_gambar).
+
+MASTER_WIDTH = 1024
+THUMB_WIDTH = 320
+JPEG_QUALITY = 70
+WEBP_QUALITY = 65
+HASH_LENGTH = 12
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def _resample():
+    resample_module = getattr(Image, "Resampling", None)
+    return resample_module.LANCZOS if resample_module else getattr(Image, "LANCZOS", Image.BICUBIC)
+
+def _resized(image, max_width):
+    if image.width <= max_width: return image
+    ratio = max_width / float(image.width)
+    return image.resize((max_width, int(float(image.height) * ratio)), _resample())
+
+def _variant_names(stem):
+    return {
+        "jpg": f"{stem}.jpg",
+        "webp": f"{stem}.webp",
+        "thumb": f"{stem}_thumb.jpg",
+        "thumb_webp": f"{stem}_thumb.webp",
+    }
+
+def process_image(raw, stem_prefix, tag, images_dir=IMAGES_DIR):
+    """
+    Worker (jalan di process pool): encode 1 upload jadi master + varian.
+    Return dict path relatif per varian (+ w/h master, `reused` kalau file sudah ada).
+    """
+    digest = hashlib.sha256(raw).hexdigest()[:HASH_LENGTH]
+    stem = f"{stem_prefix}_{tag}_{digest}"
+    target_dir = os.path.join(images_dir, tag)
+    os.makedirs(target_dir, exist_ok=True)
+    names = _variant_names(stem)
+    rel = lambda name: f"./images/{tag}/{name}"
+
+    if all(os.path.exists(os.path.join(target_dir, n)) for n in names.values()):
+        result = {k: rel(v) for k, v in names.items()}
+        try:
+            # Hanya baca header untuk ukuran (tanpa decode piksel)
+            with Image.open(os.path.join(target_dir, names["jpg"])) as m: result["w"], result["h"] = m.size
+            with Image.open(os.path.join(target_dir, names["thumb"])) as t: result["tw"], result["th"] = t.size
+        except Exception:
+            pass
+        result["reused"] = True
+        return result
+
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+    except Exception as e:
+        # Bukan gambar yang bisa di-decode: simpan apa adanya (perilaku lama)
+        print(f"⚠️ Gagal compress gambar {stem}: {e}")
+        with open(os.path.join(target_dir, names["jpg"]), "wb") as f:
+            f.write(raw)
+        return {"jpg": rel(names["jpg"]), "reused": False}
+
+    master = _resized(image, MASTER_WIDTH)
+    thumb = _resized(master, THUMB_WIDTH)
+    outputs = (
+        (master, names["jpg"], "JPEG", {"quality": JPEG_QUALITY, "optimize": True}),
+        (master, names["webp"], "WEBP", {"quality": WEBP_QUALITY, "method": 4}),
+        (thumb, names["thumb"], "JPEG", {"quality": JPEG_QUALITY, "optimize": True}),
+        (thumb, names["thumb_webp"], "WEBP", {"quality": WEBP_QUALITY, "method": 4}),
+    )
+    for img, name, fmt, opts in outputs:
+        # Tulis ke file sementara lalu rename: pembaca (Web V2/Bot) tidak pernah lihat file setengah jadi
+        final_path = os.path.join(target_dir, name)
+        tmp_path = f"{final_path}.tmp{os.getpid()}"
+        img.save(tmp_path, fmt, **opts)
+        os.replace(tmp_path, final_path)
+
+    result = {k: rel(v) for k, v in names.items()}
+    result.update({"w": master.width, "h": master.height, "tw": thumb.width, "th": thumb.height, "reused": False})
+    return result
+
+def _get_pool():
+    """Process pool bersama (spawn: aman dari thread Streamlit). None kalau IMAGE_WORKERS=0."""
+    global _POOL
+    if IMAGE_WORKERS <= 0: return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None: _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+def _read_upload(file):
+    if hasattr(file, "getvalue"): return file.getvalue()
+    if hasattr(file, "seek"): file.seek(0)
+    data = file.read()
+    if hasattr(file, "seek"): file.seek(0)
+    return data
+
+def save_uploads(uploaded_files, stem_prefix, tag):
+    """
+    Proses semua upload paralel. Return (path_gambar, gambar_variants):
+    - path_gambar: "./images/TAG/a.jpg;./images/TAG/b.jpg" (atau "none")
+    - gambar_variants: JSON list varian, urutan sama dengan path_gambar (atau "")
+    """
+    if not uploaded_files: return "none", ""
+    raws = [_read_upload(f) for f in uploaded_files]
+
+    results = None
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            futures = [pool.submit(process_image, raw, stem_prefix, tag) for raw in raws]
+            results = [f.result() for f in futures]
+        except Exception as e:
+            print(f"⚠️ Process pool gambar gagal, proses berurutan: {e}")
+            _reset_pool()
+    if results is None:
+        results = [process_image(raw, stem_prefix, tag) for raw in raws]
+
+    reused = sum(1 for r in results if r.pop("reused", False))
+    if reused: print(f"♻️ {reused}/{len(results)} gambar identik dipakai ulang (tanpa encode)")
+    paths = ";".join(r["jpg"] for r in results)
+    return paths, json.dumps(results)
+
+def parse_variants(raw):
+    """`gambar_variants` metadata -> list dict (kosong kalau tidak ada / rusak)."""
+    if not raw: return []
+    try:
+        data = json.loads(raw)
+        return data if isinstance(data, list) else []
+    except (TypeError, ValueError):
+        return []
+
+def variants_for_paths(raw_variants, img_paths):
+    """Ambil varian yang master-nya masih ada di `img_paths` (urutan ikut img_paths)."""
+    by_master = {v.get("jpg"): v for v in parse_variants(raw_variants) if isinstance(v, dict)}
+    if not by_master or not img_paths or str(img_paths).lower() == "none": return ""
+    kept = [by_master[p.strip()] for p in str(img_paths).split(";") if p.strip() in by_master]
+    return json.dumps(kept) if kept else ""
@@ -0,0 +1,296 @@
+import heapq
+import math
+import re
+import threading
+import time
+from . import state
+from .utils import clean_text_for_embedding
+from .config import LEXICAL_INDEX_REFRESH_SECONDS, VECTOR_INDEX_FULL_SYNC_SECONDS
+
+# --- IN-PROCESS LEXICAL INDEX (BM25 UNTUK READ PATH) ---
+# Banyak query staf berupa istilah modul / pesan error yang persis ada di judul atau
+# keywords_raw. Index ini inverted index BM25 di memori atas judul, keywords_raw &
+# jawaban_tampil (bobot per field ala BM25F), dipakai untuk:
+# - Fast path: query yang jelas cocok dijawab tanpa embedding Gemini sama sekali.
+# - Hybrid: skor vektor dinaikkan sesuai kecocokan kata (fusion).
+# Sinkronisasi sama seperti VectorIndex: changelog data version (src/state.py) yang
+# ditulis upsert_faq / delete_faq, plus cek col.count() berkala.
+
+LOAD_PAGE_SIZE = 1000
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Bobot field: judul & keyword lebih "tegas" daripada isi jawaban
+FIELD_WEIGHTS = (("judul", 3.0), ("keywords_raw", 2.0), ("jawaban_tampil", 1.0))
+STRONG_FIELDS = ("judul", "keywords_raw")
+# Kredit coverage kalau kata hanya muncul di jawaban (bukan judul/keyword)
+BODY_CREDIT = 0.5
+
+STOPWORDS = frozenset("""
+yang di ke dari dan atau untuk pada dengan ini itu ada tidak bisa saya kami kita
+apa apakah bagaimana gimana cara kenapa mengapa kok ya tolong mohon nya juga sudah
+belum akan jika kalau agar supaya adalah dalam oleh the a an of to is
+""".split())
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+def tokenize(text):
+    """Lowercase, pecah per kata (huruf/angka), buang stopword."""
+    if not text: return []
+    return [t for t in _TOKEN_RE.findall(str(text).casefold()) if t not in STOPWORDS]
+
+class LexicalMatch:
+    """
+    Hasil pencarian leksikal untuk 1 query.
+    - hits : top-n [(doc_id, bm25, sim, meta)] urut BM25 tertinggi
+    - sims : {doc_id: sim} untuk SEMUA kandidat (dipakai fusion)
+    - n_terms: jumlah kata unik query (setelah stopword)
+    `sim` (0..1) = proporsi kata query (bobot IDF) yang ditemukan di dokumen;
+    kata di judul/keyword dapat kredit penuh, di jawaban saja dapat BODY_CREDIT.
+    """
+    __slots__ = ("hits", "sims", "n_terms")
+
+    def __init__(self, hits, sims, n_terms):
+        self.hits = hits
+        self.sims = sims
+        self.n_terms = n_terms
+
+    def is_confident(self, min_score, min_terms, margin):
+        """Top hit cukup jelas untuk menjawab tanpa embedding?"""
+        if not self.hits or self.n_terms < min_terms: return False
+        top = self.hits[0]
+        if top[2] < min_score: return False
+        if len(self.hits) > 1 and top[1] < self.hits[1][1] * margin: return False
+        return True
+
+    def as_result(self, n_results):
+        """
+        Format sama dengan col.query() (distance = 1 - coverage kata), plus "lexical": True:
+        skornya bukan similarity semantik, UI menampilkannya sebagai "cocok kata kunci".
+        """
+        hits = self.hits[:n_results]
+        return {
+            "ids": [[h[0] for h in hits]],
+            "metadatas": [[dict(h[3]) for h in hits]],
+            "distances": [[1.0 - h[2] for h in hits]],
+            "lexical": True,
+        }
+
+def hybrid_merge(vector_result, match, weight, n_results):
+    """
+    Gabungkan hasil vektor (format col.query) dengan kecocokan leksikal.
+    Skor vektor (1 - distance) dinaikkan: sim_vec + weight * sim_lex * (1 - sim_vec),
+    jadi tidak pernah turun & tidak lewat 100%. Dokumen yang hanya ketemu lewat
+    BM25 ikut masuk dengan skor weight * sim_lex.
+    """
+    if match is None or not match.sims: return vector_result
+    fused = {}
+    if vector_result and vector_result['ids'] and vector_result['ids'][0]:
+        for i, doc_id in enumerate(vector_result['ids'][0]):
+            sim_vec = max(0.0, 1.0 - vector_result['distances'][0][i])
+            sim_lex = match.sims.get(doc_id, 0.0)
+            fused[doc_id] = (sim_vec + weight * sim_lex * (1.0 - sim_vec), vector_result['metadatas'][0][i])
+    for doc_id, _, sim_lex, meta in match.hits:
+        if doc_id not in fused:
+            fused[doc_id] = (weight * sim_lex, dict(meta))
+
+    ranked = sorted(fused.items(), key=lambda kv: kv[1][0], reverse=True)[:n_results]
+    return {
+        "ids": [[doc_id for doc_id, _ in ranked]],
+        "metadatas": [[meta for _, (_, meta) in ranked]],
+        "distances": [[1.0 - score for _, (score, _) in ranked]],
+    }
+
+class LexicalIndex:
+    def __init__(self, pool, refresh_interval=LEXICAL_INDEX_REFRESH_SECONDS,
+                 full_sync_interval=VECTOR_INDEX_FULL_SYNC_SECONDS):
+        self._pool = pool
+        self._refresh_interval = refresh_interval
+        self._full_sync_interval = full_sync_interval
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._docs = {}      # doc_id -> (tf dict, strong term set, panjang, tag, meta)
+        self._postings = {}  # term -> set(doc_id)
+        self._total_len = 0.0
+        self._version = 0
+        self._last_check = 0.0
+        self._last_full_sync = 0.0
+
+    # --- BUILD ---
+    @staticmethod
+    def _analyze(meta):
+        tf = {}
+        strong = set()
+        for field, weight in FIELD_WEIGHTS:
+            text = meta.get(field) or ""
+            if field == "jawaban_tampil": text = clean_text_for_embedding(text)
+            for term in tokenize(text):
+                tf[term] = tf.get(term, 0.0) + weight
+                if field in STRONG_FIELDS: strong.add(term)
+        return tf, strong, sum(tf.values())
+
+    def _add(self, doc_id, meta):
+        self._remove(doc_id)
+        meta = meta or {}
+        tf, strong, length = self._analyze(meta)
+        self._docs[doc_id] = (tf, strong, length, meta.get('tag'), meta)
+        self._total_len += length
+        for term in tf:
+            self._postings.setdefault(term, set()).add(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None: return
+        self._total_len -= doc[2]
+        for term in doc[0]:
+            ids = self._postings.get(term)
+            if ids is None: continue
+            ids.discard(doc_id)
+            if not ids: del self._postings[term]
+
+    # --- LOAD & SYNC ---
+    def _full_load(self):
+        version = state.get_data_version()
+        ids, metas = [], []
+        offset = 0
+        while True:
+            data = self._pool.run(lambda c: c.get(include=['metadatas'], limit=LOAD_PAGE_SIZE, offset=offset))
+            if not data['ids']: break
+            ids.extend(data['ids'])
+            metas.extend(data['metadatas'])
+            offset += len(data['ids'])
+            if len(data['ids']) < LOAD_PAGE_SIZE: break
+
+        with self._lock:
+            self._docs = {}
+            self._postings = {}
+            self._total_len = 0.0
+            for doc_id, meta in zip(ids, metas):
+                self._add(doc_id, meta)
+            self._version = version
+            self._loaded = True
+            self._last_full_sync = time.monotonic()
+        print(f"🔤 Lexical index dimuat: {len(ids)} dokumen, {len(self._postings)} term (version={version})")
+
+    def _apply_changes(self, version, changed_ids):
+        data = self._pool.run(lambda c: c.get(ids=list(changed_ids), include=['metadatas']))
+        found = {doc_id: data['metadatas'][i] for i, doc_id in enumerate(data['ids'])}
+        with self._lock:
+            for doc_id in changed_ids:
+                if doc_id in found: self._add(doc_id, found[doc_id])
+                else: self._remove(doc_id)
+            self._version = version
+
+    def refresh_due(self):
+        return not self._loaded or time.monotonic() - self._last_check >= self._refresh_interval
+
+    def expire(self):
+        """Cek data version pada pencarian berikutnya (dipanggil setelah write di proses ini)."""
+        self._last_check = 0.0
+
+    def refresh(self, force=False):
+        """Sinkronkan index dengan Chroma (murah kalau tidak ada perubahan)."""
+        if not force and not self.refresh_due():
+            return
+        with self._refresh_lock:
+            self._refresh_locked(force)
+
+    def _refresh_locked(self, force):
+        now = time.monotonic()
+        if not self._loaded or force:
+            self._full_load()
+            self._last_check = now
+            return
+        if now - self._last_check < self._refresh_interval: return
+        self._last_check = now
+
+        if now - self._last_full_sync > self._full_sync_interval:
+            self._last_full_sync = now
+            count = self._pool.run(lambda c: c.count())
+            if count != len(self._docs):
+                print(f"⚠️ Lexical index tidak sinkron ({len(self._docs)} vs {count}), reload penuh.")
+                self._full_load()
+                return
+
+        version, changed = state.changes_since(self._version)
+        if changed is None:
+            self._full_load()
+        elif changed:
+            self._apply_changes(version, changed)
+        else:
+            self._version = version
+
+    # --- QUERY ---
+    def search(self, query_text, n_results, filter_tag=None, strong_only=False):
+        """
+        BM25 top-n + similarity semua kandidat. Return LexicalMatch.
+        strong_only=True (mode darurat tanpa embedding): hanya kata di judul/keywords_raw
+        yang dihitung, urut similarity dulu baru BM25.
+        """
+        terms = list(dict.fromkeys(tokenize(query_text)))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not terms or n_docs == 0: return LexicalMatch([], {}, len(terms))
+            avg_len = (self._total_len / n_docs) or 1.0
+
+            idf = {}
+            for term in terms:
+                df = len(self._postings.get(term, ()))
+                idf[term] = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            idf_total = sum(idf.values())
+
+            candidates = set()
+            for term in terms:
+                candidates.update(self._postings.get(term, ()))
+
+            scored = []
+            sims = {}
+            for doc_id in candidates:
+                tf, strong, length, tag, meta = self._docs[doc_id]
+                if filter_tag and tag != filter_tag: continue
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * length / avg_len)
+                bm25 = 0.0
+                covered = 0.0
+                for term in terms:
+                    freq = tf.get(term)
+                    if not freq or (strong_only and term not in strong): continue
+                    bm25 += idf[term] * freq * (BM25_K1 + 1.0) / (freq + norm)
+                    covered += idf[term] * (1.0 if term in strong else BODY_CREDIT)
+                if strong_only and not covered: continue
+                sim = covered / idf_total if idf_total else 0.0
+                sims[doc_id] = sim
+                scored.append((bm25, doc_id, sim, meta))
+
+            rank = (lambda s: (s[2], s[0])) if strong_only else (lambda s: (s[0], s[2]))
+            top = heapq.nlargest(n_results, scored, key=rank)
+            hits = [(doc_id, bm25, sim, meta) for bm25, doc_id, sim, meta in top]
+            return LexicalMatch(hits, sims, len(terms))
+
+    def stats(self):
+        with self._lock:
+            return {"loaded": self._loaded, "size": len(self._docs),
+                    "terms": len(self._postings), "version": self._version}
+
+def keyword_result(query_text, ids, metadatas, n_results):
+    """
+    Mode darurat tanpa index lokal: skor kandidat (hasil filter Chroma) dari proporsi kata
+    query yang ada di judul/keywords_raw. Format col.query (distance = 1 - sim).
+    """
+    terms = set(tokenize(query_text))
+    scored = []
+    for doc_id, meta in zip(ids, metadatas):
+        meta = meta or {}
+        found = set(tokenize(meta.get('judul'))) | set(tokenize(meta.get('keywords_raw')))
+        sim = len(terms & found) / len(terms) if terms else 0.0
+        if sim <= 0: continue
+        try: id_num = int(doc_id)
+        except ValueError: id_num = 0
+        scored.append((sim, id_num, doc_id, meta))
+    top = heapq.nlargest(n_results, scored, key=lambda s: (s[0], s[1]))
+    return {
+        "ids": [[s[2] for s in top]],
+        "metadatas": [[dict(s[3]) for s in top]],
+        "distances": [[1.0 - s[0] for s in top]],
+        "lexical": True,
+    }
@@ -0,0 +1,205 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# --- METRICS (PROMETHEUS TEXT FORMAT) ---
+# Latency per tahap jawaban: embedding Gemini, query/get Chroma, render markdown (Web V2),
+# kirim WPPConnect (Bot). Ditambah counter retry_on_lock dan hit/miss cache.
+# Tanpa dependency prometheus_client: registry kecil per proses, dirender oleh
+# endpoint /metrics di Web V2 dan Bot WA (render_prometheus).
+# Statistik yang sudah dihitung modul lain (answer cache, render cache, dsb) tidak
+# dihitung ulang: didaftarkan sebagai collector dan dibaca saat /metrics di-scrape.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def _format_value(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # label key -> [count per bucket..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = [0] * len(self._buckets) + [0.0, 0]
+                self._values[key] = entry
+            for i, bound in enumerate(self._buckets):
+                if value <= bound: entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Ukur durasi blok `with` (label status=ok|error). Label bisa diubah lewat dict yang di-yield."""
+        labels = dict(labels)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield labels
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            labels.setdefault("status", "error" if failed else "ok")
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, entry in sorted(values.items()):
+            for bound, count in zip(self._buckets, entry):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {entry[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}
+
+    def counter(self, name, help_text):
+        return self._register(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help_text, buckets))
+
+    def _register(self, name, factory):
+        with self._lock:
+            if name not in self._metrics: self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def register_collector(self, name, help_text, metric_type, fn):
+        """
+        `fn()` -> {tuple pasangan (label, nilai) atau (): angka}, dipanggil saat scrape.
+        Nama yang sama didaftarkan ulang (mis. modul di-reload Streamlit) menimpa yang lama.
+        """
+        with self._lock:
+            self._collectors[name] = (help_text, metric_type, fn)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines = []
+        for metric in metrics:
+            lines += metric.collect()
+        for name, (help_text, metric_type, fn) in collectors:
+            try:
+                samples = fn() or {}
+            except Exception as e:
+                print(f"⚠️ Collector metrics {name} gagal: {e}")
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            for labels, value in samples.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"{name}{_format_labels(labels or ())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- METRIK BERSAMA (Web V2, Bot, Streamlit) ---
+EMBEDDING_SECONDS = REGISTRY.histogram(
+    "faq_embedding_seconds", "Durasi embedding query/dokumen (result=cache|api|timeout|error|busy|breaker_open, provider, status)")
+CHROMA_SECONDS = REGISTRY.histogram(
+    "faq_chroma_seconds", "Durasi operasi collection Chroma (op=query|get)")
+RENDER_SECONDS = REGISTRY.histogram(
+    "faq_render_seconds", "Durasi process_content_to_html (markdown -> HTML)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+WPP_SEND_SECONDS = REGISTRY.histogram(
+    "faq_wpp_send_seconds", "Durasi kirim ke WPPConnect (kind=text|image, status=ok|error)")
+CACHE_REQUESTS = REGISTRY.counter(
+    "faq_cache_requests_total", "Lookup cache embedding disk (cache=embedding, result=hit|miss)")
+LOCK_RETRIES = REGISTRY.counter(
+    "faq_lock_retries_total", "Retry karena database locked/busy (retry_on_lock)")
+SEARCH_DEGRADED = REGISTRY.counter(
+    "faq_search_degraded_total", "Search dijawab mode darurat kata kunci, tanpa embedding (kind=web|bot)")
+
+def timed(histogram, **labels):
+    """Decorator: durasi fungsi masuk `histogram` (label status=error kalau exception)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TimedCollection:
+    """Proxy collection Chroma: query() & get() diukur, atribut lain diteruskan apa adanya."""
+    def __init__(self, collection):
+        self._collection = collection
+
+    def query(self, *args, **kwargs):
+        with CHROMA_SECONDS.time(op="query"):
+            return self._collection.query(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        with CHROMA_SECONDS.time(op="get"):
+            return self._collection.get(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+class AsyncTimedCollection(TimedCollection):
+    """Padanan TimedCollection untuk collection AsyncHttpClient (query/get berupa coroutine)."""
+    async def query(self, *args, **kwargs):
+        with CHROMA_SECONDS.time(op="query"):
+            return await self._collection.query(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        with CHROMA_SECONDS.time(op="get"):
+            return await self._collection.get(*args, **kwargs)
+
+def stats_collector(stats_fn, keys, label="result"):
+    """Collector dari fungsi stats() yang sudah ada: ambil `keys` jadi sampel berlabel."""
+    def collect():
+        stats = stats_fn() or {}
+        return {((label, k),): stats[k] for k in keys if k in stats}
+    return collect
+
+def render_prometheus():
+    return REGISTRY.render()
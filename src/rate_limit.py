@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import OrderedDict
+from .config import BOT_DEBOUNCE_SECONDS, BOT_DEBOUNCE_MAX_SECONDS
+
+# --- DEBOUNCE & RATE LIMIT (BOT WA) ---
+# - Debouncer: user sering mengetik 1 pertanyaan jadi beberapa bubble cepat.
+#   Pesan pertama menunggu sampai chat "diam" selama `window` detik, pesan
+#   berikutnya digabung ke sana, jadi cukup 1x embedding + 1x balasan.
+#   Baru teks gabungannya yang masuk antrian worker.
+# - KeyedRateLimiter: token bucket per kunci (chat / grup), supaya 1 grup yang
+#   ramai tidak menghabiskan kuota Gemini & worker untuk semua orang.
+# Semua state hidup di event loop bot (tanpa lock, dipanggil dari coroutine).
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, cost=1.0):
+        self._refill()
+        return self.tokens >= cost
+
+    def try_acquire(self, cost=1.0):
+        if self.available(cost):
+            self.tokens -= cost
+            return True
+        return False
+
+class KeyedRateLimiter:
+    """Token bucket per kunci. `rate_per_min` <= 0 berarti tanpa batas."""
+    def __init__(self, rate_per_min, burst, max_keys=10000):
+        self._rate = rate_per_min / 60.0
+        self._burst = max(1.0, burst)
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._stats = {"allowed": 0, "limited": 0}
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self._rate, self._burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self._max_keys: self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def available(self, key):
+        """Masih ada token? (tidak mengambil token, tidak dihitung di stats)"""
+        if self._rate <= 0: return True
+        return self._bucket(key).available()
+
+    def allow(self, key):
+        if self._rate <= 0: return True
+        if self._bucket(key).try_acquire():
+            self._stats["allowed"] += 1
+            return True
+        self._stats["limited"] += 1
+        return False
+
+    def reject(self):
+        self._stats["limited"] += 1
+
+    def stats(self):
+        return dict(self._stats, keys=len(self._buckets))
+
+def allow_all(*checks):
+    """
+    `checks` = pasangan (limiter, key). Token hanya diambil kalau SEMUA bucket masih
+    cukup: pesan yang ditolak bucket grup tidak ikut menghabiskan kuota chat.
+    """
+    blocked = [limiter for limiter, key in checks if not limiter.available(key)]
+    if blocked:
+        for limiter in blocked: limiter.reject()
+        return False
+    for limiter, key in checks: limiter.allow(key)
+    return True
+
+class Debouncer:
+    """
+    Timer burst berjalan di event loop (loop.call_later), bukan di worker antrian:
+    selama jendela debounce tidak ada worker yang tertahan. Saat jendela tutup,
+    `on_ready(teks_gabungan)` dipanggil sekali (sync, cukup menjadwalkan pekerjaan).
+    """
+    def __init__(self, window=BOT_DEBOUNCE_SECONDS, max_wait=BOT_DEBOUNCE_MAX_SECONDS):
+        self._window = window
+        self._max_wait = max(window, max_wait)
+        self._pending = {}  # key -> {"parts": [...], "ids": set, "first": t, "last": t, "on_ready": fn}
+        self._stats = {"bursts": 0, "merged": 0}
+
+    def _merge(self, buf, text, msg_id):
+        if text: buf["parts"].append(text)
+        if msg_id: buf["ids"].add(msg_id)
+        buf["last"] = time.monotonic()
+        self._stats["merged"] += 1
+
+    def add(self, key, text, on_ready, msg_id=None):
+        """Mulai burst baru, atau gabung ke burst `key` yang sedang ditunggu."""
+        buf = self._pending.get(key)
+        if buf is not None:
+            self._merge(buf, text, msg_id)
+            return
+        if self._window <= 0:
+            on_ready(text)
+            return
+
+        now = time.monotonic()
+        buf = {"parts": [text] if text else [], "ids": {msg_id} if msg_id else set(),
+               "first": now, "last": now, "on_ready": on_ready}
+        self._pending[key] = buf
+        self._stats["bursts"] += 1
+        asyncio.get_running_loop().call_later(self._window, self._check, key, buf)
+
+    def append_if_pending(self, key, text, reply_to, msg_id=None):
+        """
+        Gabungkan pesan susulan ke burst yang sedang ditunggu, hanya kalau pesan itu
+        membalas/quote salah satu pesan di burst. Return False kalau tidak digabung.
+        """
+        buf = self._pending.get(key)
+        if buf is None or not reply_to: return False
+        if not any(reply_to == i or reply_to in i for i in buf["ids"]): return False
+        self._merge(buf, text, msg_id)
+        return True
+
+    def _check(self, key, buf):
+        if self._pending.get(key) is not buf: return
+        deadline = min(buf["last"] + self._window, buf["first"] + self._max_wait)
+        wait = deadline - time.monotonic()
+        if wait > 0:
+            asyncio.get_running_loop().call_later(wait, self._check, key, buf)
+            return
+        del self._pending[key]
+        try:
+            buf["on_ready"](" ".join(buf["parts"]))
+        except Exception as e:
+            print(f"❌ Gagal memproses burst {key}: {e}", flush=True)
+
+    def stats(self):
+        return dict(self._stats, pending=len(self._pending))
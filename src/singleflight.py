@@ -0,0 +1,102 @@
+import asyncio
+import copy
+import threading
+
+# --- SINGLE-FLIGHT (REQUEST COALESCING) ---
+# Kalau banyak user mencari hal yang sama di detik yang sama (misal pergantian shift),
+# hanya 1 request yang benar-benar memanggil Gemini + Chroma. Request lain dengan
+# kunci identik menunggu dan memakai hasil yang sama (di-copy, aman dimodifikasi).
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class _LeaderCancelled(Exception):
+    """Leader async dibatalkan sebelum selesai; follower harus mengulang sendiri."""
+
+class SingleFlight:
+    """
+    Coalescing per proses untuk pemanggil sync (thread) maupun async (event loop).
+    Counter:
+    - requests  : total pemanggilan
+    - executions: berapa kali fungsi asli benar-benar dijalankan
+    - coalesced : berapa request yang menumpang hasil request lain
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._stats = {"requests": 0, "executions": 0, "coalesced": 0}
+
+    def _register(self, table, key, factory):
+        with self._lock:
+            self._stats["requests"] += 1
+            call = table.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                return call, False
+            call = factory()
+            table[key] = call
+            self._stats["executions"] += 1
+            return call, True
+
+    def do(self, key, fn):
+        """Jalankan `fn()` sekali untuk semua thread yang memanggil dengan `key` yang sama."""
+        call, leader = self._register(self._calls, key, _Call)
+        if not leader:
+            call.event.wait()
+            if call.error is not None: raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return copy.deepcopy(call.result)
+
+    async def do_async(self, key, coro_fn):
+        """Versi async: `coro_fn()` di-await sekali untuk semua coroutine dengan `key` sama."""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        while True:
+            future, leader = self._register(self._async_calls, loop_key, loop.create_future)
+            if leader: break
+            try:
+                # shield: request yang dibatalkan tidak ikut membatalkan request lain
+                result = await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue  # Leader batal: follower pertama jadi leader baru, sisanya ikut
+            return copy.deepcopy(result)
+
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            # Jangan cancel future bersama: follower diminta mengulang, bukan ikut batal
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Hindari warning "exception was never retrieved" kalau tidak ada follower
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                if self._async_calls.get(loop_key) is future:
+                    self._async_calls.pop(loop_key, None)
+        return copy.deepcopy(result)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
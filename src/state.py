@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import threading
+import time
+from .config import STATE_DB_PATH
+
+# --- SHARED STATE STORE (SQLITE, LINTAS PROSES) ---
+# State kecil yang harus sama di semua container (Admin, App, Web V2, Bot):
+# - data version + changelog dokumen: naik setiap upsert_faq / delete_faq,
+#   dipakai cache/index di proses lain untuk tahu kapan & dokumen mana yang berubah.
+# - doc_index: (id, id_num, tag) untuk paginasi browse mode urut ID Descending
+#   tanpa harus download seluruh metadata dari Chroma.
+# - sequences: counter ID dokumen atomik (BEGIN IMMEDIATE), aman untuk beberapa
+#   admin/container yang publish bersamaan.
+
+CHANGELOG_KEEP = 5000  # Jumlah baris changelog yang disimpan (sisanya dipangkas)
+
+_local = threading.local()
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(STATE_DB_PATH, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    if STATE_DB_PATH not in _schema_ready:
+        with _schema_lock:
+            if STATE_DB_PATH not in _schema_ready:
+                _init_schema(conn)
+                _schema_ready.add(STATE_DB_PATH)
+    return conn
+
+def _init_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            ts REAL NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS doc_index (
+            id TEXT PRIMARY KEY,
+            id_num INTEGER NOT NULL,
+            tag TEXT
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_index_num ON doc_index(id_num DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_index_tag_num ON doc_index(tag, id_num DESC)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )""")
+
+def _id_num(doc_id):
+    try: return int(doc_id)
+    except: return 0
+
+# --- 1. DATA VERSION & CHANGELOG ---
+def record_changes(doc_ids, op, tags=None):
+    """
+    Catat dokumen yang berubah (op: 'upsert' / 'delete') dan naikkan data version.
+    `tags` (sejajar doc_ids) dipakai untuk memperbarui doc_index saat upsert.
+    Return: data version terbaru.
+    """
+    doc_ids = [str(x) for x in doc_ids]
+    if not doc_ids: return get_data_version()
+    conn = _conn()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO changes(doc_id, op, ts) VALUES(?, ?, ?)",
+            [(doc_id, op, now) for doc_id in doc_ids]
+        )
+        if op == "delete":
+            conn.executemany("DELETE FROM doc_index WHERE id = ?", [(d,) for d in doc_ids])
+        elif tags is not None:
+            conn.executemany(
+                "INSERT OR REPLACE INTO doc_index(id, id_num, tag) VALUES(?, ?, ?)",
+                [(d, _id_num(d), t) for d, t in zip(doc_ids, tags)]
+            )
+        version = conn.execute("SELECT MAX(version) FROM changes").fetchone()[0]
+        conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGELOG_KEEP,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+def get_data_version():
+    """Versi data saat ini (0 kalau belum pernah ada perubahan tercatat)."""
+    row = _conn().execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+    ).fetchone()
+    return row[0] if row else 0
+
+def changes_since(version):
+    """
+    Dokumen yang berubah setelah `version`.
+    Return: (versi_terbaru, set doc_id). set = None kalau changelog sudah terpangkas
+    (pemanggil harus reload penuh).
+    """
+    conn = _conn()
+    current = get_data_version()
+    if version >= current: return current, set()
+    oldest = conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+    if oldest is None or oldest > version + 1:
+        return current, None
+    rows = conn.execute(
+        "SELECT doc_id FROM changes WHERE version > ? AND version <= ?", (version, current)
+    ).fetchall()
+    return current, {r[0] for r in rows}
+
+# --- 2. DOC INDEX (PAGINASI BROWSE MODE) ---
+def replace_doc_index(entries):
+    """Seed ulang doc_index dari Chroma. `entries`: iterable (doc_id, tag)."""
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM doc_index")
+        conn.executemany(
+            "INSERT OR REPLACE INTO doc_index(id, id_num, tag) VALUES(?, ?, ?)",
+            [(str(d), _id_num(d), t) for d, t in entries]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def doc_index_count(tag=None):
+    conn = _conn()
+    if tag:
+        return conn.execute("SELECT COUNT(*) FROM doc_index WHERE tag = ?", (tag,)).fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM doc_index").fetchone()[0]
+
+def doc_index_page(tag=None, offset=0, limit=10):
+    """ID dokumen urut ID Descending (Terbaru) untuk 1 halaman."""
+    conn = _conn()
+    if tag:
+        rows = conn.execute(
+            "SELECT id FROM doc_index WHERE tag = ? ORDER BY id_num DESC, id DESC LIMIT ? OFFSET ?",
+            (tag, limit, offset)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id FROM doc_index ORDER BY id_num DESC, id DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+    return [r[0] for r in rows]
+
+def doc_index_tags():
+    return [r[0] for r in _conn().execute(
+        "SELECT DISTINCT tag FROM doc_index WHERE tag IS NOT NULL AND tag != '' ORDER BY tag"
+    )]
+
+# --- 3. ATOMIC DOCUMENT ID ALLOCATOR ---
+DOC_ID_SEQUENCE = "doc_id"
+
+def allocate_doc_ids(count=1, seed_max=None):
+    """
+    Ambil `count` ID dokumen baru secara atomik (O(1), tanpa scan collection).
+    `seed_max`: callable -> int (ID numerik terbesar di Chroma). Hanya dipanggil sekali
+    saat sequence belum ada. Nilai sequence juga tidak pernah di bawah MAX(id_num)
+    doc_index, jadi aman kalau ada dokumen yang masuk tanpa lewat allocator.
+    Return: list ID (string) berurutan.
+    """
+    if count <= 0: return []
+    conn = _conn()
+    exists = conn.execute("SELECT 1 FROM sequences WHERE name = ?", (DOC_ID_SEQUENCE,)).fetchone()
+    if exists is None and seed_max is not None:
+        start = int(seed_max() or 0)
+        conn.execute("INSERT OR IGNORE INTO sequences(name, value) VALUES(?, ?)", (DOC_ID_SEQUENCE, start))
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT value FROM sequences WHERE name = ?", (DOC_ID_SEQUENCE,)).fetchone()
+        floor = conn.execute("SELECT COALESCE(MAX(id_num), 0) FROM doc_index").fetchone()[0]
+        current = max(row[0] if row else 0, floor)
+        last = current + count
+        conn.execute(
+            "INSERT INTO sequences(name, value) VALUES(?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (DOC_ID_SEQUENCE, last)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return [str(x) for x in range(current + 1, last + 1)]
@@ -1,13 +1,12 @@
 import os
 import json
 import re
-import random
-import string
 import time
-import csv
-from datetime import datetime
-from PIL import Image
+import copy
+import tempfile
+import threading
 from .config import TAGS_FILE, IMAGES_DIR, BASE_DIR 
+from . import state
 
 # --- DAFTAR WARNA RESMI STREAMLIT (Restricted Palette) ---
 # Admin hanya boleh memilih warna ini agar badge di UI User valid
@@ -22,8 +21,21 @@ COLOR_PALETTE = {
 }
 
 # --- 1. JSON TAG CONFIG ---
+# Cache per proses, divalidasi dengan signature file (mtime_ns, inode, size) lewat 1x os.stat.
+# File hanya di-parse ulang kalau berubah, jadi edit di tab Config Tags (Admin) langsung
+# terlihat di App, Web V2 & Bot tanpa restart. Penulisan atomik (temp file + rename)
+# supaya container lain tidak pernah membaca JSON setengah jadi.
+_TAGS_CACHE = {"sig": None, "data": None}
+_TAGS_LOCK = threading.Lock()
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
 def load_tags_config():
-    if not os.path.exists(TAGS_FILE):
+    try:
+        sig = _file_signature(TAGS_FILE)
+    except FileNotFoundError:
         # Default struktur (Nested Dict)
         default_tags = {
             "ED": {"color": "#FF4B4B", "desc": "IGD, Emergency, Triage, Ambulans"},
@@ -33,28 +45,43 @@ def load_tags_config():
         }
         save_tags_config(default_tags)
         return default_tags
-    with open(TAGS_FILE, "r") as f:
-        return json.load(f)
+
+    with _TAGS_LOCK:
+        if _TAGS_CACHE["sig"] != sig:
+            with open(TAGS_FILE, "r") as f:
+                _TAGS_CACHE["data"] = json.load(f)
+            _TAGS_CACHE["sig"] = sig
+        # Copy: pemanggil (Admin) boleh memodifikasi dict tanpa merusak cache
+        return copy.deepcopy(_TAGS_CACHE["data"])
 
 def save_tags_config(tags_dict):
-    with open(TAGS_FILE, "w") as f:
-        json.dump(tags_dict, f, indent=4)
+    target_dir = os.path.dirname(TAGS_FILE)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tags_config.", suffix=".tmp", dir=target_dir)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(tags_dict, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, TAGS_FILE)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+    with _TAGS_LOCK:
+        _TAGS_CACHE["data"] = copy.deepcopy(tags_dict)
+        _TAGS_CACHE["sig"] = _file_signature(TAGS_FILE)
 
 # --- 2. SAFE ID GENERATOR ---
+def get_max_numeric_id(collection):
+    """Scan semua ID di collection (mahal). Hanya dipakai sekali untuk seed sequence."""
+    data = collection.get(include=[])
+    numeric_ids = [int(x) for x in data['ids'] if x.isdigit()]
+    return max(numeric_ids) if numeric_ids else 0
+
 def get_next_id_safe(collection):
+    """ID baru dari sequence atomik lintas container (data/state.sqlite)."""
     try:
-        data = collection.get(include=[])
-        existing_ids = data['ids']
-        if not existing_ids: return "1"
-        
-        # Filter hanya ID angka agar sorting benar
-        numeric_ids = []
-        for x in existing_ids:
-            if x.isdigit():
-                numeric_ids.append(int(x))
-        
-        if not numeric_ids: return "1"
-        return str(max(numeric_ids) + 1)
+        return state.allocate_doc_ids(1, seed_max=lambda: get_max_numeric_id(collection))[0]
     except Exception:
         return str(int(time.time()))
 
@@ -64,50 +91,14 @@ def sanitize_filename(text):
     return re.sub(r'[^\w\-_]', '', text.replace(" ", "_"))[:30]
 
 def save_uploaded_images(uploaded_files, judul, tag):
-    if not uploaded_files: return "none"
-    
-    saved_paths = []
-    clean_judul = sanitize_filename(judul)
-    target_dir = os.path.join(IMAGES_DIR, tag)
-    os.makedirs(target_dir, exist_ok=True)
-
-    resample_module = getattr(Image, "Resampling", None)
-    resample_method = resample_module.LANCZOS if resample_module else getattr(Image, "LANCZOS", Image.BICUBIC)
-    max_width = 1024
-    quality = 70
-    
-    for i, file in enumerate(uploaded_files):
-        suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-        filename = f"{clean_judul}_{tag}_{i+1}_{suffix}.jpg"
-        full_path = os.path.join(target_dir, filename)
-
-        try:
-            if hasattr(file, "seek"):
-                file.seek(0)
-            image = Image.open(file)
-            if image.mode in ("RGBA", "P"):
-                image = image.convert("RGB")
-
-            if image.width > max_width:
-                ratio = max_width / float(image.width)
-                new_height = int(float(image.height) * ratio)
-                image = image.resize((max_width, new_height), resample_method)
-
-            image.save(full_path, "JPEG", quality=quality, optimize=True)
-        except Exception as e:
-            print(f"⚠️ Gagal compress gambar {file.name}: {e}")
-            if hasattr(file, "seek"):
-                file.seek(0)
-            with open(full_path, "wb") as f:
-                f.write(file.getbuffer())
-        finally:
-            if hasattr(file, "seek"):
-                file.seek(0)
-        
-        rel_path = f"./images/{tag}/{filename}"
-        saved_paths.append(rel_path)
-        
-    return ";".join(saved_paths)
+    """
+    Simpan upload (master 1024px + thumbnail & WebP) lewat image pipeline paralel.
+    Return path master "a.jpg;b.jpg" saja. Butuh daftar varian juga? Pakai
+    image_pipeline.save_uploads (return path + JSON gambar_variants).
+    """
+    from .image_pipeline import save_uploads
+    paths, _ = save_uploads(uploaded_files, sanitize_filename(judul), tag)
+    return paths
 
 def fix_image_path_for_ui(db_path):
     clean = str(db_path).strip('"').strip("'")
@@ -130,19 +121,18 @@ def clean_text_for_embedding(text):
     # Hapus whitespace berlebih akibat penghapusan tadi
     return " ".join(clean.split())
 
-def log_failed_search(query):
-    """Mencatat pencarian yang hasilnya 0 ke file CSV"""
-    filename = os.path.join(BASE_DIR, "data", "failed_searches.csv")
-    
-    # Cek header kalau file baru
-    file_exists = os.path.exists(filename)
-    
+def normalize_query(text):
+    """
+    Normalisasi teks untuk kunci cache/dedup: trim, rapikan spasi, case-insensitive.
+    Contoh: "  Gagal   DISCHARGE " -> "gagal discharge"
+    """
+    if not text: return ""
+    return " ".join(str(text).split()).casefold()
+
+def log_failed_search(query, tag=None, source="app", dedupe_key=None):
+    """Mencatat pencarian yang hasilnya 0 (buffer analytics, ditulis di background)"""
+    from . import analytics  # lazy: analytics import utils
     try:
-        with open(filename, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Query User"]) # Header
-            
-            writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), query])
+        analytics.log_miss(query, tag, source, dedupe_key)
     except Exception as e:
         print(f"Gagal mencatat log: {e}")
\ No newline at end of file
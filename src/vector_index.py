@@ -0,0 +1,227 @@
+import threading
+import time
+import numpy as np
+from . import state
+from .config import VECTOR_INDEX_REFRESH_SECONDS, VECTOR_INDEX_FULL_SYNC_SECONDS
+
+# --- IN-PROCESS VECTOR INDEX (NUMPY MIRROR UNTUK READ PATH) ---
+# Chroma tetap Source of Truth. Index ini hanya cermin read-only di memori:
+# seluruh embedding + metadata dimuat ke 1 matriks NumPy, top-k dihitung vektorial
+# tanpa round-trip ke server. Sinkronisasi:
+# - Incremental: tiap VECTOR_INDEX_REFRESH_SECONDS cek data version (src/state.py),
+#   hanya dokumen yang berubah yang di-fetch ulang dari Chroma.
+# - Full sync: tiap VECTOR_INDEX_FULL_SYNC_SECONDS cocokkan col.count(), reload kalau beda.
+
+LOAD_PAGE_SIZE = 1000
+
+def _detect_space(col):
+    """Metric jarak collection (default Chroma = 'l2'), agar skor sama persis dengan col.query."""
+    space = (getattr(col, "metadata", None) or {}).get("hnsw:space")
+    if not space:
+        try:
+            space = (col.configuration.get("hnsw") or {}).get("space")
+        except Exception:
+            space = None
+    return space or "l2"
+
+class VectorIndex:
+    def __init__(self, pool, refresh_interval=VECTOR_INDEX_REFRESH_SECONDS,
+                 full_sync_interval=VECTOR_INDEX_FULL_SYNC_SECONDS):
+        self._pool = pool
+        self._refresh_interval = refresh_interval
+        self._full_sync_interval = full_sync_interval
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._space = "l2"
+        self._ids = []
+        self._pos = {}
+        self._metas = []
+        self._tags = np.empty(0, dtype=object)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._version = 0
+        self._last_check = 0.0
+        self._last_full_sync = 0.0
+
+    # --- LOAD & SYNC ---
+    def _fetch(self, col, **kwargs):
+        return col.get(include=['embeddings', 'metadatas'], **kwargs)
+
+    def _full_load(self):
+        version = state.get_data_version()
+        col = self._pool.get_collection()
+        space = _detect_space(col)
+
+        ids, metas, vectors = [], [], []
+        offset = 0
+        while True:
+            data = self._pool.run(lambda c: self._fetch(c, limit=LOAD_PAGE_SIZE, offset=offset))
+            if not data['ids']: break
+            ids.extend(data['ids'])
+            metas.extend(data['metadatas'])
+            vectors.extend(data['embeddings'])
+            offset += len(data['ids'])
+            if len(data['ids']) < LOAD_PAGE_SIZE: break
+
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._space = space
+            self._ids = list(ids)
+            self._pos = {doc_id: i for i, doc_id in enumerate(ids)}
+            self._metas = [m or {} for m in metas]
+            self._tags = np.array([m.get('tag') if m else None for m in metas] or [], dtype=object)
+            self._matrix = matrix
+            self._sq_norms = np.einsum('ij,ij->i', matrix, matrix) if len(ids) else np.empty(0, dtype=np.float32)
+            self._size = len(ids)
+            self._version = version
+            self._loaded = True
+            self._last_full_sync = time.monotonic()
+        print(f"🧮 Vector index dimuat: {len(ids)} dokumen (space={space}, version={version})")
+
+    def _grow(self, needed, dim):
+        capacity = self._matrix.shape[0]
+        if self._matrix.shape[1] != dim:
+            if self._size: raise ValueError(f"Dimensi embedding berubah ({self._matrix.shape[1]} -> {dim})")
+            self._matrix = np.empty((0, dim), dtype=np.float32)
+            capacity = 0
+        if needed <= capacity: return
+        new_cap = max(needed, capacity * 2, 64)
+        matrix = np.empty((new_cap, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq = np.empty(new_cap, dtype=np.float32)
+        sq[:self._size] = self._sq_norms[:self._size]
+        tags = np.empty(new_cap, dtype=object)
+        tags[:self._size] = self._tags[:self._size]
+        self._matrix, self._sq_norms, self._tags = matrix, sq, tags
+
+    def _remove(self, doc_id):
+        row = self._pos.pop(doc_id, None)
+        if row is None: return
+        last = self._size - 1
+        if row != last:
+            # Swap-remove: pindahkan baris terakhir ke slot yang kosong
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._sq_norms[row] = self._sq_norms[last]
+            self._tags[row] = self._tags[last]
+            self._ids[row] = moved_id
+            self._metas[row] = self._metas[last]
+            self._pos[moved_id] = row
+        self._ids.pop()
+        self._metas.pop()
+        self._size = last
+
+    def _upsert_row(self, doc_id, vector, meta):
+        vec = np.asarray(vector, dtype=np.float32)
+        row = self._pos.get(doc_id)
+        if row is None:
+            self._grow(self._size + 1, vec.shape[0])
+            row = self._size
+            self._ids.append(doc_id)
+            self._metas.append(meta)
+            self._pos[doc_id] = row
+            self._size += 1
+        else:
+            self._metas[row] = meta
+        self._matrix[row] = vec
+        self._sq_norms[row] = float(vec @ vec)
+        self._tags[row] = meta.get('tag')
+
+    def _apply_changes(self, version, changed_ids):
+        data = self._pool.run(lambda c: self._fetch(c, ids=list(changed_ids)))
+        found = {}
+        for i, doc_id in enumerate(data['ids']):
+            found[doc_id] = (data['embeddings'][i], data['metadatas'][i] or {})
+        if self._size and any(len(vec) != self._matrix.shape[1] for vec, _ in found.values()):
+            self._full_load()  # Dimensi berubah (re-embed provider lain): bangun ulang matriks
+            return
+        with self._lock:
+            for doc_id in changed_ids:
+                if doc_id in found:
+                    self._upsert_row(doc_id, *found[doc_id])
+                else:
+                    self._remove(doc_id)
+            self._version = version
+
+    def refresh_due(self):
+        return not self._loaded or time.monotonic() - self._last_check >= self._refresh_interval
+
+    def refresh(self, force=False):
+        """Sinkronkan index dengan Chroma (murah kalau tidak ada perubahan)."""
+        if not force and not self.refresh_due():
+            return
+        with self._refresh_lock:
+            self._refresh_locked(force)
+
+    def _refresh_locked(self, force):
+        now = time.monotonic()
+        if not self._loaded or force:
+            self._full_load()
+            self._last_check = now
+            return
+        if now - self._last_check < self._refresh_interval: return
+        self._last_check = now
+
+        if now - self._last_full_sync > self._full_sync_interval:
+            self._last_full_sync = now
+            count = self._pool.run(lambda c: c.count())
+            if count != self._size:
+                print(f"⚠️ Vector index tidak sinkron ({self._size} vs {count}), reload penuh.")
+                self._full_load()
+                return
+
+        version, changed = state.changes_since(self._version)
+        if changed is None:
+            self._full_load()
+        elif changed:
+            self._apply_changes(version, changed)
+        else:
+            self._version = version
+
+    # --- QUERY ---
+    def query(self, vector, n_results, filter_tag=None):
+        """
+        Top-k mirip col.query(). Format & jarak identik dengan Chroma
+        (l2 = squared euclidean, cosine = 1 - cos, ip = 1 - dot).
+        """
+        q = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            size = self._size
+            empty = {"ids": [[]], "metadatas": [[]], "distances": [[]]}
+            if size == 0: return empty
+
+            matrix = self._matrix[:size]
+            dots = matrix @ q
+            if self._space == "cosine":
+                denom = np.sqrt(self._sq_norms[:size]) * float(np.sqrt(q @ q))
+                dist = 1.0 - dots / np.maximum(denom, 1e-12)
+            elif self._space == "ip":
+                dist = 1.0 - dots
+            else:
+                dist = self._sq_norms[:size] + float(q @ q) - 2.0 * dots
+
+            if filter_tag:
+                mask = self._tags[:size] == filter_tag
+                candidates = np.flatnonzero(mask)
+                if candidates.size == 0: return empty
+                dist_c = dist[candidates]
+            else:
+                candidates = None
+                dist_c = dist
+
+            k = min(n_results, dist_c.shape[0])
+            top = np.argpartition(dist_c, k - 1)[:k] if k < dist_c.shape[0] else np.arange(dist_c.shape[0])
+            top = top[np.argsort(dist_c[top], kind='stable')]
+            rows = candidates[top] if candidates is not None else top
+
+            return {
+                "ids": [[self._ids[r] for r in rows]],
+                "metadatas": [[dict(self._metas[r]) for r in rows]],
+                "distances": [[float(dist[r]) for r in rows]],
+            }
+
+    def stats(self):
+        with self._lock:
+            return {"loaded": self._loaded, "size": self._size, "version": self._version, "space": self._space}
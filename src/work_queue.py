@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from .config import BOT_WORKERS, BOT_QUEUE_SIZE, BOT_DEDUPE_SECONDS
+
+# --- BOUNDED WORK QUEUE (WEBHOOK BOT WA) ---
+# Pengganti BackgroundTasks: pesan masuk antrian berukuran tetap, diproses oleh
+# sejumlah worker asyncio (concurrency terbatas).
+# - Dedupe: ID pesan yang sama dalam jendela `dedupe_seconds` diabaikan.
+# - Backpressure: antrian penuh -> pesan ditolak (shed) & webhook langsung balas,
+#   daripada menumpuk task tanpa batas sampai kuota Gemini / memori habis.
+# - Stats: kedalaman antrian & waktu tunggu (enqueue -> mulai diproses).
+
+WAIT_SAMPLES = 500
+
+class WorkQueue:
+    def __init__(self, handler, workers=BOT_WORKERS, max_size=BOT_QUEUE_SIZE,
+                 dedupe_seconds=BOT_DEDUPE_SECONDS, dedupe_max=10000):
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._max_size = max(1, max_size)
+        self._dedupe_seconds = dedupe_seconds
+        self._dedupe_max = dedupe_max
+        self._queue = None
+        self._tasks = []
+        self._seen = OrderedDict()  # msg_id -> waktu pertama terlihat
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._active = 0
+        self._stats = {"accepted": 0, "duplicates": 0, "shed": 0, "processed": 0, "failed": 0, "max_depth": 0}
+
+    def start(self):
+        """Buat antrian + worker di event loop yang sedang jalan (idempotent)."""
+        if self._tasks: return
+        self._queue = asyncio.Queue(maxsize=self._max_size)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self):
+        for task in self._tasks: task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _is_duplicate(self, msg_id):
+        if not msg_id: return False
+        now = time.monotonic()
+        while self._seen:
+            oldest_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at <= self._dedupe_seconds and len(self._seen) < self._dedupe_max: break
+            self._seen.pop(oldest_id)
+        if msg_id in self._seen: return True
+        self._seen[msg_id] = now
+        return False
+
+    def seen(self, msg_id):
+        """Dedupe tanpa antri (pesan yang di-debounce dulu): True kalau ID sudah pernah masuk."""
+        if self._is_duplicate(msg_id):
+            self._stats["duplicates"] += 1
+            return True
+        return False
+
+    def submit(self, msg_id, *args):
+        """Return 'queued', 'duplicate', atau 'busy' (antrian penuh, pesan di-shed)."""
+        self.start()
+        if self.seen(msg_id): return "duplicate"
+        try:
+            self._queue.put_nowait((time.monotonic(), args))
+        except asyncio.QueueFull:
+            # Lepas lagi ID-nya: kalau WPPConnect mengirim ulang, boleh dicoba lagi
+            self._seen.pop(msg_id, None)
+            self._stats["shed"] += 1
+            return "busy"
+        self._stats["accepted"] += 1
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+        return "queued"
+
+    async def _worker(self):
+        while True:
+            enqueued_at, args = await self._queue.get()
+            self._waits.append(time.monotonic() - enqueued_at)
+            self._active += 1
+            try:
+                await self._handler(*args)
+                self._stats["processed"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                print(f"❌ Worker gagal memproses pesan: {e}", flush=True)
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    def stats(self):
+        waits = sorted(self._waits)
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+        return dict(
+            self._stats,
+            depth=self._queue.qsize() if self._queue else 0,
+            capacity=self._max_size,
+            workers=self._workers,
+            active=self._active,
+            wait_ms_p50=pct(0.50),
+            wait_ms_p95=pct(0.95),
+            wait_ms_max=round(waits[-1] * 1000, 1) if waits else 0.0,
+        )
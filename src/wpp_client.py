@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+from .config import (
+    WPP_TIMEOUT, WPP_CONNECT_TIMEOUT, WPP_POOL_SIZE,
+    WPP_SEND_INTERVAL, WPP_CHAT_IDLE_SECONDS, WPP_IMAGE_CACHE_MB
+)
+
+# --- WPPCONNECT OUTBOUND CLIENT (BOT WA) ---
+# - 1 requests.Session per proses: koneksi keep-alive dipakai ulang (pool), tiap request
+#   punya timeout connect/read, jadi WPPConnect yang hang tidak menyandera thread.
+# - Token: dibuat sekali, dipakai bersama. Kalau WPPConnect balas 401, token di-refresh
+#   (sekali saja walau banyak thread kena 401 bersamaan) lalu request yang gagal diulang.
+# - ChatSendQueue: antrian kirim per chat. Urutan bubble terjaga (teks -> gambar -> footer),
+#   jeda antar bubble pakai asyncio.sleep, bukan time.sleep di thread.
+# - EncodedImageCache / image_url: payload gambar base64 di-cache, atau dikirim
+#   sebagai URL ke /images Web V2 supaya WPPConnect yang mengunduh sendiri.
+
+def _log(message):
+    print(message, flush=True)
+
+class WppClient:
+    def __init__(self, base_url, session_name, secret_key, timeout=WPP_TIMEOUT,
+                 connect_timeout=WPP_CONNECT_TIMEOUT, pool_size=WPP_POOL_SIZE):
+        self._base_url = base_url
+        self._session_name = session_name
+        self._secret_key = secret_key
+        self._timeout = (connect_timeout, timeout)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    def _url(self, path):
+        return f"{self._base_url}/api/{self._session_name}/{path}"
+
+    # --- AUTH ---
+    def _generate_token_locked(self):
+        try:
+            r = self._session.post(self._url(f"{self._secret_key}/generate-token"), timeout=self._timeout)
+            if r.status_code in [200, 201]:
+                resp = r.json()
+                token = resp.get("token") or resp.get("session")
+                if not token and "full" in resp: token = resp["full"].split(":")[-1]
+                if token:
+                    self._token = token
+                    _log("✅ Berhasil Generate Token.")
+                else: _log("❌ Gagal Parse Token.")
+            else: _log(f"❌ Gagal Generate Token: {r.status_code}")
+        except Exception as e: _log(f"❌ Error Auth: {e}")
+        return self._token
+
+    def generate_token(self):
+        with self._token_lock:
+            return self._generate_token_locked()
+
+    def _current_token(self):
+        if self._token: return self._token
+        with self._token_lock:
+            if not self._token:
+                _log("🔄 Token kosong. Mencoba generate token baru...")
+                self._generate_token_locked()
+            return self._token
+
+    def _refresh_after_401(self, stale_token):
+        """Refresh hanya kalau belum ada thread lain yang me-refresh token yang sama."""
+        with self._token_lock:
+            if self._token == stale_token:
+                _log("🔄 Token ditolak (401). Refresh token...")
+                self._generate_token_locked()
+            return self._token
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self._current_token()}", "Content-Type": "application/json"}
+
+    # --- REQUEST ---
+    def post(self, path, payload):
+        """POST ber-auth. 401 -> refresh token lalu ulang sekali. Exception jaringan dilempar."""
+        token = self._current_token()
+        r = self._session.post(self._url(path), json=payload, timeout=self._timeout,
+                               headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        if r.status_code == 401:
+            token = self._refresh_after_401(token)
+            r = self._session.post(self._url(path), json=payload, timeout=self._timeout,
+                                   headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        return r
+
+    def send_text(self, phone, message):
+        is_group_msg = "@g.us" in str(phone)
+
+        # UPGRADE: "Jurus Mabuk" (Double Parameter)
+        # Kita taruh linkPreview di luar DAN di dalam 'options'
+        # Biar versi WPPConnect manapun tetap nurut.
+        payload = {
+            "phone": phone,
+            "message": message,
+            "isGroup": is_group_msg,
+            "linkPreview": False,   # Cara Lama (Legacy)
+            "options": {
+                "linkPreview": False, # Cara Baru (Standard)
+                "createChat": True
+            }
+        }
+        return self.post("send-message", payload)
+
+    def send_image(self, phone, base64_str, caption=""):
+        is_group_msg = "@g.us" in str(phone)
+        payload = {"phone": phone, "base64": base64_str, "caption": caption, "isGroup": is_group_msg}
+        return self.post("send-image", payload)
+
+    def send_image_url(self, phone, url, caption="", filename=None):
+        """Kirim gambar by URL (field `path` WPPConnect), tanpa payload base64."""
+        is_group_msg = "@g.us" in str(phone)
+        payload = {"phone": phone, "path": url, "caption": caption, "isGroup": is_group_msg,
+                   "filename": filename or os.path.basename(url)}
+        return self.post("send-image", payload)
+
+class EncodedImageCache:
+    """
+    Cache data URI base64 per file gambar, kunci (path, mtime_ns, size):
+    file yang diganti admin otomatis di-encode ulang. LRU dibatasi total byte.
+    """
+    def __init__(self, max_mb=WPP_IMAGE_CACHE_MB):
+        self._max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> (signature, data_uri, filename)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, file_path):
+        """Return (data_uri, filename) atau (None, None) kalau file tidak ada / gagal dibaca."""
+        clean_path = os.path.normpath(file_path.replace("\\", "/"))
+        try:
+            st = os.stat(clean_path)
+        except OSError:
+            return None, None
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(clean_path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(clean_path)
+                self._stats["hits"] += 1
+                return entry[1], entry[2]
+
+        try:
+            mime_type, _ = mimetypes.guess_type(clean_path)
+            if not mime_type: mime_type = "image/jpeg"
+            with open(clean_path, "rb") as image_file:
+                raw_base64 = base64.b64encode(image_file.read()).decode('utf-8')
+        except Exception:
+            return None, None
+        data_uri = f"data:{mime_type};base64,{raw_base64}"
+        filename = os.path.basename(clean_path)
+
+        with self._lock:
+            self._stats["misses"] += 1
+            old = self._entries.pop(clean_path, None)
+            if old is not None: self._bytes -= len(old[1])
+            if len(data_uri) <= self._max_bytes:
+                self._entries[clean_path] = (signature, data_uri, filename)
+                self._bytes += len(data_uri)
+                while self._bytes > self._max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted[1])
+        return data_uri, filename
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+def image_url(file_path, base_url):
+    """Path gambar di metadata (./images/TAG/x.jpg) -> URL mount /images Web V2."""
+    clean = file_path.replace("\\", "/").strip()
+    if clean.startswith("./"): clean = clean[2:]
+    clean = clean.lstrip("/")
+    return f"{base_url.rstrip('/')}/{quote(clean)}"
+
+class ChatSendQueue:
+    """
+    Antrian kirim berurutan per chat (remote_jid), dijalankan di event loop.
+    `submit(chat_id, fn, *args)` langsung return; `fn` (sync, blocking I/O) dijalankan
+    di thread satu per satu per chat, dengan jeda minimal `interval` detik antar kirim.
+    Worker per chat berhenti sendiri kalau antrian kosong selama `idle_seconds`.
+    `fn` yang return False (atau melempar exception) dihitung "failed", selain itu "sent".
+    """
+    def __init__(self, interval=WPP_SEND_INTERVAL, idle_seconds=WPP_CHAT_IDLE_SECONDS):
+        self._interval = interval
+        self._idle_seconds = idle_seconds
+        self._queues = {}
+        self._workers = set()  # Referensi task worker, biar tidak di-GC di tengah jalan
+        self._stats = {"submitted": 0, "sent": 0, "failed": 0}
+
+    def submit(self, chat_id, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[chat_id] = queue
+            task = loop.create_task(self._worker(chat_id, queue))
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+        queue.put_nowait((fn, args, kwargs, future))
+        self._stats["submitted"] += 1
+        return future
+
+    async def _worker(self, chat_id, queue):
+        last_sent = 0.0
+        try:
+            while True:
+                try:
+                    fn, args, kwargs, future = await asyncio.wait_for(queue.get(), timeout=self._idle_seconds)
+                except asyncio.TimeoutError:
+                    if queue.empty(): return
+                    continue
+
+                wait = last_sent + self._interval - time.monotonic()
+                if wait > 0: await asyncio.sleep(wait)
+                try:
+                    result = await asyncio.to_thread(fn, *args, **kwargs)
+                    self._stats["failed" if result is False else "sent"] += 1
+                    if not future.done(): future.set_result(result)
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    _log(f"❌ Gagal kirim ke {chat_id}: {e}")
+                    if not future.done(): future.set_result(None)
+                last_sent = time.monotonic()
+        finally:
+            if self._queues.get(chat_id) is queue:
+                del self._queues[chat_id]
+
+    def stats(self):
+        pending = sum(q.qsize() for q in self._queues.values())
+        return dict(self._stats, active_chats=len(self._queues), pending=pending)
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+from src import backup
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f: f.write(data)
+
+def _read_tree(root):
+    out = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            with open(full, "rb") as f: out[os.path.relpath(full, root)] = f.read()
+    return out
+
+def test_full_and_incremental_round_trip(tmp_path):
+    base, backups, target = tmp_path / "app", tmp_path / "backups", tmp_path / "restore"
+    _write(str(base / "images" / "ED" / "a.jpg"), b"aaa")
+    _write(str(base / "images" / "ED" / "b.jpg"), b"bbb")
+    db_path = str(base / "data" / "state.sqlite")
+    os.makedirs(os.path.dirname(db_path))
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE t (v TEXT)")
+    conn.execute("INSERT INTO t VALUES ('satu')")
+    conn.commit()
+
+    full = backup.create_backup(False, backup_dir=str(backups), base_dir=str(base))
+    assert full["type"] == "full"
+
+    _write(str(base / "images" / "ED" / "a.jpg"), b"aaa-baru")
+    _write(str(base / "images" / "IPD" / "c.jpg"), b"ccc")
+    os.remove(str(base / "images" / "ED" / "b.jpg"))
+    conn.execute("INSERT INTO t VALUES ('dua')")  # masih di WAL, belum checkpoint
+    conn.commit()
+
+    incr = backup.create_backup(True, backup_dir=str(backups), base_dir=str(base))
+    assert incr["type"] == "incr"
+    assert incr["deleted"] == 1
+
+    backup.restore_backup([full["path"], incr["path"]], target_dir=str(target))
+    restored = _read_tree(str(target / "images"))
+    assert restored == {os.path.join("ED", "a.jpg"): b"aaa-baru", os.path.join("IPD", "c.jpg"): b"ccc"}
+    rows = sqlite3.connect(str(target / "data" / "state.sqlite")).execute("SELECT v FROM t ORDER BY rowid").fetchall()
+    assert rows == [("satu",), ("dua",)]
+    conn.close()
+
+def test_prune_keeps_last_full_chains(tmp_path):
+    names = ["full_20260101_000000", "incr_20260101_000001", "full_20260102_000000",
+             "incr_20260102_000001", "full_20260103_000000"]
+    for name in names: _write(str(tmp_path / f"backup_faq_{name}.zip"), b"")
+
+    assert backup.prune_backups(str(tmp_path), keep_full=2) == 2
+    assert sorted(os.listdir(tmp_path)) == [f"backup_faq_{n}.zip" for n in sorted(names[2:])]
@@ -0,0 +1,33 @@
+import time
+from src.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()          # 1 panggilan percobaan
+    assert not breaker.allow()      # percobaan masih berjalan
+
+    breaker.record_failure()        # percobaan gagal -> terbuka lagi
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()        # percobaan sukses -> tertutup
+    assert breaker.state == CLOSED and breaker.allow()
@@ -0,0 +1,54 @@
+from src import database
+from src import embeddings as E
+from src.embedding_cache import EmbeddingCache, make_key
+
+class CountingProvider(E.FakeProvider):
+    cacheable = True
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def embed(self, texts, task_type="RETRIEVAL_DOCUMENT"):
+        self.calls.extend(texts)
+        return super().embed(texts, task_type)
+
+def test_query_key_normalized_document_key_exact():
+    assert make_key("Gagal  Discharge", "m", "RETRIEVAL_DOCUMENT", normalize=True) == \
+        make_key("gagal discharge", "m", "RETRIEVAL_DOCUMENT", normalize=True)
+    assert make_key("Gagal  Discharge", "m", "RETRIEVAL_DOCUMENT") != \
+        make_key("gagal discharge", "m", "RETRIEVAL_DOCUMENT")
+
+def test_query_spellings_share_one_entry(tmp_path, monkeypatch):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.sqlite"))
+    provider = CountingProvider()
+    monkeypatch.setattr(database, "_get_embedding_cache_safe", lambda: cache)
+    monkeypatch.setattr(database, "get_provider", lambda: provider)
+
+    first = database._generate_embedding_raw("Gagal  Discharge", query=True)
+    second = database._generate_embedding_raw("gagal discharge", query=True)
+    assert first == second
+    assert provider.calls == ["Gagal  Discharge"]
+
+    # Dokumen tetap dikunci teks persis
+    database._generate_embedding_raw("gagal discharge")
+    assert provider.calls == ["Gagal  Discharge", "gagal discharge"]
+
+def test_ttl_expired_entry_is_a_miss(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.sqlite"), ttl_seconds=3600)
+    cache.set("teks", "m", "RETRIEVAL_DOCUMENT", [0.5, 0.25])
+    assert cache.get("teks", "m", "RETRIEVAL_DOCUMENT") == [0.5, 0.25]
+    assert cache.get("teks", "model-lain", "RETRIEVAL_DOCUMENT") is None
+
+    cache.ttl_seconds = -1
+    assert cache.get("teks", "m", "RETRIEVAL_DOCUMENT") is None
+    cache.ttl_seconds = 3600
+    assert cache.get("teks", "m", "RETRIEVAL_DOCUMENT") is None  # entry kadaluarsa sudah dihapus
+
+def test_purge_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "emb.sqlite"), max_entries=2)
+    for text in ("a", "b", "c"):
+        cache.set(text, "m", "RETRIEVAL_DOCUMENT", [1.0])
+    cache.purge()
+    assert cache.get("a", "m", "RETRIEVAL_DOCUMENT") is None
+    assert cache.get("c", "m", "RETRIEVAL_DOCUMENT") == [1.0]
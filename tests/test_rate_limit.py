@@ -0,0 +1,24 @@
+import asyncio
+from src.rate_limit import Debouncer, KeyedRateLimiter, allow_all
+
+def test_group_rejection_keeps_chat_quota():
+    chat = KeyedRateLimiter(60, 2)
+    group = KeyedRateLimiter(60, 1)
+    assert allow_all((chat, "a"), (group, "g"))
+    assert not allow_all((chat, "a"), (group, "g"))
+    assert chat.available("a")  # token chat tidak terpakai oleh pesan yang ditolak grup
+    assert group.stats()["limited"] == 1
+
+def test_debounce_merges_burst_and_only_quoted_followups():
+    async def scenario():
+        ready = []
+        debouncer = Debouncer(window=0.05, max_wait=1)
+        debouncer.add("k", "cara login", ready.append, "false_g@g.us_AAA_1@c.us")
+        debouncer.add("k", "di ED", ready.append, "false_g@g.us_BBB_1@c.us")
+        assert not debouncer.append_if_pending("k", "halo semua", None)
+        assert debouncer.append_if_pending("k", "modul IPD", "AAA")
+        assert ready == []  # timer di event loop, tidak ada yang menunggu di worker
+        await asyncio.sleep(0.15)
+        return ready
+
+    assert asyncio.run(scenario()) == ["cara login di ED modul IPD"]
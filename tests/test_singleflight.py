@@ -0,0 +1,40 @@
+import asyncio
+from src.singleflight import SingleFlight
+
+def test_follower_gets_result_when_leader_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ids": [["1"]]}
+
+        leader = asyncio.ensure_future(flight.do_async("q", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("q", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == {"ids": [["1"]]}
+        assert leader.cancelled()
+        assert len(calls) == 2  # follower menjalankan ulang sebagai leader baru
+
+    asyncio.run(scenario())
+
+def test_followers_share_leader_result():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [1, 2]
+
+        results = await asyncio.gather(*[flight.do_async("q", work) for _ in range(5)])
+        assert results == [[1, 2]] * 5
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import threading
+import pytest
+from src import state
+
+@pytest.fixture
+def state_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "STATE_DB_PATH", str(tmp_path / "state.sqlite"))
+    monkeypatch.setattr(state, "_local", threading.local())  # koneksi lama (path lain) tidak dipakai
+
+def test_allocate_doc_ids_concurrent_writers_unique_without_gaps(state_db):
+    allocated = []
+    lock = threading.Lock()
+
+    def writer(count):
+        for _ in range(20):
+            ids = state.allocate_doc_ids(count)
+            with lock: allocated.extend(ids)
+
+    threads = [threading.Thread(target=writer, args=(1 + n % 3,)) for n in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    numbers = sorted(int(x) for x in allocated)
+    assert len(numbers) == len(set(numbers))
+    assert numbers == list(range(1, len(numbers) + 1))
+
+def test_allocate_doc_ids_seeds_once_and_respects_doc_index(state_db):
+    seeds = []
+    def seed_max():
+        seeds.append(1)
+        return 41
+
+    assert state.allocate_doc_ids(2, seed_max=seed_max) == ["42", "43"]
+    assert state.allocate_doc_ids(1, seed_max=seed_max) == ["44"]
+    assert len(seeds) == 1
+
+    # Dokumen yang masuk tanpa allocator (mis. ID manual) menaikkan lantai sequence
+    state.record_changes(["100"], "upsert", ["ED"])
+    assert state.allocate_doc_ids(1) == ["101"]
+
+def test_record_changes_bumps_version_and_changelog(state_db):
+    v1 = state.record_changes(["1", "2"], "upsert", ["ED", "IPD"])
+    v2 = state.record_changes(["2"], "delete")
+    assert v2 == v1 + 1 == state.get_data_version()
+    assert state.changes_since(v1) == (v2, {"2"})
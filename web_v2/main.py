@@ -1,5 +1,5 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import uvicorn
@@ -7,11 +7,17 @@ import os
 import sys
 import markdown
 import re
-import math # Penting untuk hitung halaman
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
 
 # Setup path agar bisa import dari folder src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src import database, utils
+from src import database, utils, state, metrics
+from src.image_pipeline import parse_variants
 
 app = FastAPI()
 
@@ -21,10 +27,10 @@ static_dir = os.path.join(current_dir, "static")
 os.makedirs(static_dir, exist_ok=True)
 
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
-app.mount("/images", StaticFiles(directory=os.path.join(os.path.dirname(current_dir), "images")), name="images")
+# /images dilayani endpoint sendiri (ETag kuat + cache immutable), lihat serve_image
+images_dir = os.path.realpath(os.path.join(os.path.dirname(current_dir), "images"))
 
 templates = Jinja2Templates(directory=os.path.join(current_dir, "templates"))
-TAGS_MAP = utils.load_tags_config()
 
 # --- HELPER: TEXT PROCESSOR ---
 def fix_markdown_format(text):
@@ -43,7 +49,38 @@ def fix_markdown_format(text):
 
     return text
 
-def process_content_to_html(text_markdown, img_path_str):
+def to_public_path(path):
+    """Path metadata (./images/TAG/x.jpg) -> URL /images/TAG/x.jpg."""
+    clean = str(path).replace("\\", "/").strip()
+    if clean.startswith("./images"):
+        clean = clean[1:]
+    return clean
+
+def picture_html(src, variant, alt, sizes, extra_attrs=""):
+    """
+    <picture> responsif dari varian image_pipeline: WebP + JPEG, thumbnail 320w & master 1024w.
+    Gambar lama (tanpa varian) tetap <img> biasa.
+    """
+    if not variant or not variant.get("w") or not variant.get("tw"):
+        return f'<img src="{quote(src)}" alt="{alt}" loading="lazy" {extra_attrs}>'
+
+    w, h, tw = variant["w"], variant.get("h"), variant["tw"]
+    def srcset(small, big):
+        items = [(p, width) for p, width in ((small, tw), (big, w)) if p]
+        return ", ".join(f"{quote(to_public_path(p))} {width}w" for p, width in items)
+
+    source = ""
+    if variant.get("webp"):
+        source = f'<source type="image/webp" srcset="{srcset(variant.get("thumb_webp"), variant["webp"])}" sizes="{sizes}">'
+    dims = f' width="{w}" height="{h}"' if h else ""
+    return (
+        f'<picture>{source}'
+        f'<img src="{quote(src)}" srcset="{srcset(variant.get("thumb"), src)}" sizes="{sizes}" '
+        f'alt="{alt}" loading="lazy" decoding="async"{dims} {extra_attrs}></picture>'
+    )
+
+@metrics.timed(metrics.RENDER_SECONDS)
+def process_content_to_html(text_markdown, img_path_str, variants_raw=None):
     if not text_markdown: return ""
     
     # LANGKAH 1: Perbaiki format teks mentah dulu (Regex)
@@ -68,10 +105,12 @@ def process_content_to_html(text_markdown, img_path_str):
     if img_path_str and str(img_path_str).lower() != 'none':
         raw_paths = img_path_str.split(';')
         for p in raw_paths:
-            clean = p.replace("\\", "/").strip()
-            if clean.startswith("./images"):
-                clean = clean[1:] 
-            img_list.append(clean)
+            img_list.append(to_public_path(p))
+
+    # Varian (thumbnail/WebP) per path master, kalau gambar diupload lewat image_pipeline
+    variants = {}
+    for v in parse_variants(variants_raw):
+        if isinstance(v, dict) and v.get("jpg"): variants[to_public_path(v["jpg"])] = v
 
     # LANGKAH 4: Replace [GAMBAR X] dengan HTML <img>
     pattern = re.compile(r'\[GAMBAR\s*(\d+)\]', re.IGNORECASE)
@@ -80,9 +119,14 @@ def process_content_to_html(text_markdown, img_path_str):
         try:
             idx = int(match.group(1)) - 1
             if 0 <= idx < len(img_list):
+                src = img_list[idx]
+                img_html = picture_html(
+                    src, variants.get(src), f"Gambar {idx+1}", "(max-width: 600px) 100vw, 800px",
+                    f"onclick=\"window.open('{quote(src)}', '_blank');\""
+                )
                 return f'''
                 <div class="img-container">
-                    <img src="{img_list[idx]}" alt="Gambar {idx+1}" loading="lazy" onclick="window.open(this.src, '_blank');">
+                    {img_html}
                     <span class="img-caption">Gambar {idx+1} (Klik untuk perbesar)</span>
                 </div>
                 '''
@@ -95,11 +139,162 @@ def process_content_to_html(text_markdown, img_path_str):
     if "[GAMBAR" not in text_markdown.upper() and img_list:
         html_content += "<hr class='img-divider'><div class='gallery-grid'>"
         for img in img_list:
-             html_content += f'<div class="img-card"><img src="{img}" onclick="window.open(this.src, \'_blank\');"></div>'
+            img_html = picture_html(
+                img, variants.get(img), "Lampiran", "(max-width: 600px) 50vw, 200px",
+                f"onclick=\"window.open('{quote(img)}', '_blank');\""
+            )
+            html_content += f'<div class="img-card">{img_html}</div>'
         html_content += "</div>"
 
     return html_content
 
+# --- HTML RENDER CACHE ---
+class RenderCache:
+    """
+    Cache HTML hasil process_content_to_html per (doc id, hash konten).
+    - Konten berubah -> hash beda -> otomatis render ulang.
+    - Entry milik dokumen yang di-upsert/delete (data version di data/state.sqlite)
+      dibuang saat sync, jadi tidak ada HTML basi yang menumpuk.
+    - LRU dengan batas jumlah entry.
+    """
+    def __init__(self, max_entries=2000, sync_interval=1.0):
+        self._max_entries = max_entries
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_doc = {}
+        self._version = None
+        self._last_sync = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _content_hash(text, img_path_str, variants_raw=None):
+        raw = f"{text or ''}\x1f{img_path_str or ''}\x1f{variants_raw or ''}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _evict_docs(self, doc_ids):
+        for doc_id in doc_ids:
+            for key in self._by_doc.pop(doc_id, ()):
+                self._entries.pop(key, None)
+
+    def sync_due(self):
+        return time.monotonic() - self._last_sync >= self._sync_interval
+
+    def sync(self):
+        """Cek changelog data version (I/O SQLite): panggil lewat thread dari kode async."""
+        now = time.monotonic()
+        if now - self._last_sync < self._sync_interval: return
+        self._last_sync = now
+        try:
+            if self._version is None:
+                self._version = state.get_data_version()
+                return
+            version, changed = state.changes_since(self._version)
+        except Exception as e:
+            print(f"⚠️ Render cache gagal cek data version: {e}")
+            return
+        with self._lock:
+            if changed is None:
+                self._entries.clear()
+                self._by_doc.clear()
+            elif changed:
+                self._evict_docs(changed)
+            self._version = version
+
+    def render(self, doc_id, text_markdown, img_path_str, variants_raw=None):
+        key = (doc_id, self._content_hash(text_markdown, img_path_str, variants_raw))
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = process_content_to_html(text_markdown, img_path_str, variants_raw)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = html
+            self._by_doc.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self._max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                keys = self._by_doc.get(old_key[0])
+                if keys:
+                    keys.discard(old_key)
+                    if not keys: self._by_doc.pop(old_key[0], None)
+        return html
+
+RENDER_CACHE = RenderCache()
+metrics.REGISTRY.register_collector(
+    "faq_render_cache_total", "Lookup render cache HTML Web V2 (result=hits|misses)", "counter",
+    lambda: {(("result", "hits"),): RENDER_CACHE.hits, (("result", "misses"),): RENDER_CACHE.misses}
+)
+
+# --- IMAGE ENDPOINT (ETAG KUAT + CACHE IMMUTABLE) ---
+# File dari image_pipeline bernama {judul}_{tag}_{hash isi}: isi tidak pernah berubah untuk
+# nama yang sama, jadi aman di-cache browser 1 tahun (immutable). File lama (nama acak)
+# tetap di-cache tapi wajib revalidasi. ETag = hash isi file (dihitung sekali per mtime/size),
+# request dengan If-None-Match yang cocok dijawab 304 tanpa body.
+HASHED_IMAGE_NAME = re.compile(r'_[0-9a-f]{12}(_thumb)?\.(jpg|webp)$')
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, max-age=300, must-revalidate"
+
+class ImageETagCache:
+    def __init__(self, max_entries=5000):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> ((mtime_ns, size), etag)
+
+    def get(self, path):
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+
+        with self._lock:
+            self._entries[path] = (signature, etag)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+IMAGE_ETAGS = ImageETagCache()
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match: return False
+    if if_none_match.strip() == "*": return True
+    # Perbandingan weak (RFC 9110): abaikan prefix W/
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+@app.api_route("/images/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_image(file_path: str, request: Request):
+    full_path = os.path.realpath(os.path.join(images_dir, file_path))
+    if not full_path.startswith(images_dir + os.sep) or not os.path.isfile(full_path):
+        raise HTTPException(status_code=404)
+
+    etag = await asyncio.to_thread(IMAGE_ETAGS.get, full_path)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE if HASHED_IMAGE_NAME.search(full_path) else REVALIDATE_CACHE,
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(full_path, headers=headers)
+
+# --- METRICS (PROMETHEUS) ---
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render_prometheus(), media_type=metrics.CONTENT_TYPE)
+
 # --- MAIN ENDPOINT ---
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request, q: str = "", tag: str = "Semua Modul", page: int = 0):
@@ -108,18 +303,25 @@ async def read_root(request: Request, q: str = "", tag: str = "Semua Modul", pag
     results = []
     total_pages = 1
     is_search_mode = False
+    # Tag config dibaca per request (cache mtime di utils), edit Admin langsung terlihat
+    tags_map = utils.load_tags_config()
 
-    # Ambil list tag untuk dropdown
-    try: db_tags = database.get_unique_tags_from_db()
-    except: db_tags = []
-    all_tags = ["Semua Modul"] + (db_tags if db_tags else [])
+    # Ambil list tag untuk dropdown (jalan paralel dengan query utama, non-blocking)
+    async def load_tags():
+        try: return await database.async_get_unique_tags_from_db()
+        except: return []
 
     # === SKENARIO 1: SEARCH MODE (Top 3) ===
     if q.strip():
         is_search_mode = True
-        raw = database.search_faq(q, filter_tag=tag, n_results=20)
+        db_tags, raw = await asyncio.gather(
+            load_tags(),
+            database.async_search_faq(q, filter_tag=tag, n_results=20)
+        )
         
         if raw and raw['ids'][0]:
+            # Hasil kata kunci (fast path / mode darurat) tidak punya skor semantik
+            keyword_match = bool(raw.get('lexical') or raw.get('degraded'))
             temp_results = []
             for i in range(len(raw['ids'][0])):
                 meta = raw['metadatas'][0][i]
@@ -128,13 +330,17 @@ async def read_root(request: Request, q: str = "", tag: str = "Semua Modul", pag
                 
                 # Syarat Relevansi > 32%
                 if score > 32:
+                    meta['id'] = raw['ids'][0][i]
                     meta['score'] = int(score)
                     if score > 80: meta['score_class'] = "score-high"
                     elif score > 50: meta['score_class'] = "score-med"
                     else: meta['score_class'] = "score-low"
+                    if keyword_match:
+                        meta['score_label'] = "Cocok Kata Kunci"
+                        meta['score_class'] = "score-med"
                     
                     # Tambahkan warna badge
-                    tag_info = TAGS_MAP.get(meta['tag'], {})
+                    tag_info = tags_map.get(meta['tag'], {})
                     meta['badge_color'] = tag_info.get('color', '#808080')
                     
                     temp_results.append(meta)
@@ -143,43 +349,41 @@ async def read_root(request: Request, q: str = "", tag: str = "Semua Modul", pag
             temp_results.sort(key=lambda x: x['score'], reverse=True)
             results = temp_results[:3]
 
+        if not results:
+            # Buffer analytics (tanpa I/O di request), refresh dari client yang sama tidak dihitung ulang
+            client_ip = request.client.host if request.client else None
+            utils.log_failed_search(q, tag, source="web", dedupe_key=client_ip)
+
     # === SKENARIO 2: BROWSE MODE (Terbaru + Paginasi) ===
     else:
-        # Ambil semua data terurut ID Descending (Terbaru)
-        raw_all = database.get_all_faqs_sorted()
-        
-        # Filter Tag Manual (karena Chroma get() tidak support where complex di versi lama)
-        if tag != "Semua Modul":
-            filtered_data = [x for x in raw_all if x.get('tag') == tag]
-        else:
-            filtered_data = raw_all
-            
-        # Hitung Paginasi
-        total_docs = len(filtered_data)
-        total_pages = math.ceil(total_docs / ITEMS_PER_PAGE)
-        
-        # Guard: jangan sampai page melebihi total
-        if page >= total_pages: page = 0
-        if page < 0: page = 0
-        
-        start = page * ITEMS_PER_PAGE
-        end = start + ITEMS_PER_PAGE
-        
-        # Slice data untuk halaman ini
-        sliced_data = filtered_data[start:end]
+        # Paginasi server-side: hanya metadata 10 item halaman ini yang di-fetch
+        db_tags, page_info = await asyncio.gather(
+            load_tags(),
+            database.async_list_faqs(tag, page, ITEMS_PER_PAGE)
+        )
+        total_pages = page_info['total_pages']
+        page = page_info['page']
+        sliced_data = page_info['items']
         
         for meta in sliced_data:
             # Setup metadata default untuk tampilan
             meta['score'] = None # Tidak ada score relevansi kalau mode browse
-            tag_info = TAGS_MAP.get(meta['tag'], {})
+            tag_info = tags_map.get(meta['tag'], {})
             meta['badge_color'] = tag_info.get('color', '#808080')
             results.append(meta)
 
+    all_tags = ["Semua Modul"] + (db_tags if db_tags else [])
+
     # === PROCESS CONTENT UNTUK SEMUA HASIL ===
+    # HTML di-render sekali per versi dokumen, request berikutnya ambil dari cache
+    if RENDER_CACHE.sync_due():
+        await asyncio.to_thread(RENDER_CACHE.sync)
     for item in results:
-        item['html_content'] = process_content_to_html(
+        item['html_content'] = RENDER_CACHE.render(
+            item.get('id'),
             item.get('jawaban_tampil', ''), 
-            item.get('path_gambar', '')
+            item.get('path_gambar', ''),
+            item.get('gambar_variants')
         )
 
         # --- LOGIKA "MAGER" TAPI AMAN ---
@@ -197,7 +401,8 @@ async def read_root(request: Request, q: str = "", tag: str = "Semua Modul", pag
                 linked_src = re.sub(r'(https?://\S+)', r'<a href="\1" target="_blank">\1</a>', src)
                 item['source_html'] = f'<div class="source-box">🔗 {linked_src}</div>'
 
-    return templates.TemplateResponse("index.html", {
+    # Signature (request, name, context): wajib di Starlette baru, didukung juga versi lama
+    return templates.TemplateResponse(request, "index.html", {
         "request": request, 
         "results": results, 
         "query": q, 